@@ -94,6 +94,9 @@ async def _format_executor_profile(executor_id: int) -> str:
 logger = logging.getLogger(__name__)
 router = Router()
 
+# Размер страницы в списках пользователей/исполнителей
+_ADMIN_LIST_PAGE_SIZE = 10
+
 
 def is_admin(user_id: int) -> bool:
     """Проверяет, является ли пользователь администратором."""
@@ -205,11 +208,7 @@ async def admin_list_users(callback_query: CallbackQuery, state: FSMContext):
         return
     
     try:
-        from db_manager import DBManager
-        sync_db_manager = DBManager()
-        
-        with sync_db_manager.get_db() as db:
-            users = db.query(UserProfile).order_by(UserProfile.telegram_id).all()
+        users, total = await db_manager.get_user_profiles_page(0, _ADMIN_LIST_PAGE_SIZE)
         
         if not users:
             await callback_query.message.edit_text(
@@ -221,10 +220,10 @@ async def admin_list_users(callback_query: CallbackQuery, state: FSMContext):
             await callback_query.answer()
             return
         
-        keyboard = create_users_list_keyboard(users, page=0)
+        keyboard = create_users_list_keyboard(users, page=0, has_next=total > _ADMIN_LIST_PAGE_SIZE)
         await callback_query.message.edit_text(
             f"👤 <b>Список пользователей</b>\n\n"
-            f"Всего: {len(users)}\n"
+            f"Всего: {total}\n"
             f"Выберите пользователя:",
             reply_markup=keyboard,
             parse_mode="HTML"
@@ -244,16 +243,13 @@ async def admin_list_users_page(callback_query: CallbackQuery, state: FSMContext
     
     try:
         page = int(callback_query.data.split(":")[1])
-        from db_manager import DBManager
-        sync_db_manager = DBManager()
-        
-        with sync_db_manager.get_db() as db:
-            users = db.query(UserProfile).order_by(UserProfile.telegram_id).all()
+        offset = page * _ADMIN_LIST_PAGE_SIZE
+        users, total = await db_manager.get_user_profiles_page(offset, _ADMIN_LIST_PAGE_SIZE)
         
-        keyboard = create_users_list_keyboard(users, page=page)
+        keyboard = create_users_list_keyboard(users, page=page, has_next=offset + len(users) < total)
         await callback_query.message.edit_text(
             f"👤 <b>Список пользователей</b>\n\n"
-            f"Всего: {len(users)}\n"
+            f"Всего: {total}\n"
             f"Страница {page + 1}\n"
             f"Выберите пользователя:",
             reply_markup=keyboard,
@@ -273,11 +269,7 @@ async def admin_list_executors(callback_query: CallbackQuery, state: FSMContext)
         return
     
     try:
-        from db_manager import DBManager
-        sync_db_manager = DBManager()
-        
-        with sync_db_manager.get_db() as db:
-            executors = db.query(ExecutorProfile).order_by(ExecutorProfile.telegram_id).all()
+        executors, total = await db_manager.get_executor_profiles_page(0, _ADMIN_LIST_PAGE_SIZE)
         
         if not executors:
             await callback_query.message.edit_text(
@@ -289,10 +281,10 @@ async def admin_list_executors(callback_query: CallbackQuery, state: FSMContext)
             await callback_query.answer()
             return
         
-        keyboard = create_executors_list_keyboard(executors, page=0)
+        keyboard = create_executors_list_keyboard(executors, page=0, has_next=total > _ADMIN_LIST_PAGE_SIZE)
         await callback_query.message.edit_text(
             f"👷 <b>Список исполнителей</b>\n\n"
-            f"Всего: {len(executors)}\n"
+            f"Всего: {total}\n"
             f"Выберите исполнителя:",
             reply_markup=keyboard,
             parse_mode="HTML"
@@ -312,16 +304,13 @@ async def admin_list_executors_page(callback_query: CallbackQuery, state: FSMCon
     
     try:
         page = int(callback_query.data.split(":")[1])
-        from db_manager import DBManager
-        sync_db_manager = DBManager()
-        
-        with sync_db_manager.get_db() as db:
-            executors = db.query(ExecutorProfile).order_by(ExecutorProfile.telegram_id).all()
+        offset = page * _ADMIN_LIST_PAGE_SIZE
+        executors, total = await db_manager.get_executor_profiles_page(offset, _ADMIN_LIST_PAGE_SIZE)
         
-        keyboard = create_executors_list_keyboard(executors, page=page)
+        keyboard = create_executors_list_keyboard(executors, page=page, has_next=offset + len(executors) < total)
         await callback_query.message.edit_text(
             f"👷 <b>Список исполнителей</b>\n\n"
-            f"Всего: {len(executors)}\n"
+            f"Всего: {total}\n"
             f"Страница {page + 1}\n"
             f"Выберите исполнителя:",
             reply_markup=keyboard,
@@ -1,8 +1,53 @@
+from sqlalchemy import exists, func, insert, literal, select, update
 from sqlalchemy.orm import Session
 import contextlib
-from database import SessionLocal, UserProfile, ExecutorProfile, PlanfixDirectory, PlanfixDirectoryEntry, PlanfixTaskStatus, PlanfixTaskTemplate, BotLog, TaskCache
+from database import SessionLocal, UserProfile, ExecutorProfile, PlanfixDirectory, PlanfixDirectoryEntry, PlanfixTaskStatus, PlanfixTaskTemplate, BotLog, TaskCache, TaskAssignment
 import datetime
-from typing import List, Dict, Optional
+import time
+from typing import List, Dict, Optional, Tuple
+
+# Кэш профилей исполнителей (telegram_id -> (время, профиль)), используется AsyncDBManager.get_executor_profile.
+# Сбрасывается методами DBManager, изменяющими профиль, поэтому общий для всех экземпляров.
+_executor_profile_cache: Dict[int, tuple] = {}
+# Поколение профиля: растёт при инвалидации; профиль, прочитанный до изменения, в кэш не попадает
+_executor_profile_generation: Dict[int, int] = {}
+EXECUTOR_PROFILE_CACHE_TTL = 60  # seconds
+EXECUTOR_PROFILE_CACHE_MAX_SIZE = 10000
+
+
+def get_cached_executor_profile(telegram_id: int):
+    """Возвращает (найдено, профиль) из кэша; профиль может быть None (пользователь не исполнитель)."""
+    rec = _executor_profile_cache.get(telegram_id)
+    if rec and time.monotonic() - rec[0] < EXECUTOR_PROFILE_CACHE_TTL:
+        return True, rec[1]
+    return False, None
+
+
+def executor_profile_generation(telegram_id: int) -> int:
+    """Текущее поколение профиля; запоминается перед чтением из БД и передаётся в cache_executor_profile."""
+    return _executor_profile_generation.get(telegram_id, 0)
+
+
+def cache_executor_profile(telegram_id: int, executor, generation: Optional[int] = None) -> None:
+    # Профиль изменили, пока шло чтение: прочитанная строка может быть устаревшей, не кэшируем её
+    if generation is not None and executor_profile_generation(telegram_id) != generation:
+        return
+    if len(_executor_profile_cache) >= EXECUTOR_PROFILE_CACHE_MAX_SIZE:
+        _executor_profile_cache.clear()
+    _executor_profile_cache[telegram_id] = (time.monotonic(), executor)
+
+
+def invalidate_executor_profile_cache(telegram_id: int) -> None:
+    _executor_profile_generation[telegram_id] = _executor_profile_generation.get(telegram_id, 0) + 1
+    _executor_profile_cache.pop(telegram_id, None)
+
+
+def _profiles_page(db: Session, model, offset: int, limit: int) -> tuple:
+    """LIMIT/OFFSET-страница профилей model по telegram_id и общее число строк (COUNT без загрузки строк)."""
+    total = db.query(func.count(model.telegram_id)).scalar() or 0
+    items = db.query(model).order_by(model.telegram_id).offset(offset).limit(limit).all()
+    return items, total
+
 
 class DBManager:
     def __init__(self):
@@ -54,6 +99,10 @@ class DBManager:
             db.refresh(user)
         return user
 
+    def get_user_profiles_page(self, db: Session, offset: int, limit: int) -> Tuple[List[UserProfile], int]:
+        """Страница пользователей (по telegram_id) и общее число записей."""
+        return _profiles_page(db, UserProfile, offset, limit)
+
     def delete_user_profile(self, db: Session, telegram_id: int):
         user = self.get_user_profile(db, telegram_id)
         if user:
@@ -85,6 +134,7 @@ class DBManager:
         db.add(executor)
         db.commit()
         db.refresh(executor)
+        invalidate_executor_profile_cache(telegram_id)
         return executor
 
     def get_executor_profile(self, db: Session, telegram_id: int) -> Optional[ExecutorProfile]:
@@ -97,13 +147,79 @@ class DBManager:
                 setattr(executor, key, value)
             db.commit()
             db.refresh(executor)
+        invalidate_executor_profile_cache(telegram_id)
         return executor
 
+    def get_executor_profiles_page(self, db: Session, offset: int, limit: int) -> Tuple[List[ExecutorProfile], int]:
+        """Страница исполнителей (по telegram_id) и общее число записей."""
+        return _profiles_page(db, ExecutorProfile, offset, limit)
+
     def delete_executor_profile(self, db: Session, telegram_id: int):
         executor = self.get_executor_profile(db, telegram_id)
         if executor:
             db.delete(executor)
             db.commit()
+        invalidate_executor_profile_cache(telegram_id)
+
+    # --- TaskAssignment operations ---
+    def has_active_assignment(self, db: Session, task_id: int, executor_telegram_id: int) -> bool:
+        """Проверяет, принята ли задача в работу указанным исполнителем (активное назначение)."""
+        return bool(db.execute(select(exists().where(
+            TaskAssignment.task_id == task_id,
+            TaskAssignment.executor_telegram_id == executor_telegram_id,
+            TaskAssignment.status == "active"
+        ))).scalar())
+
+    @staticmethod
+    def _insert_assignment_if_absent(task_id: int, executor_telegram_id: int, planfix_user_id: Optional[str]):
+        """INSERT ... SELECT ... WHERE NOT EXISTS: вставка активного назначения, только если у задачи его нет."""
+        active_exists = select(TaskAssignment.id).where(
+            TaskAssignment.task_id == task_id,
+            TaskAssignment.status == "active"
+        ).exists()
+        return insert(TaskAssignment).from_select(
+            ["task_id", "executor_telegram_id", "planfix_user_id", "status", "assigned_at"],
+            select(
+                literal(task_id),
+                literal(executor_telegram_id),
+                literal(planfix_user_id),
+                literal("active"),
+                literal(datetime.datetime.now()),
+            ).where(~active_exists)
+        )
+
+    def create_task_assignment_if_absent(self, db: Session, task_id: int, executor_telegram_id: int,
+                                         planfix_user_id: Optional[str] = None) -> bool:
+        """Создаёт активное назначение, если у задачи его ещё нет.
+
+        Один INSERT ... SELECT ... WHERE NOT EXISTS вместо SELECT + INSERT: проверка и вставка
+        выполняются атомарно. Возвращает True, если назначение создано.
+        """
+        result = db.execute(self._insert_assignment_if_absent(task_id, executor_telegram_id, planfix_user_id))
+        db.commit()
+        return result.rowcount > 0
+
+    def create_task_assignments_if_absent(self, db: Session, rows: List[tuple]) -> List[bool]:
+        """Пакетный вариант create_task_assignment_if_absent: все вставки в одной транзакции с одним commit.
+
+        rows — кортежи (task_id, executor_telegram_id, planfix_user_id); результат — по одному bool на строку.
+        """
+        created = [
+            db.execute(self._insert_assignment_if_absent(*row)).rowcount > 0
+            for row in rows
+        ]
+        db.commit()
+        return created
+
+    def deactivate_task_assignment(self, db: Session, task_id: int, executor_telegram_id: int) -> bool:
+        """Переводит активное назначение исполнителя в статус inactive. Возвращает True, если запись найдена."""
+        result = db.execute(update(TaskAssignment).where(
+            TaskAssignment.task_id == task_id,
+            TaskAssignment.executor_telegram_id == executor_telegram_id,
+            TaskAssignment.status == "active"
+        ).values(status="inactive"))
+        db.commit()
+        return result.rowcount > 0
 
     # --- PlanfixDirectory operations ---
     def create_or_update_directory(self, db: Session, directory_id: int, name: str, group: Optional[str] = None) -> PlanfixDirectory:
@@ -283,6 +399,16 @@ class DBManager:
         """Получает задачу из кэша по task_id (generalId)."""
         return db.query(TaskCache).filter(TaskCache.task_id == task_id).first()
 
+    def get_cached_task_statuses(self, db: Session, task_ids: List[int]) -> Dict[int, tuple]:
+        """Возвращает {task_id: (status_id, status_name)} из кэша одним запросом для списка задач."""
+        if not task_ids:
+            return {}
+        rows = db.query(TaskCache.task_id, TaskCache.status_id, TaskCache.status_name).filter(
+            TaskCache.task_id.in_(task_ids),
+            TaskCache.status_id.isnot(None)
+        ).all()
+        return {row.task_id: (row.status_id, row.status_name) for row in rows}
+
     def get_user_tasks_from_cache(self, db: Session, user_telegram_id: int, limit: int = 50) -> List[TaskCache]:
         """Получает задачи пользователя из кэша."""
         return db.query(TaskCache).filter(
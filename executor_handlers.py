@@ -5,15 +5,19 @@
 """
 
 import logging
+import os
 import asyncio
 import time
 import re
 import json
-from typing import Dict, List, Set
+import weakref
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Set
 from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.filters.state import StateFilter
-from aiogram.types import Message, CallbackQuery, ContentType, InlineKeyboardButton, InlineKeyboardMarkup, BufferedInputFile, InputMediaPhoto, InputMediaDocument
+from aiogram.types import Message, CallbackQuery, ContentType, InlineKeyboardButton, InlineKeyboardMarkup, BufferedInputFile, InputFile, InputMediaPhoto, InputMediaDocument, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.fsm.context import FSMContext
 
 from states import (
@@ -21,6 +25,8 @@ from states import (
     ExecutorTaskManagement,
     AdminExecutorApproval,
     ExecutorProfileEdit,
+    CommentFlow,
+    TicketCreation,
 )
 from keyboards import (
     get_phone_number_keyboard,
@@ -31,9 +37,15 @@ from keyboards import (
     get_executor_confirmation_keyboard,
     get_executor_profile_edit_keyboard,
     get_executor_direction_keyboard,
+    AcceptTaskCallback,
+    ResumeTaskCallback,
+    CloseTaskCallback,
+    CommentTaskCallback,
 )
 from services.db_service import db_manager
 from planfix_client import planfix_client
+from shared_cache import TTLCache
+from notifications import get_notification_service
 from counterparty_helper import (
     normalize_counterparty_id,
     extract_counterparty_from_task,
@@ -52,11 +64,15 @@ from config import (
     PLANFIX_BASE_URL,
     PLANFIX_IT_TAG,
     PLANFIX_SE_TAG,
+    SUPPORT_CONTACT_GROUP_ID,
+    SUPPORT_CONTACT_TEMPLATE_ID,
 )
+from database import BotLog, UserProfile
 from services.status_registry import (
     StatusKey,
     collect_status_ids,
     ensure_status_registry_loaded,
+    get_status_id,
     is_status,
     require_status_id,
     resolve_status_id,
@@ -122,8 +138,7 @@ async def _check_comments_for_executor(task_id: int, executor_id: int, bot):
         
         # Отправляем уведомления о новых комментариях
         if new_comments:
-            from notifications import NotificationService
-            notification_service = NotificationService(bot)
+            notification_service = get_notification_service(bot)
             
             for c in reversed(new_comments):  # отправляем в хронологическом порядке
                 comment_id = c.get('id')
@@ -155,31 +170,111 @@ async def _check_comments_for_executor(task_id: int, executor_id: int, bot):
             _executor_last_checked_comments[task_id][executor_id] = latest_id
     except Exception as e:
         logger.error(f"Error checking comments for task {task_id} (executor {executor_id}): {e}", exc_info=True)
-# Простой in-memory TTL кэш (точечная вставка)
-class TTLCache:
-    def __init__(self):
-        self._store = {}
-    def get(self, key):
-        item = self._store.get(key)
-        if not item:
-            return None
-        value, exp = item
-        if exp is not None and exp < time.time():
-            try:
-                del self._store[key]
-            except Exception:
-                pass
-            return None
-        return value
-    def set(self, key, value, ttl_seconds: int = 60):
-        exp = (time.time() + ttl_seconds) if ttl_seconds else None
-        self._store[key] = (value, exp)
-
+# Собственный экземпляр кэша обработчиков исполнителя (класс общий — shared_cache.TTLCache)
 cache = TTLCache()
 
 # Защита от множественных одновременных вызовов
 _show_new_tasks_locks = {}  # {user_id: asyncio.Lock}
 
+# Поля задачи для карточки исполнителя: пользовательские поля запрашиваются по ID (82 — контакт, 84 — телефон)
+_TASK_DETAILS_FIELDS = "id,name,description,status,project.id,project.name,template.id,counterparty.id,counterparty.name,assignees,files,82,84"
+
+# Подписи статусов в карточке задачи (словарь ID -> подпись кэшируется реестром статусов)
+_STATUS_DISPLAY_LABELS = (
+    (StatusKey.NEW, "Новая"),
+    (StatusKey.IN_PROGRESS, "В работе"),
+    (StatusKey.INFO_SENT, "Отправлена информация"),
+    (StatusKey.COMPLETED, "Выполненная"),
+    (StatusKey.POSTPONED, "Отложенная"),
+    (StatusKey.FINISHED, "Завершенная"),
+    (StatusKey.CANCELLED, "Отменена"),
+    (StatusKey.REJECTED, "Отклонена"),
+)
+_PAUSED_KEYWORDS = ("отлож", "paused")
+
+# Состояния ввода текста, в которых «#123» — это не запрос карточки задачи
+_SKIP_STATES = frozenset({
+    CommentFlow.waiting_for_text.state,
+    CommentFlow.waiting_for_task_id.state,
+    TicketCreation.entering_description.state,
+})
+
+# Извлечение телефона и заявителя из описания задачи (если пользовательские поля пусты)
+_RE_PHONE_FALLBACK = re.compile(r"Телефон:\s*([+\d][\d\s\-()]+)")
+_RE_APPLICANT_FALLBACK = re.compile(r"Заявитель:\s*([^\n\r]*?)(?=\s*(Телефон:|Описани|Создано|$))", re.IGNORECASE)
+# Нормализация телефона, введённого исполнителем
+_PHONE_KEEP_RE = re.compile(r"[^0-9+]")
+_PHONE_DIGITS_RE = re.compile(r"\D")
+# Бот пишет «Заявитель:»/«Телефон:» в начало описания — дальше первых 4 КБ не ищем
+_DESCRIPTION_SCAN_LIMIT = 4096
+_DESCRIPTION_PREVIEW_LIMIT = 500
+
+# Максимум одновременных загрузок вложений задачи из Planfix
+_FILE_DOWNLOAD_CONCURRENCY = 5
+# Фоновые проверки назначения после принятия задачи — не больше 3 одновременно, чтобы не нагружать Planfix
+_assignment_verify_semaphore = asyncio.Semaphore(3)
+# Блокировки принятия задач по task_id; запись исчезает, когда блокировка больше никем не удерживается
+_accept_task_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+# Блокировки фонового сохранения профиля по telegram_id: изменения одного исполнителя пишутся по порядку
+_profile_write_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+# Последнее нажатие переключателя выбора: (telegram_id, callback_data) -> time.monotonic();
+# повторное нажатие той же кнопки в течение _TOGGLE_DEBOUNCE_SECONDS считаем двойным тапом и отбрасываем
+_toggle_last_click: Dict[tuple, float] = {}
+_TOGGLE_DEBOUNCE_SECONDS = 0.5
+# Ещё не записанные изменения профиля: telegram_id -> (поля, тексты ошибок для исполнителя)
+_pending_profile_updates: Dict[int, tuple] = {}
+# Сильные ссылки на фоновые задачи (запись профиля, проверка назначения, подгрузка контрагентов):
+# цикл событий держит задачи только по слабой ссылке
+_background_tasks: Set[asyncio.Task] = set()
+# Статусы профиля исполнителя (в нормализованном виде: без пробелов по краям, в нижнем регистре)
+_ACTIVE_STATUSES = frozenset({"активен"})
+_INACTIVE_STATUS_MESSAGES = {
+    "ожидает подтверждения": "⏳ Ваш профиль ожидает подтверждения администратором.",
+    "отклонён": "❌ Ваша регистрация была отклонена. Обратитесь к администратору.",
+    "отклонен": "❌ Ваша регистрация была отклонена. Обратитесь к администратору.",
+}
+# Концепции в порядке вывода на клавиатуре выбора (FRANCHISE_GROUPS не меняется во время работы)
+_SORTED_FRANCHISE_GROUPS = tuple(sorted(FRANCHISE_GROUPS.items(), key=lambda item: item[1]["name"]))
+# Названия концепций по ID — для вывода выбранных концепций
+_FRANCHISE_NAME_BY_ID = {cid: data["name"] for cid, data in FRANCHISE_GROUPS.items()}
+# Допустимые ID концепций — для проверки нажатых кнопок выбора
+_FRANCHISE_GROUP_IDS: FrozenSet[int] = frozenset(FRANCHISE_GROUPS)
+# Расширения, которые отправляем в Telegram как фото; всё остальное — документом
+_IMAGE_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'})
+# Ограничение размера вложения (50 МБ) для безопасности
+_MAX_ATTACHMENT_SIZE = 50 * 1024 * 1024
+
+
+def _spawn_background(coro) -> asyncio.Task:
+    """Запускает корутину в фоне, удерживая ссылку на задачу до её завершения."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+class PlanfixStreamInputFile(InputFile):
+    """Файл Planfix, который передаётся в Telegram потоком, не загружаясь в память целиком."""
+
+    def __init__(self, file_id: int, filename: str, chunk_size: int = 64 * 1024):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.file_id = file_id
+
+    async def read(self, bot):
+        async for chunk in planfix_client.iter_file_chunks(
+            self.file_id, chunk_size=self.chunk_size, max_size=_MAX_ATTACHMENT_SIZE
+        ):
+            yield chunk
+
+# Разделитель и шаблон строки списка заявок (собираются один раз при импорте)
+_DIVIDER = "────────────────────"
+_TASK_LIST_ITEM_TPL = (
+    "📋 <b>#{tid}</b> – {status}\n"
+    "🏪 <b>Ресторан:</b> {cp}\n"
+    "📝 <b>Описание:</b> {name}\n"
+    + _DIVIDER
+)
+
 DIRECTION_LABELS = {
     "it": "ИТ служба",
     "se": "Служба эксплуатации",
@@ -217,15 +312,75 @@ def _extract_restaurant_ids(data) -> List[int]:
     return ids
 
 
+def _allowed_restaurant_ids(executor) -> FrozenSet[int]:
+    """Рестораны исполнителя в виде множества; разбираем serving_restaurants один раз на объект профиля.
+
+    Профиль из кэша переиспользуется между обработчиками, а при изменении ресторанов список
+    присваивается заново — поэтому сверяем, что запомненное множество построено из того же списка.
+    """
+    source = executor.serving_restaurants
+    cached = getattr(executor, "_allowed_restaurant_ids_cache", None)
+    if cached is not None and cached[0] is source:
+        return cached[1]
+    ids = frozenset(_extract_restaurant_ids(source))
+    try:
+        executor._allowed_restaurant_ids_cache = (source, ids)
+    except Exception:
+        pass
+    return ids
+
+
 def _normalize_pf_id(value) -> int | None:
+    """Приводит ID Planfix вида «prefix:123» или «123» к int (None, если не удалось)."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = value.rpartition(':')[2]
     try:
-        if isinstance(value, str) and ':' in value:
-            value = value.split(':')[-1]
         return int(value)
     except (TypeError, ValueError):
         return None
 
 
+def _normalized_status(executor) -> str:
+    return (executor.profile_status or "").strip().lower()
+
+
+def _is_active_executor(executor) -> bool:
+    return executor is not None and _normalized_status(executor) in _ACTIVE_STATUSES
+
+
+def _parse_task_status(task: dict) -> tuple[int | None, str | None]:
+    """Возвращает (ID, название) статуса задачи; поддерживает разные форматы ответа API."""
+    status_id = None
+    status_name = None
+    raw_status = task.get('status')
+    if isinstance(raw_status, dict):
+        status_name = raw_status.get('name')
+        status_id = _normalize_pf_id(raw_status.get('id'))
+    elif isinstance(raw_status, (int, str)):
+        status_id = _normalize_pf_id(raw_status)
+    if status_id is None:
+        status_id = _normalize_pf_id(task.get('statusId') or task.get('status_id'))
+    return status_id, status_name
+
+
+_BOT_TASK_NAME_PREFIX = 'запрос через бот'
+
+
+def _is_bot_task(task: dict) -> bool:
+    """Проверяет, создана ли задача через Telegram-бота (по названию или описанию)."""
+    task_name_value = task.get('name') or ''
+    # Для startswith достаточно привести к нижнему регистру только начало названия
+    if task_name_value[:len(_BOT_TASK_NAME_PREFIX)].lower() == _BOT_TASK_NAME_PREFIX:
+        return True
+    description_value = task.get('description') or ''
+    if 'Создано через Telegram бот' in description_value:
+        return True
+    # Описание (может быть в несколько КБ) приводим к нижнему регистру один раз и только если дешёвые проверки не сработали
+    return 'telegram бот' in description_value.lower()
+
+
 def _get_allowed_tags(executor) -> Set[str]:
     """Возвращает допустимые теги задач для исполнителя на основе направления."""
     if not executor:
@@ -295,8 +450,16 @@ def _extract_task_tags(task: dict) -> Set[str]:
 
 
 async def _load_restaurant_map(concept_ids: List[int]) -> Dict[int, str]:
-    """Загружает карту ресторанов из групп концепций, исключая контакты из группы 'Поддержка'."""
-    from config import SUPPORT_CONTACT_GROUP_ID
+    """Загружает карту ресторанов из групп концепций, исключая контакты из группы 'Поддержка'.
+
+    Карта упорядочена по названию ресторана. Полностью загруженная карта кэшируется на 10 минут
+    (вызывающие её не изменяют).
+    """
+    cache_key = f"restaurant_map:{','.join(map(str, sorted(concept_ids)))}"
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+    complete = True
     restaurants_map: Dict[int, str] = {}
     support_group_id = SUPPORT_CONTACT_GROUP_ID
     
@@ -342,12 +505,28 @@ async def _load_restaurant_map(concept_ids: List[int]) -> Dict[int, str]:
                     name = (c.get('name') or f"Контакт {cid}").strip()
                     restaurants_map[cid] = name
             else:
+                complete = False
                 logger.warning(f"Failed to load contacts for group {group_id}")
         except Exception as e:
+            complete = False
             logger.error(f"Error loading contacts for group {group_id}: {e}")
+    # Сортируем по названию один раз при загрузке — клавиатуры выбора выводят карту в готовом порядке
+    restaurants_map = dict(sorted(restaurants_map.items(), key=lambda item: item[1]))
+    if complete and restaurants_map:
+        cache.set(cache_key, restaurants_map, ttl_seconds=600)
     return restaurants_map
 
 
+async def _restaurant_map_from_state(state: FSMContext) -> Dict[int, str]:
+    """Карта ресторанов, загруженная при открытии редактирования (в FSM — список пар [id, название]).
+
+    Переключатели и «Готово» работают только с ней и не обращаются к Planfix,
+    даже если при открытии список удалось загрузить лишь частично и он не попал в кэш.
+    """
+    data = await state.get_data()
+    return {int(rid): name for rid, name in data.get("exec_restaurant_map") or []}
+
+
 def _format_restaurant_list(restaurants) -> str:
     names = []
     for item in restaurants or []:
@@ -381,7 +560,6 @@ async def resolve_counterparty_name(task: dict) -> str:
         # Стратегия 2.7: восстановление через BotLog -> user -> restaurant_contact_id
         try:
             logger.info(f"[Task #{task_id}] Strategy 2.7: Attempting to resolve via BotLog mapping...")
-            from database import BotLog, UserProfile
             with db_manager.get_db() as db:
                 logs = db.query(BotLog).filter(BotLog.action == 'create_task').order_by(BotLog.timestamp.desc()).limit(500).all()
                 matched_tg = None
@@ -389,7 +567,6 @@ async def resolve_counterparty_name(task: dict) -> str:
                     try:
                         details = log.details or {}
                         if isinstance(details, str):
-                            import json
                             try:
                                 details = json.loads(details)
                             except Exception:
@@ -426,6 +603,92 @@ async def resolve_counterparty_name(task: dict) -> str:
     logger.warning(f"[Task #{task.get('id', 'unknown')}] Strategy 2.7 did not resolve name. Returning 'Не указан'")
     return "Не указан"
 
+
+async def _fetch_contact_name(cid: int) -> str | None:
+    """Возвращает отображаемое имя контакта Planfix или None, если его не удалось получить."""
+    try:
+        resp = await planfix_client.get_contact_by_id(cid, fields="id,name,midName,lastName,isCompany")
+        if resp and resp.get('result') == 'success':
+            contact_info = extract_contact_info(resp.get('contact') or {})
+            name = contact_info.get('name')
+            if name and name != "Неизвестно":
+                return name
+    except Exception as e:
+        logger.warning(f"Failed to load contact {cid}: {e}")
+    return None
+
+
+async def resolve_counterparty_names_bulk(tasks: List[dict]) -> Dict[int, str]:
+    """
+    Пакетный вариант resolve_counterparty_name (стратегия 2.7) для целой страницы задач.
+    BotLog и UserProfile читаются одним проходом, каждый контакт запрашивается в Planfix один раз.
+    Возвращает {task_id: имя}; для нераспознанных задач — "Не указан".
+    """
+    wanted: Set[int] = set()
+    for t in tasks:
+        tid = _normalize_pf_id(t.get('id'))
+        if tid is not None:
+            wanted.add(tid)
+    if not wanted:
+        return {}
+
+    task_to_contact: Dict[int, int] = {}
+    try:
+        with db_manager.get_db() as db:
+            logs = db.query(BotLog).filter(BotLog.action == 'create_task').order_by(BotLog.timestamp.desc()).limit(500).all()
+            task_to_tg: Dict[int, int] = {}
+            for log in logs:
+                details = log.details or {}
+                if isinstance(details, str):
+                    try:
+                        details = json.loads(details)
+                    except Exception:
+                        continue
+                log_task_id = _normalize_pf_id(details.get('task_id'))
+                if log_task_id in wanted and log_task_id not in task_to_tg:
+                    tg_id = details.get('user_telegram_id') or log.telegram_id
+                    try:
+                        task_to_tg[log_task_id] = int(tg_id)
+                    except (TypeError, ValueError):
+                        continue
+            if task_to_tg:
+                users = db.query(UserProfile.telegram_id, UserProfile.restaurant_contact_id).filter(
+                    UserProfile.telegram_id.in_(set(task_to_tg.values()))
+                ).all()
+                tg_to_contact = {}
+                for tg_id, contact_id in users:
+                    cid = _normalize_pf_id(contact_id)
+                    if cid:
+                        tg_to_contact[tg_id] = cid
+                for tid, tg_id in task_to_tg.items():
+                    if tg_id in tg_to_contact:
+                        task_to_contact[tid] = tg_to_contact[tg_id]
+    except Exception as e:
+        logger.error(f"Bulk counterparty resolve: failed to read BotLog/UserProfile mapping: {e}", exc_info=True)
+
+    contact_ids = sorted(set(task_to_contact.values()))
+    names = await asyncio.gather(*(_fetch_contact_name(cid) for cid in contact_ids))
+    contact_names = dict(zip(contact_ids, names, strict=True))
+
+    result: Dict[int, str] = {}
+    for tid in wanted:
+        cid = task_to_contact.get(tid)
+        result[tid] = (contact_names.get(cid) if cid else None) or "Не указан"
+    logger.info(f"Bulk counterparty resolve: {len(wanted)} tasks, {len(contact_ids)} contacts fetched")
+    return result
+
+
+async def _bulk_prefill_cp(tasks: List[dict]):
+    """Фоново заполняет кэш cp_name:* для всех задач видимой страницы одним пакетным вызовом."""
+    try:
+        names = await resolve_counterparty_names_bulk(tasks)
+        for t in tasks:
+            tid = _normalize_pf_id(t.get('id'))
+            if tid in names:
+                cache.set(f"cp_name:{t.get('id')}", names[tid], ttl_seconds=300)
+    except Exception as e:
+        logger.warning(f"Failed to prefill counterparty names: {e}")
+
 async def resolve_project_name(task: dict) -> str:
     try:
         proj = task.get('project') or {}
@@ -491,7 +754,6 @@ async def resolve_project_name(task: dict) -> str:
         
         # Фолбэк через BotLog: восстановить project_id по task_id из лога создания
         try:
-            from database import BotLog
             with db_manager.get_db() as db:
                 logs = db.query(BotLog).filter(BotLog.action == 'create_task').order_by(BotLog.timestamp.desc()).limit(500).all()
                 t_id = task.get('id')
@@ -500,7 +762,6 @@ async def resolve_project_name(task: dict) -> str:
                     try:
                         details = log.details or {}
                         if isinstance(details, str):
-                            import json
                             try:
                                 details = json.loads(details)
                             except Exception:
@@ -629,11 +890,10 @@ async def executor_process_phone_contact(message: Message, state: FSMContext):
 @router.message(ExecutorRegistration.waiting_for_phone_number, F.text)
 async def executor_process_phone_text(message: Message, state: FSMContext):
     """Обработка номера телефона введенного вручную."""
-    import re
     phone_text = message.text.strip()
     
-    normalized = re.sub(r"[^0-9+]", "", phone_text)
-    if not normalized or len(re.sub(r"\D", "", normalized)) < 10:
+    normalized = _PHONE_KEEP_RE.sub("", phone_text)
+    if not normalized or len(_PHONE_DIGITS_RE.sub("", normalized)) < 10:
         await message.answer(
             "❌ Некорректный номер телефона.\n\n"
             "Введите номер в формате +79991234567 или используйте кнопку:",
@@ -685,7 +945,7 @@ async def executor_ask_direction(target_message: Message, state: FSMContext):
 @router.callback_query(ExecutorRegistration.waiting_for_direction, F.data.startswith("reg_dir:"))
 async def executor_process_direction(callback_query: CallbackQuery, state: FSMContext):
     """Сохранение выбранного направления."""
-    direction = callback_query.data.split(":")[1]
+    direction = callback_query.data.partition(":")[2]
     if direction not in ("it", "se"):
         await callback_query.answer("Недопустимое направление", show_alert=True)
         return
@@ -727,6 +987,9 @@ async def executor_process_concept(callback_query: CallbackQuery, state: FSMCont
         return
     
     concept_id = int(callback_query.data)
+    if concept_id not in _FRANCHISE_GROUP_IDS:
+        await callback_query.answer("Недопустимая концепция", show_alert=True)
+        return
     user_data = await state.get_data()
     selected_concepts = user_data.get('selected_concepts', [])
     
@@ -739,10 +1002,10 @@ async def executor_process_concept(callback_query: CallbackQuery, state: FSMCont
     
     await state.update_data(selected_concepts=selected_concepts)
     
-    concept_name = FRANCHISE_GROUPS[concept_id]["name"]
+    concept_name = _FRANCHISE_NAME_BY_ID[concept_id]
     
     # Обновляем сообщение с текущим выбором
-    selected_names = [FRANCHISE_GROUPS[cid]["name"] for cid in selected_concepts]
+    selected_names = [_FRANCHISE_NAME_BY_ID[cid] for cid in selected_concepts]
     
     keyboard_items = [
         (str(group_id), f"{'✅ ' if group_id in selected_concepts else ''}{group_data['name']}")
@@ -779,7 +1042,7 @@ async def executor_show_restaurants(callback_query: CallbackQuery, state: FSMCon
             await callback_query.answer("❌ Не удалось загрузить рестораны", show_alert=True)
             return
 
-        keyboard_items = [(str(cid), name) for cid, name in sorted(restaurants_map.items(), key=lambda x: x[1])]
+        keyboard_items = [(str(cid), name) for cid, name in restaurants_map.items()]
         keyboard = create_dynamic_keyboard(keyboard_items, add_cancel_button=False)
 
         await state.update_data(available_restaurants=restaurants_map, selected_restaurants=[])
@@ -821,7 +1084,8 @@ async def executor_process_restaurant(callback_query: CallbackQuery, state: FSMC
     await state.update_data(selected_restaurants=selected_restaurants)
 
     keyboard_items = []
-    for cid, name in sorted(available_restaurants.items(), key=lambda x: x[1]):
+    # Карта из _load_restaurant_map уже упорядочена по названию
+    for cid, name in available_restaurants.items():
         prefix = "✅ " if cid in selected_restaurants else ""
         keyboard_items.append((str(cid), f"{prefix}{name}"))
     if selected_restaurants:
@@ -875,7 +1139,6 @@ async def executor_finalize_registration(callback_query: CallbackQuery, state: F
         planfix_user_id = None  # Инициализируем переменную
         try:
             # Создаем контакт исполнителя в группе "Поддержка" с template_id
-            from config import SUPPORT_CONTACT_GROUP_ID, SUPPORT_CONTACT_TEMPLATE_ID
             
             # Передаем полное имя, чтобы метод create_contact сам правильно разделил ФИО
             # Это избежит конфликтов с логикой разделения внутри метода
@@ -948,7 +1211,7 @@ async def executor_finalize_registration(callback_query: CallbackQuery, state: F
             )
         
         # Создаем задачу в Planfix для подтверждения регистрации (по ТЗ)
-        concept_names = [FRANCHISE_GROUPS[cid]["name"] for cid in selected_concepts]
+        concept_names = [_FRANCHISE_NAME_BY_ID[cid] for cid in selected_concepts]
         
         try:
             # Формируем описание задачи (используем \n вместо реальных переводов строк)
@@ -974,7 +1237,6 @@ async def executor_finalize_registration(callback_query: CallbackQuery, state: F
                     # Убеждаемся, что status registry загружен
                     await ensure_status_registry_loaded()
                     # Получаем ID статуса "Новая" из процесса
-                    from services.status_registry import get_status_id
                     initial_status_id = get_status_id(StatusKey.NEW, required=False)
                     if initial_status_id:
                         logger.info(f"Using initial status {initial_status_id} (NEW) from process {PLANFIX_TASK_PROCESS_ID}")
@@ -1181,7 +1443,7 @@ async def cmd_approve_executor(message: Message, state: FSMContext):
         return
     
     # Запрашиваем Planfix User ID
-    concept_names = [FRANCHISE_GROUPS[cid]["name"] for cid in executor.serving_franchise_groups]
+    concept_names = [_FRANCHISE_NAME_BY_ID[cid] for cid in executor.serving_franchise_groups]
     await message.answer(
         f"👤 Подтверждение исполнителя:\n\n"
         f"ФИО: {executor.full_name}\n"
@@ -1229,7 +1491,7 @@ async def process_planfix_user_id(message: Message, state: FSMContext):
     )
     
     # Уведомляем исполнителя
-    concept_names = [FRANCHISE_GROUPS[cid]["name"] for cid in executor.serving_franchise_groups]
+    concept_names = [_FRANCHISE_NAME_BY_ID[cid] for cid in executor.serving_franchise_groups]
     try:
         await message.bot.send_message(
             executor_id,
@@ -1405,7 +1667,7 @@ async def callback_confirm_executor(callback_query: CallbackQuery, state: FSMCon
         return
     
     # Запрашиваем Planfix User ID
-    concept_names = [FRANCHISE_GROUPS[cid]["name"] for cid in executor.serving_franchise_groups]
+    concept_names = [_FRANCHISE_NAME_BY_ID[cid] for cid in executor.serving_franchise_groups]
     
     await callback_query.message.answer(
         f"👤 Подтверждение исполнителя:\n\n"
@@ -1477,6 +1739,13 @@ async def show_new_tasks(message: Message, state: FSMContext):
         )
         return
     
+    # Быстрый путь: недавно сформированный список отдаём из кэша без обращения к БД и Planfix
+    cached_result = cache.get(f"new_tasks:{user_id}")
+    if cached_result:
+        logger.info(f"Returning cached new tasks list for user {user_id}")
+        await message.answer(cached_result["text"], reply_markup=cached_result.get("kb"), parse_mode="HTML")
+        return
+    
     # Защита от множественных одновременных вызовов
     if user_id not in _show_new_tasks_locks:
         _show_new_tasks_locks[user_id] = asyncio.Lock()
@@ -1491,29 +1760,12 @@ async def show_new_tasks(message: Message, state: FSMContext):
         )
         return
     
-    # Проверяем кэш (защита от слишком частых запросов)
-    cache_key = f"new_tasks_request:{user_id}"
-    last_request_time = cache.get(f"{cache_key}:time")
-    if last_request_time and time.time() - last_request_time < 5:  # Минимум 5 секунд между запросами
-        cached_result = cache.get(f"{cache_key}:result")
-        if cached_result:
-            logger.info(f"Returning cached result for user {user_id}")
-            await message.answer(cached_result["text"], reply_markup=cached_result.get("kb"))
-            return
-    
     async with lock:
         try:
-            # Явно импортируем функции для избежания конфликтов
-            from services.status_registry import (
-                collect_status_ids as _collect_status_ids,
-                StatusKey,
-                require_status_id,
-            )
-            
             await ensure_status_registry_loaded()
             
             allowed_templates = _get_allowed_template_ids(executor)
-            allowed_restaurant_ids = set(_extract_restaurant_ids(executor.serving_restaurants))
+            allowed_restaurant_ids = _allowed_restaurant_ids(executor)
             allowed_tags = _get_allowed_tags(executor)
             allowed_tag_names = {tag.lower() for tag in allowed_tags if isinstance(tag, str)}
             
@@ -1527,7 +1779,7 @@ async def show_new_tasks(message: Message, state: FSMContext):
             )
 
             # Показываем только задачи со статусом "Новая"
-            working_status_ids = _collect_status_ids(
+            working_status_ids = collect_status_ids(
                 (StatusKey.NEW,),
                 required=False,
             )
@@ -1548,7 +1800,6 @@ async def show_new_tasks(message: Message, state: FSMContext):
             bot_task_ids_set = set()
             try:
                 with db_manager.get_db() as db:
-                    from database import BotLog
                     bot_logs = db.query(BotLog).filter(
                         BotLog.action == "create_task",
                         BotLog.success == True
@@ -1782,7 +2033,7 @@ async def show_new_tasks(message: Message, state: FSMContext):
                         # ВАЖНО: Исключаем завершенные, отмененные и отклоненные задачи
                         # Даже если они попали в запрос, не показываем их
                         try:
-                            final_status_ids = _collect_status_ids(
+                            final_status_ids = collect_status_ids(
                                 (StatusKey.COMPLETED, StatusKey.FINISHED, StatusKey.CANCELLED, StatusKey.REJECTED),
                                 required=False
                             )
@@ -1940,7 +2191,6 @@ async def show_new_tasks(message: Message, state: FSMContext):
                 # ПРИОРИТЕТ 1: Проверяем BotLog (наиболее надежный способ)
                 try:
                     with db_manager.get_db() as db:
-                        from database import BotLog
                         # Ищем задачу в BotLog по task_id (может быть сохранен как id или generalId)
                         bot_logs = db.query(BotLog).filter(
                             BotLog.action == "create_task",
@@ -2021,7 +2271,6 @@ async def show_new_tasks(message: Message, state: FSMContext):
                 recent_time = datetime.now() - timedelta(hours=1)  # Задачи за последний час
                 
                 with db_manager.get_db() as db:
-                    from database import BotLog
                     recent_bot_logs = db.query(BotLog).filter(
                         BotLog.action == "create_task",
                         BotLog.success == True,
@@ -2111,7 +2360,7 @@ async def show_new_tasks(message: Message, state: FSMContext):
                                         
                                         # Проверяем, не является ли задача завершенной
                                         try:
-                                            final_status_ids = _collect_status_ids(
+                                            final_status_ids = collect_status_ids(
                                                 (StatusKey.COMPLETED, StatusKey.FINISHED, StatusKey.CANCELLED, StatusKey.REJECTED),
                                                 required=False
                                             )
@@ -2195,7 +2444,7 @@ async def show_new_tasks(message: Message, state: FSMContext):
                                                         
                                                         # Проверяем, не является ли задача завершенной
                                                         try:
-                                                            final_status_ids = _collect_status_ids(
+                                                            final_status_ids = collect_status_ids(
                                                                 (StatusKey.COMPLETED, StatusKey.FINISHED, StatusKey.CANCELLED, StatusKey.REJECTED),
                                                                 required=False
                                                             )
@@ -2329,7 +2578,6 @@ async def show_new_tasks(message: Message, state: FSMContext):
                 # Проверяем, есть ли задачи в BotLog для этого исполнителя
                 try:
                     with db_manager.get_db() as db:
-                        from database import BotLog
                         recent_bot_tasks = db.query(BotLog).filter(
                             BotLog.action == "create_task",
                             BotLog.success == True
@@ -2353,8 +2601,7 @@ async def show_new_tasks(message: Message, state: FSMContext):
             # Финальная проверка: исключаем задачи с финальными статусами из TaskCache
             tasks_to_show = []
             try:
-                from services.status_registry import collect_status_ids as _collect_status_ids, StatusKey, require_status_id
-                final_status_ids = _collect_status_ids(
+                final_status_ids = collect_status_ids(
                     (StatusKey.COMPLETED, StatusKey.FINISHED, StatusKey.CANCELLED, StatusKey.REJECTED),
                     required=False
                 )
@@ -2439,33 +2686,26 @@ async def show_new_tasks(message: Message, state: FSMContext):
             
             # Формируем список заявок
             lines = [f"🆕 <b>Новые заявки ({len(tasks_to_show)}):</b>\n"]
-            
-            for task in tasks_to_show[:10]:  # Показываем первые 10
+
+            visible_tasks = tasks_to_show[:10]  # Показываем первые 10
+            # КЭШ: контрагенты всей страницы подгружаются в фоне одним пакетным запросом
+            cp_missing = [t for t in visible_tasks if cache.get(f"cp_name:{t['id']}") is None]
+            if cp_missing:
+                _spawn_background(_bulk_prefill_cp(cp_missing))
+
+            # Статусы из TaskCache для всей страницы — одним запросом вне event loop
+            try:
+                cached_statuses = await db_manager.get_cached_task_statuses([t['id'] for t in visible_tasks])
+            except Exception:
+                cached_statuses = {}
+
+            for task in visible_tasks:
                 task_id = task['id']
                 task_name = task.get('name', 'Без названия')[:50]
-                # КЭШ: контрагент с фоновой подгрузкой (точечное ускорение)
-                _cp_key = f"cp_name:{task_id}"
-                counterparty = cache.get(_cp_key) or "Определяется…"
-                if counterparty == "Определяется…":
-                    async def _bg_resolve_cp(tid, tdata):
-                        try:
-                            name = await resolve_counterparty_name(tdata)
-                            cache.set(f"cp_name:{tid}", name, ttl_seconds=300)
-                        except Exception:
-                            pass
-                    asyncio.create_task(_bg_resolve_cp(task_id, task))
+                counterparty = cache.get(f"cp_name:{task_id}") or "Определяется…"
 
                 # Определяем и нормализуем статус (используем актуальный статус из TaskCache если доступен)
-                status_id = None
-                status_name = None
-                try:
-                    with db_manager.get_db() as db:
-                        task_cache = db_manager._manager.get_task_cache(db, task_id)
-                        if task_cache and task_cache.status_id:
-                            status_id = task_cache.status_id
-                            status_name = task_cache.status_name
-                except Exception:
-                    pass
+                status_id, status_name = cached_statuses.get(task_id, (None, None))
                 
                 # Если статус из кеша недоступен, используем статус из API
                 if status_id is None:
@@ -2494,18 +2734,17 @@ async def show_new_tasks(message: Message, state: FSMContext):
                 ).get(status_id, "Новая")
 
                             
-                lines.append(
-                    f"📋 <b>#{task_id}</b> – {status_display_name}\n"
-                    f"🏪 <b>Ресторан:</b> {counterparty}\n"
-                    f"📝 <b>Описание:</b> {task_name}\n"
-                    f"────────────────────"
-                )
+                lines.append(_TASK_LIST_ITEM_TPL.format(
+                    tid=task_id,
+                    status=status_display_name,
+                    cp=counterparty,
+                    name=task_name,
+                ))
             
             if len(all_new_tasks) > 10:
                 lines.append(f"\n💡 <i>... и ещё {len(all_new_tasks) - 10} заявок</i>")
             
             # Вместо ручного ввода показываем кнопки с номерами заявок
-            from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
             task_ids = [t.get('id') for t in all_new_tasks][:10]
             rows = []
             row = []
@@ -2519,11 +2758,10 @@ async def show_new_tasks(message: Message, state: FSMContext):
             kb = ReplyKeyboardMarkup(keyboard=rows, resize_keyboard=True, one_time_keyboard=True)
             lines.append("\n👇 <b>Выберите заявку кнопкой ниже:</b>")
             _final_text = "\n".join(lines)
-            # КЭШ: сохраняем сформированный вывод на короткий TTL
-            cache.set(f"new_tasks:{user_id}", {"text": _final_text, "kb": kb}, ttl_seconds=30)
-            # Сохраняем результат для защиты от частых запросов
-            cache.set(f"new_tasks_request:{user_id}:result", {"text": _final_text, "kb": kb}, ttl_seconds=10)
-            cache.set(f"new_tasks_request:{user_id}:time", time.time(), ttl_seconds=10)
+            # КЭШ: сохраняем сформированный вывод на короткий TTL (читается в быстром пути выше).
+            # Пока имена ресторанов подгружаются в фоне, не кэшируем текст с заглушками.
+            if not cp_missing:
+                cache.set(f"new_tasks:{user_id}", {"text": _final_text, "kb": kb}, ttl_seconds=30)
             
             await message.answer(_final_text, reply_markup=kb, parse_mode="HTML")
             
@@ -2544,6 +2782,36 @@ async def show_new_tasks(message: Message, state: FSMContext):
 # ПРОСМОТР ДЕТАЛЕЙ ЗАДАЧИ И УПРАВЛЕНИЕ
 # ============================================================================
 
+def _cache_sent_file_ids(planfix_file_ids: List, sent_messages: List, get_file_id) -> None:
+    """Запоминает file_id Telegram для отправленных вложений Planfix (tg_file:<id>), чтобы не скачивать их снова.
+
+    Сообщения медиагруппы приходят в порядке вложений; если их число не совпало, кэш не трогаем.
+    """
+    try:
+        pairs = list(zip(planfix_file_ids, sent_messages, strict=True))
+    except ValueError:
+        logger.warning(
+            f"Telegram returned {len(sent_messages)} messages for {len(planfix_file_ids)} files, "
+            f"file_id cache not updated"
+        )
+        return
+    for planfix_fid, sent in pairs:
+        file_id = get_file_id(sent) if sent else None
+        if file_id:
+            cache.set(f"tg_file:{planfix_fid}", file_id, ttl_seconds=86400)
+
+
+def _discard_jobs(*jobs) -> None:
+    """Отменяет незавершённые фоновые задачи и забирает исключения завершённых, чтобы они не терялись молча."""
+    for job in jobs:
+        if job is None:
+            continue
+        if not job.done():
+            job.cancel()
+        elif not job.cancelled() and job.exception() is not None:
+            logger.debug(f"Discarded background job failed: {job.exception()}")
+
+
 @router.message(
     F.text.regexp(r'^#?\d+$'),
     ~StateFilter(ExecutorTaskManagement.entering_comment)
@@ -2553,25 +2821,11 @@ async def show_task_details(message: Message, state: FSMContext):
     # Проверяем другие состояния пользователя, которые могут конфликтовать
     current_state = await state.get_state()
     logger.debug(f"show_task_details: current_state={current_state}, text={message.text}")
-    if current_state:
-        # Если пользователь находится в состоянии ввода комментария или описания, не обрабатываем это как номер задачи
-        from states import CommentFlow, TicketCreation
-        if (current_state == CommentFlow.waiting_for_text or
-            current_state == CommentFlow.waiting_for_task_id or
-            current_state == TicketCreation.entering_description):
-            logger.debug(f"show_task_details: skipping because state is {current_state}, letting other handler handle it")
-            return  # Пусть это обработает соответствующий обработчик состояния
+    # Если пользователь находится в состоянии ввода комментария или описания, не обрабатываем это как номер задачи
+    if current_state in _SKIP_STATES:
+        logger.debug(f"show_task_details: skipping because state is {current_state}, letting other handler handle it")
+        return  # Пусть это обработает соответствующий обработчик состояния
     
-    def _local_pf_id_to_int(raw_id):
-        try:
-            if isinstance(raw_id, int):
-                return raw_id
-            if isinstance(raw_id, str):
-                part = raw_id.split(':')[-1]
-                return int(part)
-        except Exception:
-            return None
-        return None
     executor = await db_manager.get_executor_profile(message.from_user.id)
     is_executor = bool(executor and executor.profile_status == "активен")
     user_profile = None
@@ -2581,12 +2835,33 @@ async def show_task_details(message: Message, state: FSMContext):
             return  # ни исполнитель, ни пользователь
     
     task_id = int(message.text.strip().lstrip('#'))
+
+    # Локальные проверки доступа — до запроса в Planfix
+    allowed_by_local_assignment = False
+    user_restaurant_id = None
+    if is_executor:
+        try:
+            allowed_by_local_assignment = await db_manager.has_active_assignment(task_id, executor.telegram_id)
+        except Exception:
+            allowed_by_local_assignment = False
+    else:
+        try:
+            user_restaurant_id = int(user_profile.restaurant_contact_id)
+        except Exception:
+            user_restaurant_id = None
+        if not user_restaurant_id:
+            # Ресторан пользователя не задан — ни одна задача не может ему принадлежать
+            await message.answer("❌ Эта задача не относится к вашему ресторану.")
+            return
     
+    # Фоновые запросы карточки: при ошибке до их ожидания отменяем их в finally
+    project_job = cp_job = comments_job = contact_job = None
     try:
-        # Получаем информацию о задаче
+        # Получаем информацию о задаче (только используемые поля; из пользовательских — 82 «Контакт» и 84 «Телефон»).
+        # Повторные открытия обслуживает кэш клиента; он сбрасывается при изменении задачи
         task_response = await planfix_client.get_task_by_id(
             task_id,
-            fields="id,name,description,status,statusId,project.id,project.name,template.id,counterparty.id,counterparty.name,assignees,customFieldData,files,dateTime"
+            fields=_TASK_DETAILS_FIELDS
         )
         
         if not task_response or task_response.get('result') != 'success':
@@ -2594,51 +2869,19 @@ async def show_task_details(message: Message, state: FSMContext):
             return
         
         task = task_response.get('task', {})
+        status_id, status_name = _parse_task_status(task)
+        is_bot_task = _is_bot_task(task)
         
         assignees_users = task.get('assignees', {}).get('users', [])
         is_assigned_to_executor = False
-        allowed_by_local_assignment = False
-        task_matches_executor = False
         if is_executor:
             is_assigned_to_executor = any(
-                _local_pf_id_to_int(a.get('id')) == int(executor.planfix_user_id)
+                _normalize_pf_id(a.get('id')) == int(executor.planfix_user_id)
                 for a in assignees_users
             ) if executor.planfix_user_id else False
-            task_matches_executor = _task_matches_executor(task, executor)
-            try:
-                from database import TaskAssignment
-                with db_manager.get_db() as db_sess:
-                    allowed_by_local_assignment = db_sess.query(TaskAssignment).filter(
-                        TaskAssignment.task_id == task_id,
-                        TaskAssignment.executor_telegram_id == executor.telegram_id,
-                        TaskAssignment.status == "active"
-                    ).first() is not None
-            except Exception:
-                allowed_by_local_assignment = False
 
             # Определяем, является ли задача "Новой"
-            raw_status = task.get('status', {})
-            task_status_id = None
-            if isinstance(raw_status, dict):
-                raw_status_id = raw_status.get('id')
-                if isinstance(raw_status_id, int):
-                    task_status_id = raw_status_id
-                elif isinstance(raw_status_id, str):
-                    try:
-                        task_status_id = int(str(raw_status_id).split(':')[-1])
-                    except Exception:
-                        pass
-            
-            is_new_status = is_status(task_status_id, StatusKey.NEW) if task_status_id else False
-            
-            # Проверяем, создана ли задача через бота
-            task_name_value = task.get('name') or ''
-            description_value = task.get('description') or ''
-            is_bot_task = (
-                task_name_value.lower().startswith('запрос через бот') or 
-                'Создано через Telegram бот' in description_value or
-                'telegram бот' in description_value.lower()
-            )
+            is_new_status = is_status(status_id, StatusKey.NEW) if status_id else False
             
             # Если задача уже принята в работу или назначена - разрешаем доступ
             # Если задача в статусе "Новая" и создана через бота - разрешаем доступ 
@@ -2649,174 +2892,101 @@ async def show_task_details(message: Message, state: FSMContext):
                 # так как они уже прошли фильтрацию в "Новые заявки"
                 if not is_new_status or not is_bot_task:
                     # Для остальных задач - строгая проверка фильтров
-                    if not task_matches_executor:
+                    if not _task_matches_executor(task, executor):
                         logger.warning(
                             f"Executor {executor.telegram_id} tried to access task {task_id} "
                             f"that doesn't match filters: template_id={_normalize_pf_id((task.get('template') or {}).get('id'))}, "
                             f"counterparty_id={_normalize_pf_id((task.get('counterparty') or {}).get('id'))}, "
                             f"executor_templates={_get_allowed_template_ids(executor)}, "
-                            f"executor_restaurants={set(_extract_restaurant_ids(executor.serving_restaurants))}, "
-                            f"status_id={task_status_id}, is_new={is_new_status}, is_bot_task={is_bot_task}"
+                            f"executor_restaurants={set(_allowed_restaurant_ids(executor))}, "
+                            f"status_id={status_id}, is_new={is_new_status}, is_bot_task={is_bot_task}"
                         )
                         await message.answer("❌ Эта задача не относится к вашим ресторанам или направлению.")
                         return
                 # Для is_new_status and is_bot_task - доступ разрешён, продолжаем
         else:
             counterparty_id = _normalize_pf_id((task.get('counterparty') or {}).get('id'))
-            try:
-                user_restaurant_id = int(user_profile.restaurant_contact_id)
-            except Exception:
-                user_restaurant_id = None
             if not counterparty_id or counterparty_id != user_restaurant_id:
                 await message.answer("❌ Эта задача не относится к вашему ресторану.")
                 return
         
-        # Нормализуем статус задачи (поддерживаем разные форматы из API)
-        status_id = None
-        status_name = None
-        raw_status = task.get('status')
-        try:
-            if isinstance(raw_status, dict):
-                raw_status_id = raw_status.get('id')
-                status_name = raw_status.get('name')
-                if isinstance(raw_status_id, int):
-                    status_id = raw_status_id
-                elif isinstance(raw_status_id, str):
-                    try:
-                        status_id = int(raw_status_id.split(':')[-1])
-                    except Exception:
-                        status_id = None
-            elif isinstance(raw_status, (int, str)):
-                if isinstance(raw_status, int):
-                    status_id = raw_status
-                else:
-                    try:
-                        status_id = int(str(raw_status).split(':')[-1])
-                    except Exception:
-                        status_id = None
-            if status_id is None:
-                alt_status_id = task.get('statusId') or task.get('status_id')
-                if isinstance(alt_status_id, int):
-                    status_id = alt_status_id
-                elif isinstance(alt_status_id, str):
-                    try:
-                        status_id = int(alt_status_id.split(':')[-1])
-                    except Exception:
-                        status_id = None
-        except Exception:
-            status_id = None
-            status_name = None
-
         if not status_name and status_id is not None:
-            status_name = status_labels(
-                (
-                    (StatusKey.NEW, "Новая"),
-                    (StatusKey.IN_PROGRESS, "В работе"),
-                    (StatusKey.INFO_SENT, "Отправлена информация"),
-                    (StatusKey.COMPLETED, "Выполненная"),
-                    (StatusKey.POSTPONED, "Отложенная"),
-                )
-            ).get(status_id)
+            status_name = status_labels(_STATUS_DISPLAY_LABELS).get(status_id)
 
         # Fallback: если статус не определён, но задача создана через бота, считаем её «Новая»
-        try:
-            task_name_value = task.get('name') or ''
-            description_value = task.get('description') or ''
-            is_bot_task_marker = task_name_value.lower().startswith('запрос через бот') or ('Создано через Telegram бот' in description_value)
-            if status_id is None and not status_name and is_bot_task_marker:
-                status_id = resolve_status_id(StatusKey.NEW, required=False)
-                status_name = "Новая"
-        except Exception:
-            pass
+        if status_id is None and not status_name and is_bot_task:
+            status_id = resolve_status_id(StatusKey.NEW, required=False)
+            status_name = "Новая"
 
         # Формируем детальную информацию
         task_name = task.get('name', 'Без названия')
         description = task.get('description', 'Нет описания')
-        # КЭШ: контрагент для деталей без ожидания
+        # Независимые запросы (проект, контрагент, комментарии с файлами) выполняем параллельно
+        project_job = asyncio.create_task(resolve_project_name(task))
         _cp_key = f"cp_name:{task_id}"
-        counterparty = cache.get(_cp_key) or "Определяется…"
-        if counterparty == "Определяется…":
-            async def _bg_resolve_cp_details(tid, tdata):
-                try:
-                    name = await resolve_counterparty_name(tdata)
-                    cache.set(f"cp_name:{tid}", name, ttl_seconds=300)
-                except Exception:
-                    pass
-            asyncio.create_task(_bg_resolve_cp_details(task_id, task))
-        project_name = await resolve_project_name(task)
+        counterparty = cache.get(_cp_key)
+        cp_job = asyncio.create_task(resolve_counterparty_name(task)) if counterparty is None else None
+        comment_files = cache.get(f"task_comment_files:{task_id}")
+        comments_job = asyncio.create_task(
+            planfix_client.get_task_comments(task_id, fields="id,dateTime,files", offset=0, page_size=5)
+        ) if comment_files is None else None
         
         # Извлекаем кастомные поля
         custom_fields = task.get('customFieldData', [])
         phone = "Не указан"
         contact_name = "Не указан"
+        contact_cid = None
         
-        for field in custom_fields:
-            field_id = field.get('field', {}).get('id')
-            if field_id == 84:  # Номер телефона
-                phone = field.get('value', 'Не указан')
-            elif field_id == 82:  # Контакт
-                try:
-                    val = field.get('value')
-                    if isinstance(val, dict):
-                        # Если имя есть в значении поля — используем его
-                        nm = (val.get('name') or '').strip()
-                        if nm:
-                            contact_name = nm
-                        else:
-                            # Пытаемся получить id контакта и запросить полное имя через API
-                            cid_raw = val.get('id')
-                            cid = None
-                            if cid_raw:
-                                if isinstance(cid_raw, str) and ':' in cid_raw:
-                                    try:
-                                        cid = int(cid_raw.split(':')[-1])
-                                    except Exception:
-                                        cid = None
-                                else:
-                                    try:
-                                        cid = int(cid_raw)
-                                    except Exception:
-                                        cid = None
-                            if cid:
-                                try:
-                                    resp = await planfix_client.get_contact_by_id(cid, fields="id,name,midName,lastName,isCompany")
-                                    if resp and resp.get('result') == 'success':
-                                        contact = resp.get('contact') or {}
-                                        info = extract_contact_info(contact)
-                                        if info.get('name') and info['name'] != "Неизвестно":
-                                            contact_name = info['name']
-                                except Exception:
-                                    pass
+        # Индексируем кастомные поля по ID: нужны только 84 «Телефон» и 82 «Контакт»
+        fields_by_id = {(f.get('field') or {}).get('id'): f for f in custom_fields if isinstance(f, dict)}
+        phone_field = fields_by_id.get(84)
+        if phone_field is not None:
+            phone = phone_field.get('value', 'Не указан')
+        contact_field = fields_by_id.get(82)
+        if contact_field is not None:
+            try:
+                val = contact_field.get('value')
+                if isinstance(val, dict):
+                    # Если имя есть в значении поля — используем его
+                    nm = (val.get('name') or '').strip()
+                    if nm:
+                        contact_name = nm
                     else:
-                        # Значение может быть строкой с ID контакта
-                        cid = None
-                        if isinstance(val, str):
-                            try:
-                                cid = int(val.split(':')[-1]) if ':' in val else int(val)
-                            except Exception:
-                                cid = None
-                        if cid:
-                            try:
-                                resp = await planfix_client.get_contact_by_id(cid, fields="id,name,midName,lastName,isCompany")
-                                if resp and resp.get('result') == 'success':
-                                    contact = resp.get('contact') or {}
-                                    info = extract_contact_info(contact)
-                                    if info.get('name') and info['name'] != "Неизвестно":
-                                        contact_name = info['name']
-                            except Exception:
-                                pass
-                except Exception:
-                    pass
+                        # Запоминаем id контакта — полное имя запросим через API вместе с остальными запросами
+                        contact_cid = _normalize_pf_id(val.get('id'))
+                elif isinstance(val, str):
+                    # Значение может быть строкой с ID контакта
+                    contact_cid = _normalize_pf_id(val)
+            except Exception:
+                pass
+        contact_job = asyncio.create_task(_fetch_contact_name(contact_cid)) if contact_cid else None
+
+        project_name, cp_name, fetched_contact_name = await asyncio.gather(
+            project_job,
+            cp_job if cp_job else asyncio.sleep(0),
+            contact_job if contact_job else asyncio.sleep(0),
+            return_exceptions=True,
+        )
+        if isinstance(project_name, BaseException):
+            logger.debug(f"Failed to resolve project for task {task_id}: {project_name}")
+            project_name = "Не указан"
+        if cp_job:
+            if isinstance(cp_name, str):
+                counterparty = cp_name
+                cache.set(_cp_key, cp_name, ttl_seconds=300)
+            else:
+                counterparty = "Не указан"
+        if isinstance(fetched_contact_name, str):
+            contact_name = fetched_contact_name
         # Fallback: попробуем извлечь из описания, если customFieldData пусты
+        desc_head = description[:_DESCRIPTION_SCAN_LIMIT] if isinstance(description, str) else ""
         try:
             if (not phone) or (phone == "Не указан"):
-                import re
-                m = re.search(r"Телефон:\s*([+\d][\d\s\-()]+)", description)
+                m = _RE_PHONE_FALLBACK.search(desc_head)
                 if m:
                     phone = m.group(1).strip()
             if (not contact_name) or (contact_name == "Не указан"):
-                import re
-                m2 = re.search(r"Заявитель:\s*([^\n\r]*?)(?=\s*(Телефон:|Описани|Создано|$))", description, flags=re.IGNORECASE)
+                m2 = _RE_APPLICANT_FALLBACK.search(desc_head)
                 if m2:
                     contact_name = m2.group(1).strip()
         except Exception:
@@ -2832,7 +3002,7 @@ async def show_task_details(message: Message, state: FSMContext):
                 try:
                     executor_user_id = int(executor.planfix_user_id)
                     is_assigned = any(
-                        _local_pf_id_to_int(a.get('id')) == executor_user_id
+                        _normalize_pf_id(a.get('id')) == executor_user_id
                         for a in assignees
                     )
                 except (ValueError, TypeError):
@@ -2840,58 +3010,30 @@ async def show_task_details(message: Message, state: FSMContext):
             
             # Также проверяем по planfix_contact_id (так как назначаем через assignee_contacts)
             if not is_assigned and executor.planfix_contact_id:
-                try:
-                    executor_contact_id = int(str(executor.planfix_contact_id).split(':')[-1])
-                    # В Planfix контакты могут отображаться как "contact:ID" или просто как число
+                # В Planfix контакты могут отображаться как "contact:ID" или просто как число
+                executor_contact_id = _normalize_pf_id(str(executor.planfix_contact_id))
+                if executor_contact_id is not None:
                     is_assigned = any(
-                        str(a.get('id', '')).endswith(f':{executor_contact_id}') or
-                        str(a.get('id', '')).endswith(f'contact:{executor_contact_id}') or
-                        _local_pf_id_to_int(a.get('id')) == executor_contact_id
+                        _normalize_pf_id(a.get('id')) == executor_contact_id
                         for a in assignees
                     )
-                except (ValueError, TypeError):
-                    pass
 
         has_any_assignee = bool(assignees)
-
-        accepted_by_executor = False
-        if is_executor:
-            try:
-                from database import TaskAssignment
-                with db_manager.get_db() as db_sess:
-                    accepted_by_executor = db_sess.query(TaskAssignment).filter(
-                        TaskAssignment.task_id == task_id,
-                        TaskAssignment.executor_telegram_id == executor.telegram_id,
-                        TaskAssignment.status == "active"
-                    ).first() is not None
-            except Exception:
-                accepted_by_executor = False
+        # Принятие задачи исполнителем уже проверено выше (allowed_by_local_assignment)
+        accepted_by_executor = allowed_by_local_assignment
 
         # Логика отображения кнопок: все назначенные исполнители автоматически получают доступ к действиям
         # (исполнители назначаются автоматически при создании задачи)
         is_new = is_status(status_id, StatusKey.NEW)
         is_waiting = is_status(status_id, StatusKey.INFO_SENT)
         status_name_text = (status_name or "").strip().lower()
-        is_paused = is_status(status_id, StatusKey.POSTPONED) or (
-            "отлож" in status_name_text or "paused" in status_name_text
-        )
+        name_says_paused = any(keyword in status_name_text for keyword in _PAUSED_KEYWORDS)
+        is_paused = is_status(status_id, StatusKey.POSTPONED) or name_says_paused
 
         # Отображаемое имя статуса
-        status_display_name = status_name or status_labels(
-            (
-                (StatusKey.NEW, "Новая"),
-                (StatusKey.IN_PROGRESS, "В работе"),
-                (StatusKey.INFO_SENT, "Отправлена информация"),
-                (StatusKey.COMPLETED, "Выполненная"),
-                (StatusKey.POSTPONED, "Отложенная"),
-                (StatusKey.FINISHED, "Завершенная"),
-                (StatusKey.CANCELLED, "Отменена"),
-                (StatusKey.REJECTED, "Отклонена"),
-            )
-        ).get(status_id, "В работе")
+        status_display_name = status_name or status_labels(_STATUS_DISPLAY_LABELS).get(status_id, "В работе")
         # Хеуристика: если имя статуса указывает на паузу — принудительно отображаем «Отложенная»
-        _sn = (status_name or "").strip().lower()
-        if "отлож" in _sn or "paused" in _sn:
+        if name_says_paused:
             status_display_name = "Отложенная"
         
         message_text = (
@@ -2902,7 +3044,7 @@ async def show_task_details(message: Message, state: FSMContext):
             f"🏪 Ресторан: {counterparty}\n"
             f"👤 Заявитель: {contact_name}\n"
             f"📱 Телефон: {phone}\n\n"
-            f"📄 Описание:\n{description[:500]}"
+            f"📄 Описание:\n{desc_head[:_DESCRIPTION_PREVIEW_LIMIT]}"
         )
         
         # Сохраняем ID задачи в состояние
@@ -2937,150 +3079,171 @@ async def show_task_details(message: Message, state: FSMContext):
             if isinstance(task, dict) and not files:
                 files = ((task.get('task') or {}).get('files')) or []
             
-            import mimetypes
-            
             # Собираем все файлы: из задачи + из комментариев
             all_files = []
             
-            # Используем set для отслеживания уже добавленных файлов по ID
+            # Используем set для отслеживания уже добавленных файлов по ID:
+            # один и тот же файл, приложенный и к задаче, и к комментарию, отправляем один раз
             seen_file_ids = set()
+
+            def _add_file(fid_raw, name, source):
+                if not fid_raw:
+                    return
+                # Нормализуем ID файла для сравнения (если не удалось — используем как есть)
+                fid_key = _normalize_pf_id(fid_raw)
+                if fid_key is None:
+                    fid_key = fid_raw
+                if fid_key not in seen_file_ids:
+                    seen_file_ids.add(fid_key)
+                    all_files.append((fid_raw, name, source))
             
             # Файлы из задачи
             for f in files[:10]:  # Максимум 10 файлов из задачи
                 fid_raw = f.get('id')
-                name = f.get('name') if isinstance(f, dict) else f"file_{fid_raw}"
-                if fid_raw:
-                    # Нормализуем ID файла для сравнения
-                    try:
-                        fid_normalized = int(str(fid_raw).split(':')[-1])
-                        if fid_normalized not in seen_file_ids:
-                            seen_file_ids.add(fid_normalized)
-                            all_files.append((fid_raw, name, 'task'))
-                    except (ValueError, TypeError):
-                        # Если не удалось нормализовать, используем как есть
-                        if fid_raw not in seen_file_ids:
-                            seen_file_ids.add(fid_raw)
-                            all_files.append((fid_raw, name, 'task'))
+                _add_file(fid_raw, f.get('name') if isinstance(f, dict) else f"file_{fid_raw}", 'task')
             
-            # Файлы из комментариев (только последние 5 комментариев)
+            # Файлы из комментариев (только последние 5 комментариев, запрос запущен заранее или взят из кэша на 60 с)
             try:
-                cr = await planfix_client.get_task_comments(task_id, fields="id,dateTime,files", offset=0, page_size=5)
-                comments = (cr.get('comments') or []) if cr and cr.get('result') == 'success' else []
-                for cm in reversed(comments):
-                    for f in (cm.get('files') or []):
-                        if len(all_files) >= 15:  # Максимум 15 файлов всего
-                            break
-                        fid_raw = f.get('id')
-                        name = f.get('name') or f"file_{fid_raw}"
-                        if fid_raw:
-                            # Нормализуем ID файла для сравнения
-                            try:
-                                fid_normalized = int(str(fid_raw).split(':')[-1])
-                                if fid_normalized not in seen_file_ids:
-                                    seen_file_ids.add(fid_normalized)
-                                    all_files.append((fid_raw, name, 'comment'))
-                            except (ValueError, TypeError):
-                                # Если не удалось нормализовать, используем как есть
-                                if fid_raw not in seen_file_ids:
-                                    seen_file_ids.add(fid_raw)
-                                    all_files.append((fid_raw, name, 'comment'))
-                    if len(all_files) >= 15:
+                if comment_files is None:
+                    cr = await comments_job
+                    if cr and cr.get('result') == 'success':
+                        comment_files = [
+                            (f.get('id'), f.get('name') or f"file_{f.get('id')}")
+                            for cm in reversed(cr.get('comments') or [])
+                            for f in (cm.get('files') or [])
+                        ]
+                        cache.set(f"task_comment_files:{task_id}", comment_files, ttl_seconds=60)
+                for fid_raw, name in comment_files or []:
+                    if len(all_files) >= 15:  # Максимум 15 файлов всего
                         break
+                    _add_file(fid_raw, name, 'comment')
             except Exception as e:
                 logger.debug(f"Error loading comments files for task {task_id}: {e}")
             
             if not all_files:
                 return
             
-            # Загружаем файлы в память
-            photos = []
+            # Разделяем вложения на фото и документы по имени файла
+            photo_files = []
             documents = []
-            
-            logger.info(f"Loading {len(all_files)} files for task {task_id} as media")
             for fid_raw, name, source in all_files[:15]:
-                try:
-                    fid = int(str(fid_raw).split(':')[-1])
-                    logger.debug(f"Downloading file {fid} ({name}) from {source}...")
-                    # Скачиваем файл из Planfix в память (не на диск)
-                    file_data = await planfix_client.download_file(fid)
-                    if file_data:
-                        # Ограничение размера файла (50 МБ) для безопасности
-                        max_size = 50 * 1024 * 1024  # 50 МБ
-                        if len(file_data) > max_size:
-                            logger.warning(f"File {fid} ({name}) is too large ({len(file_data)} bytes), skipping")
-                            continue
-                        
-                        # Определяем MIME-тип по расширению
-                        mime_type, _ = mimetypes.guess_type(name)
-                        logger.debug(f"File {name}: mime_type={mime_type}, size={len(file_data)} bytes")
-                        
-                        # Определяем, является ли файл изображением
-                        if mime_type and mime_type.startswith('image/'):
-                            photos.append((file_data, name))
-                            logger.debug(f"Added {name} as photo")
-                        else:
-                            # Для всех остальных файлов отправляем как документ
-                            documents.append((file_data, name, mime_type))
-                            logger.debug(f"Added {name} as document")
-                    else:
-                        logger.warning(f"Failed to download file {fid} ({name}): file_data is None")
-                except Exception as e:
-                    logger.error(f"Failed to download file {fid_raw} ({name}): {e}", exc_info=True)
+                fid = _normalize_pf_id(fid_raw)
+                if fid is None:
+                    logger.warning(f"Invalid file id {fid_raw} ({name}) from {source}, skipping")
+                    continue
+                is_image = os.path.splitext(name or '')[1].lower() in _IMAGE_EXTS
+                logger.debug(f"File {name}: is_image={is_image}, source={source}")
+                if is_image:
+                    photo_files.append((fid, name))
+                else:
+                    # Для всех остальных файлов отправляем как документ
+                    documents.append((fid, name))
+            
+            logger.info(f"Loading {len(photo_files)} photos and {len(documents)} documents for task {task_id} as media")
+
+            # Фото (до 10 МБ по ограничениям Telegram) скачиваем в память параллельно,
+            # с ограничением одновременных загрузок — они отправляются одной медиагруппой.
+            # Уже загруженные ранее в Telegram файлы отправляем по file_id без скачивания
+            download_sem = asyncio.Semaphore(_FILE_DOWNLOAD_CONCURRENCY)
+
+            async def _download(fid):
+                async with download_sem:
+                    return await planfix_client.download_file(fid)
+
+            to_download = [(fid, name) for fid, name in photo_files if not cache.get(f"tg_file:{fid}")]
+            downloads = await asyncio.gather(
+                *(_download(fid) for fid, _ in to_download),
+                return_exceptions=True,
+            )
+            downloaded = {}
+            for (fid, name), file_data in zip(to_download, downloads, strict=True):
+                if isinstance(file_data, BaseException):
+                    logger.error(f"Failed to download file {fid} ({name}): {file_data}")
+                    continue
+                if not file_data:
+                    logger.warning(f"Failed to download file {fid} ({name}): file_data is None")
+                    continue
+                if len(file_data) > _MAX_ATTACHMENT_SIZE:
+                    logger.warning(f"File {fid} ({name}) is too large ({len(file_data)} bytes), skipping")
+                    continue
+                downloaded[fid] = BufferedInputFile(file_data, filename=name)
+            photos = []
+            for fid, name in photo_files:
+                media = cache.get(f"tg_file:{fid}") or downloaded.get(fid)
+                if media:
+                    photos.append((fid, media, name))
             
             # Отправляем медиафайлы
             if photos:
                 if len(photos) == 1:
                     # Одно фото - отправляем с подписью
-                    photo_data, photo_name = photos[0]
-                    try:
-                        photo_file = BufferedInputFile(photo_data, filename=photo_name)
-                        await message.answer_photo(
-                            photo=photo_file,
-                            caption=f"📎 {photo_name}"
-                        )
-                        logger.info(f"✅ Sent photo {photo_name} for task {task_id}")
-                    finally:
-                        del photo_data
+                    photo_fid, photo_media, photo_name = photos[0]
+                    sent = await message.answer_photo(
+                        photo=photo_media,
+                        caption=f"📎 {photo_name}"
+                    )
+                    sent_messages = [sent]
+                    logger.info(f"✅ Sent photo {photo_name} for task {task_id}")
                 else:
                     # Несколько фото - отправляем медиагруппой
-                    media_group = []
-                    try:
-                        for i, (photo_data, photo_name) in enumerate(photos):
-                            photo_file = BufferedInputFile(photo_data, filename=photo_name)
-                            media_group.append(
-                                InputMediaPhoto(
-                                    media=photo_file,
-                                    caption=f"📎 {photo_name}" if i == 0 else None
-                                )
-                            )
-                        await message.answer_media_group(media=media_group)
-                        logger.info(f"✅ Sent {len(photos)} photos for task {task_id}")
-                    finally:
-                        # Освобождаем память
-                        for photo_data, _ in photos:
-                            del photo_data
-                
-                # Отправляем документы отдельно (если есть)
-                for doc_data, doc_name, doc_mime in documents:
-                    try:
-                        doc_file = BufferedInputFile(doc_data, filename=doc_name)
-                        await message.answer_document(
-                            document=doc_file,
-                            caption=f"📎 {doc_name}"
-                        )
-                    finally:
-                        del doc_data
-            elif documents:
-                # Только документы - первый с подписью, остальные без
-                for i, (doc_data, doc_name, doc_mime) in enumerate(documents):
-                    try:
-                        doc_file = BufferedInputFile(doc_data, filename=doc_name)
-                        await message.answer_document(
-                            document=doc_file,
-                            caption=f"📎 {doc_name}" if i == 0 else None
+                    media_group = [
+                        InputMediaPhoto(
+                            media=photo_media,
+                            caption=f"📎 {photo_name}" if i == 0 else None
                         )
-                    finally:
-                        del doc_data
+                        for i, (_, photo_media, photo_name) in enumerate(photos)
+                    ]
+                    sent_messages = await message.answer_media_group(media=media_group)
+                    logger.info(f"✅ Sent {len(photos)} photos for task {task_id}")
+                _cache_sent_file_ids(
+                    [photo_fid for photo_fid, _, _ in photos],
+                    sent_messages,
+                    lambda sent: sent.photo[-1].file_id if sent.photo else None,
+                )
+                photos.clear()
+                downloaded.clear()
+            
+            # Документы (до 50 МБ) передаём из Planfix в Telegram потоком, не буферизуя целиком,
+            # группами до 10 штук (ограничение sendMediaGroup).
+            # Если есть фото, подпись у каждого документа; иначе только у первого
+            def _doc_media(i, doc_fid, doc_name):
+                return (
+                    cache.get(f"tg_file:{doc_fid}") or PlanfixStreamInputFile(doc_fid, doc_name),
+                    f"📎 {doc_name}" if (photo_files or i == 0) else None,
+                )
+
+            async def _send_document(i, doc_fid, doc_name):
+                try:
+                    media, caption = _doc_media(i, doc_fid, doc_name)
+                    sent = await message.answer_document(document=media, caption=caption)
+                    if sent and sent.document:
+                        cache.set(f"tg_file:{doc_fid}", sent.document.file_id, ttl_seconds=86400)
+                except Exception as e:
+                    logger.error(f"Failed to send file {doc_fid} ({doc_name}): {e}", exc_info=True)
+
+            for start in range(0, len(documents), 10):
+                batch = documents[start:start + 10]
+                if len(batch) == 1:
+                    await _send_document(start, *batch[0])
+                    continue
+                try:
+                    media_group = []
+                    for i, (doc_fid, doc_name) in enumerate(batch, start):
+                        media, caption = _doc_media(i, doc_fid, doc_name)
+                        media_group.append(InputMediaDocument(media=media, caption=caption))
+                    sent_messages = await message.answer_media_group(media=media_group)
+                    # Несовпадение числа сообщений не выбрасывается: иначе except ниже отправил бы группу повторно
+                    _cache_sent_file_ids(
+                        [doc_fid for doc_fid, _ in batch],
+                        sent_messages,
+                        lambda sent: sent.document.file_id if sent.document else None,
+                    )
+                except Exception as e:
+                    # Один проблемный файл роняет всю группу — отправляем по одному
+                    logger.warning(f"Failed to send documents group for task {task_id}, sending one by one: {e}")
+                    for i, (doc_fid, doc_name) in enumerate(batch, start):
+                        await _send_document(i, doc_fid, doc_name)
+            if documents:
                 logger.info(f"✅ Sent {len(documents)} documents for task {task_id}")
         except Exception as e:
             logger.error(f"Error while sending task attachments for #{task_id}: {e}", exc_info=True)
@@ -3088,83 +3251,128 @@ async def show_task_details(message: Message, state: FSMContext):
     except Exception as e:
         logger.error(f"Error loading task details: {e}", exc_info=True)
         await message.answer("❌ Ошибка при загрузке задачи.")
+    finally:
+        _discard_jobs(project_job, cp_job, comments_job, contact_job)
 
 
 # ============================================================================
 # ДЕЙСТВИЯ С ЗАДАЧАМИ
 # ============================================================================
 
-@router.callback_query(F.data.startswith("accept:"))
-async def accept_task(callback_query: CallbackQuery, state: FSMContext):
-    """Принять задачу в работу."""
+def _contact_in_assignees(assignees, planfix_contact_id: int) -> bool:
+    """Есть ли контакт среди assignees задачи ("contact:ID" или число); user:ID не учитываем — исполнители назначаются контактами."""
+    assigned_users = (assignees or {}).get('users', []) or []
+    assigned_contact_ids = {
+        _normalize_pf_id(uid)
+        for uid in (user.get('id') for user in assigned_users)
+        if uid is not None and not (isinstance(uid, str) and uid.startswith('user:'))
+    }
+    return planfix_contact_id in assigned_contact_ids
+
+
+async def _verify_and_retry_assignment(task_id: int, planfix_contact_id: int):
+    """Проверяет, что исполнитель попал в assignees задачи после принятия, и при необходимости повторяет назначение."""
+    async with _assignment_verify_semaphore:
+        try:
+            await asyncio.sleep(0.3)  # Небольшая задержка для обработки Planfix
+            task_check = await planfix_client.get_task_by_id(
+                task_id,
+                fields="id,assignees"
+            )
+            if task_check and task_check.get('result') == 'success':
+                task_obj = task_check.get('task', {}) or {}
+                if not _contact_in_assignees(task_obj.get('assignees'), planfix_contact_id):
+                    logger.warning(f"⚠️ Executor contact {planfix_contact_id} not found in assignees after update. Retrying assignment...")
+                    # Пробуем назначить исполнителя отдельным запросом
+                    try:
+                        retry_response = await planfix_client.update_task(
+                            task_id,
+                            assignee_contacts=[planfix_contact_id]
+                        )
+                        if retry_response and retry_response.get('result') == 'success':
+                            logger.info("✅ Executor contact %s successfully assigned to task %s on retry", planfix_contact_id, task_id)
+                        else:
+                            logger.error(f"Failed to assign executor contact {planfix_contact_id} to task {task_id} on retry: {retry_response}")
+                    except Exception as retry_err:
+                        logger.error(f"Error retrying executor assignment for task {task_id}: {retry_err}")
+                else:
+                    logger.info("✅ Verified: Executor contact %s is assigned to task %s", planfix_contact_id, task_id)
+        except Exception as verify_err:
+            logger.warning(f"Could not verify executor assignment for task {task_id}: {verify_err}")
+
+
+async def accept_task(callback_query: CallbackQuery, callback_data: AcceptTaskCallback, state: FSMContext):
+    """Принять задачу в работу; повторные нажатия по задаче, которая уже принимается, отбрасываются."""
+    task_id = callback_data.task_id
+    lock = _accept_task_locks.get(task_id)
+    if lock is None:
+        lock = _accept_task_locks[task_id] = asyncio.Lock()
+    if lock.locked():
+        await callback_query.answer("⏳ Задача уже принимается в работу")
+        return
+    async with lock:
+        if await db_manager.has_active_assignment(task_id, callback_query.from_user.id):
+            await callback_query.answer("✅ Задача уже принята вами в работу")
+            return
+        await _accept_task(callback_query, callback_data, state)
+
+
+async def _accept_task(callback_query: CallbackQuery, callback_data: AcceptTaskCallback, state: FSMContext):
     executor = await db_manager.get_executor_profile(callback_query.from_user.id)
     
     if not executor:
         await callback_query.answer("❌ Профиль не настроен", show_alert=True)
         return
     
-    task_id = int(callback_query.data.split(":")[1])
+    task_id = callback_data.task_id
     
     try:
         # Проверяем, есть ли у исполнителя contact_id в Planfix
         planfix_contact_id = None
         if executor.planfix_contact_id:
-            try:
-                if isinstance(executor.planfix_contact_id, str):
-                    if ':' in executor.planfix_contact_id:
-                        planfix_contact_id = int(executor.planfix_contact_id.split(':')[-1])
-                    else:
-                        planfix_contact_id = int(executor.planfix_contact_id)
-                else:
-                    planfix_contact_id = int(executor.planfix_contact_id)
-                logger.info(f"Using existing Planfix contact {planfix_contact_id} for executor {executor.telegram_id}")
-            except (ValueError, TypeError) as e:
-                logger.warning(f"Invalid planfix_contact_id for executor {executor.telegram_id}: {e}")
+            planfix_contact_id = _normalize_pf_id(executor.planfix_contact_id)
+            if planfix_contact_id is not None:
+                logger.info("Using existing Planfix contact %s for executor %s", planfix_contact_id, executor.telegram_id)
+            else:
+                logger.warning(f"Invalid planfix_contact_id for executor {executor.telegram_id}: {executor.planfix_contact_id!r}")
         
         # Если контакта нет, создаем его
         if not planfix_contact_id:
             try:
-                logger.info(f"Creating Planfix contact for executor {executor.telegram_id} (contact not found)")
-                # Разделяем ФИО на части
-                name_parts = executor.full_name.strip().split()
-                if len(name_parts) >= 2:
-                    name = " ".join(name_parts[1:])
-                    lastname = name_parts[0]
-                else:
-                    name = executor.full_name
-                    lastname = executor.full_name
-                
-                # Пробуем найти существующий контакт по телефону
-                # Если контакт уже существует, используем его
-                try:
-                    # Ищем контакт по телефону через API (если есть такой метод)
-                    # Пока просто пробуем создать, если не получится - будет ошибка
-                    pass
-                except Exception:
-                    pass
+                logger.info("Creating Planfix contact for executor %s (contact not found)", executor.telegram_id)
+                # Разделяем ФИО: фамилия — первое слово, имя — остальное (одно слово — и имя, и фамилия)
+                lastname, sep, name = executor.full_name.strip().partition(' ')
+                name = name.strip() if sep else lastname
                 
-                # Создаем контакт в группе "Поддержка" с template_id=1
-                from config import SUPPORT_CONTACT_GROUP_ID, SUPPORT_CONTACT_TEMPLATE_ID
                 
+                # Пробуем найти существующий контакт по телефону в группе "Поддержка"
                 contact_response = None
-                try:
-                    contact_response = await planfix_client.create_contact(
-                        name=name,
-                        lastname=lastname,
-                        phone=executor.phone_number,
-                        email=executor.email,
-                        group_id=SUPPORT_CONTACT_GROUP_ID,  # Группа "Поддержка"
-                        template_id=SUPPORT_CONTACT_TEMPLATE_ID  # Template ID 1
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to create contact in support group: {e}")
-                    contact_response = None
+                found_contact_id = await planfix_client.find_contact_by_phone(
+                    executor.phone_number, group_id=SUPPORT_CONTACT_GROUP_ID
+                )
+                if found_contact_id:
+                    logger.info("Found existing Planfix contact %s by phone for executor %s", found_contact_id, executor.telegram_id)
+                    contact_response = {'result': 'success', 'id': found_contact_id}
+                else:
+                    # Создаем контакт в группе "Поддержка" с template_id=1
+                    try:
+                        contact_response = await planfix_client.create_contact(
+                            name=name,
+                            lastname=lastname,
+                            phone=executor.phone_number,
+                            email=executor.email,
+                            group_id=SUPPORT_CONTACT_GROUP_ID,  # Группа "Поддержка"
+                            template_id=SUPPORT_CONTACT_TEMPLATE_ID  # Template ID 1
+                        )
+                    except Exception as e:
+                        logger.error(f"Failed to create contact in support group: {e}")
+                        contact_response = None
                 
                 if contact_response and contact_response.get('result') == 'success':
                     contact_id = contact_response.get('id') or contact_response.get('contact', {}).get('id')
-                    if contact_id:
-                        planfix_contact_id = int(str(contact_id).split(':')[-1]) if isinstance(contact_id, str) and ':' in contact_id else int(contact_id)
-                        
+                    planfix_contact_id = _normalize_pf_id(contact_id)
+                    if planfix_contact_id:
+                        planfix_client.remember_contact_phone(executor.phone_number, planfix_contact_id)
                         # Используем ID контакта как planfix_user_id
                         planfix_user_id = str(planfix_contact_id)
                         
@@ -3174,7 +3382,7 @@ async def accept_task(callback_query: CallbackQuery, state: FSMContext):
                             planfix_contact_id=str(planfix_contact_id),
                             planfix_user_id=planfix_user_id
                         )
-                        logger.info(f"Created and saved Planfix contact {planfix_contact_id} for executor {executor.telegram_id} (planfix_user_id: {planfix_user_id})")
+                        logger.info("Created and saved Planfix contact %s for executor %s (planfix_user_id: %s)", planfix_contact_id, executor.telegram_id, planfix_user_id)
                 else:
                     logger.warning(f"Failed to create Planfix contact for executor {executor.telegram_id}: {contact_response}")
                     await callback_query.answer("❌ Не удалось создать контакт в Planfix", show_alert=True)
@@ -3184,7 +3392,7 @@ async def accept_task(callback_query: CallbackQuery, state: FSMContext):
                 await callback_query.answer("❌ Ошибка при создании контакта", show_alert=True)
                 return
         
-        logger.info(f"Accepting task {task_id} by executor {executor.telegram_id} (planfix_contact_id={planfix_contact_id})")
+        logger.info("Accepting task %s by executor %s (planfix_contact_id=%s)", task_id, executor.telegram_id, planfix_contact_id)
         
         # Обновляем задачу: меняем статус и назначаем исполнителя как контакт
         # Согласно swagger.json, в assignees.users можно добавлять и user:ID, и contact:ID
@@ -3195,109 +3403,58 @@ async def accept_task(callback_query: CallbackQuery, state: FSMContext):
         )
         
         if update_response and update_response.get('result') == 'success':
-            # Проверяем, что исполнитель действительно назначен
-            try:
-                await asyncio.sleep(0.3)  # Небольшая задержка для обработки Planfix
-                task_check = await planfix_client.get_task_by_id(
-                    task_id,
-                    fields="id,assignees"
-                )
-                if task_check and task_check.get('result') == 'success':
-                    task_obj = task_check.get('task', {}) or {}
-                    assignees = task_obj.get('assignees', {}) or {}
-                    assigned_users = assignees.get('users', []) or []
-                    
-                    # Проверяем, есть ли наш исполнитель в списке назначенных (как контакт)
-                    executor_found = False
-                    for user in assigned_users:
-                        user_id_raw = user.get('id', '')
-                        if isinstance(user_id_raw, str):
-                            # Проверяем, является ли это контактом (contact:ID)
-                            if user_id_raw.startswith('contact:'):
-                                contact_id = int(user_id_raw.split(':')[-1])
-                                if contact_id == planfix_contact_id:
-                                    executor_found = True
-                                    break
-                            elif ':' in user_id_raw:
-                                # Это может быть user:ID
-                                user_id = int(user_id_raw.split(':')[-1])
-                                # Не проверяем user_id, так как мы используем контакты
-                        elif isinstance(user_id_raw, (int, float)):
-                            # Если это просто число, проверяем как contact_id
-                            if int(user_id_raw) == planfix_contact_id:
-                                executor_found = True
-                                break
-                    
-                    if not executor_found:
-                        logger.warning(f"⚠️ Executor contact {planfix_contact_id} not found in assignees after update. Retrying assignment...")
-                        # Пробуем назначить исполнителя отдельным запросом
-                        try:
-                            retry_response = await planfix_client.update_task(
-                                task_id,
-                                assignee_contacts=[planfix_contact_id]
-                            )
-                            if retry_response and retry_response.get('result') == 'success':
-                                logger.info(f"✅ Executor contact {planfix_contact_id} successfully assigned to task {task_id} on retry")
-                            else:
-                                logger.error(f"Failed to assign executor contact {planfix_contact_id} to task {task_id} on retry: {retry_response}")
-                        except Exception as retry_err:
-                            logger.error(f"Error retrying executor assignment for task {task_id}: {retry_err}")
-                    else:
-                        logger.info(f"✅ Verified: Executor contact {planfix_contact_id} is assigned to task {task_id}")
-            except Exception as verify_err:
-                logger.warning(f"Could not verify executor assignment for task {task_id}: {verify_err}")
-                # Продолжаем работу, даже если проверка не удалась
-            # Сохраняем назначение в базу данных
-            from database import TaskAssignment
-            with db_manager.get_db() as db:
-                # Проверяем, нет ли уже активного назначения
-                existing = db.query(TaskAssignment).filter(
-                    TaskAssignment.task_id == task_id,
-                    TaskAssignment.status == "active"
-                ).first()
-                
-                if not existing:
-                    assignment = TaskAssignment(
-                        task_id=task_id,
-                        executor_telegram_id=executor.telegram_id,
-                        planfix_user_id=str(planfix_contact_id),  # Сохраняем contact_id в planfix_user_id для совместимости
-                        status="active"
-                    )
-                    db.add(assignment)
-                    db.commit()
-                    logger.info(f"Task assignment created: task {task_id} -> executor {executor.telegram_id}")
-            
-            await callback_query.message.edit_text(
-                f"✅ <b>Вы приняли задачу #{task_id} в работу!</b>\n\n"
-                f"📊 <b>Статус:</b> В работе\n\n"
-                f"💡 Не забудьте связаться с заявителем при необходимости.",
-                reply_markup=get_task_actions_keyboard(task_id, is_new=False, is_waiting=False, is_paused=False),
-                parse_mode="HTML"
+            # Если Planfix вернул обновлённых исполнителей в ответе — проверяем по нему без повторного запроса,
+            # иначе проверяем назначение в фоне, не задерживая ответ пользователю
+            echoed_assignees = (update_response.get('task') or {}).get('assignees')
+            if echoed_assignees is not None and _contact_in_assignees(echoed_assignees, planfix_contact_id):
+                logger.info("✅ Verified from update response: executor contact %s is assigned to task %s", planfix_contact_id, task_id)
+            else:
+                _spawn_background(_verify_and_retry_assignment(task_id, planfix_contact_id))
+            # Сохраняем назначение в базу данных (если активного назначения ещё нет)
+            created = await db_manager.create_task_assignment_if_absent(
+                task_id,
+                executor.telegram_id,
+                str(planfix_contact_id),  # Сохраняем contact_id в planfix_user_id для совместимости
             )
-            await callback_query.answer("✅ Задача принята")
+            if created:
+                logger.info("Task assignment created: task %s -> executor %s", task_id, executor.telegram_id)
+            # Принятая задача больше не «новая» — в том числе для других исполнителей
+            clear_task_list_caches()
             
-            # Возвращаем главное меню исполнителя, чтобы оно не пропало
-            await callback_query.bot.send_message(
-                callback_query.from_user.id,
-                "📋 Используйте меню для работы с заявками:",
-                reply_markup=get_executor_main_menu_keyboard()
-            )
+            await callback_query.answer("✅ Задача принята")
             
-            # Добавляем комментарий и уведомляем заявителя
+            # Сообщения в Telegram, комментарий в Planfix и уведомление заявителя независимы — выполняем параллельно
             comment_text = f"Задача принята в работу исполнителем {executor.full_name}"
-            await planfix_client.add_comment_to_task(
-                task_id,
-                description=comment_text
-            )
-            # Уведомление клиенту о принятии задачи в работу
-            try:
-                from notifications import NotificationService
-                notification_service = NotificationService(callback_query.bot)
-                await notification_service.notify_new_comment(task_id, executor.full_name, comment_text, recipients="user")
-            except Exception as notify_err:
-                logger.error(f"Failed to notify counterparty about task acceptance #{task_id}: {notify_err}")
+            notification_service = get_notification_service(callback_query.bot)
+            side_effects = {
+                "edit message": callback_query.message.edit_text(
+                    f"✅ <b>Вы приняли задачу #{task_id} в работу!</b>\n\n"
+                    f"📊 <b>Статус:</b> В работе\n\n"
+                    f"💡 Не забудьте связаться с заявителем при необходимости.",
+                    reply_markup=get_task_actions_keyboard(task_id, is_new=False, is_waiting=False, is_paused=False),
+                    parse_mode="HTML"
+                ),
+                # Возвращаем главное меню исполнителя, чтобы оно не пропало
+                "send main menu": callback_query.bot.send_message(
+                    callback_query.from_user.id,
+                    "📋 Используйте меню для работы с заявками:",
+                    reply_markup=get_executor_main_menu_keyboard()
+                ),
+                "add Planfix comment": planfix_client.add_comment_to_task(
+                    task_id,
+                    description=comment_text
+                ),
+                # Уведомление клиенту о принятии задачи в работу
+                "notify counterparty": notification_service.notify_new_comment(
+                    task_id, executor.full_name, comment_text, recipients="user"
+                ),
+            }
+            results = await asyncio.gather(*side_effects.values(), return_exceptions=True)
+            for step, result in zip(side_effects, results, strict=True):
+                if isinstance(result, BaseException):
+                    logger.error(f"Task acceptance #{task_id}: failed to {step}: {result}")
             
-            logger.info(f"Task {task_id} accepted by executor {executor.telegram_id}")
+            logger.info("Task %s accepted by executor %s", task_id, executor.telegram_id)
         else:
             await callback_query.answer("❌ Не удалось принять задачу", show_alert=True)
             
@@ -3306,25 +3463,18 @@ async def accept_task(callback_query: CallbackQuery, state: FSMContext):
         await callback_query.answer("❌ Ошибка при принятии задачи", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("resume:"))
-async def resume_task(callback_query: CallbackQuery):
+async def resume_task(callback_query: CallbackQuery, callback_data: ResumeTaskCallback, state: FSMContext):
     """Возобновить задачу."""
     executor = await db_manager.get_executor_profile(callback_query.from_user.id)
     if not executor or not executor.planfix_user_id:
         await callback_query.answer("❌ Сначала настройте профиль исполнителя", show_alert=True)
         return
 
-    task_id = int(callback_query.data.split(":")[1])
+    task_id = callback_data.task_id
 
     # Блокируем действие до явного принятия в работу (по записи TaskAssignment)
     try:
-        from database import TaskAssignment
-        with db_manager.get_db() as db:
-            accepted = db.query(TaskAssignment).filter(
-                TaskAssignment.task_id == task_id,
-                TaskAssignment.executor_telegram_id == executor.telegram_id,
-                TaskAssignment.status == "active"
-            ).first()
+        accepted = await db_manager.has_active_assignment(task_id, executor.telegram_id)
         if not accepted:
             await callback_query.answer("❌ Сначала примите задачу в работу", show_alert=True)
             return
@@ -3366,21 +3516,26 @@ async def resume_task(callback_query: CallbackQuery):
         await callback_query.answer("❌ Ошибка", show_alert=True)
 
 
-@router.callback_query(F.data.startswith("close:"))
-async def close_task(callback_query: CallbackQuery, state: FSMContext):
+async def _task_exists(task_id: int) -> bool:
+    """Проверка существования задачи для close/comment; повторные нажатия обслуживает кэш клиента Planfix
+    (ключ (task_id, "id"), сбрасывается по вебхуку изменения задачи)."""
+    task_response = await planfix_client.get_task_by_id(task_id, fields="id")
+    return bool(task_response) and task_response.get('result') == 'success'
+
+
+async def close_task(callback_query: CallbackQuery, callback_data: CloseTaskCallback, state: FSMContext):
     """Закрыть задачу."""
     executor = await db_manager.get_executor_profile(callback_query.from_user.id)
     if not executor or not executor.planfix_user_id:
         await callback_query.answer("❌ Сначала настройте профиль исполнителя", show_alert=True)
         return
 
-    task_id = int(callback_query.data.split(":")[1])
+    task_id = callback_data.task_id
 
     # Комментарий можно оставлять без принятия задачи в работу
     # Просто проверяем, что задача существует и доступна исполнителю
     try:
-        task_response = await planfix_client.get_task_by_id(task_id, fields="id")
-        if not task_response or task_response.get('result') != 'success':
+        if not await _task_exists(task_id):
             await callback_query.answer("❌ Задача не найдена", show_alert=True)
             return
     except Exception as e:
@@ -3397,22 +3552,20 @@ async def close_task(callback_query: CallbackQuery, state: FSMContext):
     await callback_query.answer()
 
 
-@router.callback_query(F.data.startswith("comment:"))
-async def add_comment(callback_query: CallbackQuery, state: FSMContext):
+async def add_comment(callback_query: CallbackQuery, callback_data: CommentTaskCallback, state: FSMContext):
     """Добавить комментарий к задаче."""
     executor = await db_manager.get_executor_profile(callback_query.from_user.id)
     if not executor or not executor.planfix_user_id:
         await callback_query.answer("❌ Сначала настройте профиль исполнителя", show_alert=True)
         return
 
-    task_id = int(callback_query.data.split(":")[1])
+    task_id = callback_data.task_id
 
     # Блокируем действие до явного ��ринятия в работу (по записи TaskAssignment)
     # Комментарий можно оставлять без принятия задачи в работу
     # Просто проверяем, что задача существует и доступна исполнителю
     try:
-        task_response = await planfix_client.get_task_by_id(task_id, fields="id")
-        if not task_response or task_response.get('result') != 'success':
+        if not await _task_exists(task_id):
             await callback_query.answer("❌ Задача не найдена", show_alert=True)
             return
     except Exception as e:
@@ -3429,6 +3582,32 @@ async def add_comment(callback_query: CallbackQuery, state: FSMContext):
     await callback_query.answer()
 
 
+# Действия с задачей: префикс callback-данных -> (класс CallbackData, обработчик).
+# Один зарегистрированный обработчик вместо четырёх фильтров, выбор действия — поиском в dict
+_TASK_ACTIONS = {
+    AcceptTaskCallback.__prefix__: (AcceptTaskCallback, accept_task),
+    ResumeTaskCallback.__prefix__: (ResumeTaskCallback, resume_task),
+    CloseTaskCallback.__prefix__: (CloseTaskCallback, close_task),
+    CommentTaskCallback.__prefix__: (CommentTaskCallback, add_comment),
+}
+
+
+def _is_task_action(data: str | None) -> bool:
+    return bool(data) and data.partition(':')[0] in _TASK_ACTIONS
+
+
+@router.callback_query(F.data.func(_is_task_action))
+async def dispatch_task_action(callback_query: CallbackQuery, state: FSMContext):
+    callback_cls, handler = _TASK_ACTIONS[callback_query.data.partition(':')[0]]
+    try:
+        callback_data = callback_cls.unpack(callback_query.data)
+    except (TypeError, ValueError):
+        logger.warning(f"Malformed task action callback: {callback_query.data!r}")
+        await callback_query.answer("❌ Некорректные данные кнопки", show_alert=True)
+        return
+    await handler(callback_query, callback_data, state)
+
+
 # ============================================================================
 # ОБРАБОТКА КОММЕНТАРИЕВ И ДЕЙСТВИЙ
 # ============================================================================
@@ -3441,9 +3620,6 @@ async def add_comment(callback_query: CallbackQuery, state: FSMContext):
 async def process_executor_comment_media(message: Message, state: FSMContext):
     """Обработка фото/видео для комментария исполнителя."""
     user_data = await state.get_data()
-    task_id = user_data.get('current_task_id')
-    
-    executor = await db_manager.get_executor_profile(message.from_user.id)
     
     try:
         # Определяем тип медиа и получаем file_id
@@ -3464,41 +3640,21 @@ async def process_executor_comment_media(message: Message, state: FSMContext):
             return
         
         # Скачиваем медиа
-        tg_file = await message.bot.get_file(file_id)
-        file_bytes = await message.bot.download_file(tg_file.file_path)
-        
-        # Загружаем медиа в Planfix
-        upload_response = await planfix_client.upload_file(file_bytes, filename=default_filename)
+        with planfix_client.upload_buffer() as file_buffer:
+            await message.bot.download(file_id, destination=file_buffer)
+            # Загружаем медиа в Planfix
+            upload_response = await planfix_client.upload_file(file_buffer, filename=default_filename)
         planfix_file_id = None
-        
         if upload_response and upload_response.get('result') == 'success':
-            planfix_file_id = upload_response.get('id')
             # Нормализуем file_id (убираем префикс "file:" и конвертируем в int)
-            if planfix_file_id is not None:
-                if isinstance(planfix_file_id, str):
-                    if ':' in planfix_file_id:
-                        try:
-                            planfix_file_id = int(planfix_file_id.split(':')[-1])
-                        except (ValueError, TypeError):
-                            logger.warning(f"Could not parse file_id: {planfix_file_id}")
-                            planfix_file_id = None
-                    else:
-                        try:
-                            planfix_file_id = int(planfix_file_id)
-                        except (ValueError, TypeError):
-                            logger.warning(f"Could not convert file_id to int: {planfix_file_id}")
-                            planfix_file_id = None
-                elif not isinstance(planfix_file_id, int):
-                    try:
-                        planfix_file_id = int(planfix_file_id)
-                    except (ValueError, TypeError):
-                        logger.warning(f"Could not convert file_id to int: {planfix_file_id}")
-                        planfix_file_id = None
+            raw_file_id = upload_response.get('id')
+            planfix_file_id = _normalize_pf_id(raw_file_id)
+            if planfix_file_id is None and raw_file_id is not None:
+                logger.warning(f"Could not parse file_id: {raw_file_id}")
         
         if planfix_file_id:
             # Сохраняем ID файла в состоянии
-            comment_files = user_data.get('comment_files', [])
-            comment_files.append(planfix_file_id)
+            comment_files = user_data.get('comment_files', []) + [planfix_file_id]
             await state.update_data(comment_files=comment_files)
             
             files_count = len(comment_files)
@@ -3534,10 +3690,66 @@ async def executor_comment_skip_file(callback_query: CallbackQuery, state: FSMCo
     await _finalize_executor_comment(callback_query, state, skip_files=True)
 
 
+async def _set_state_with_data(state: FSMContext, new_state, data: dict, **updates):
+    """Переводит FSM в new_state, дописывая updates к уже прочитанным данным.
+
+    В отличие от update_data не перечитывает данные из хранилища: обработчик их уже получил через get_data.
+    """
+    await state.set_data({**data, **updates})
+    await state.set_state(new_state)
+
+
+def _comment_id_from_response(response) -> int | None:
+    """ID комментария из ответа Planfix на создание комментария ({"result": "success", "id": ...})."""
+    if not isinstance(response, dict) or response.get('result') != 'success':
+        return None
+    return _normalize_pf_id(response.get('id') or (response.get('comment') or {}).get('id'))
+
+
+async def _post_comment_and_get_id(task_id: int, description: str, files: list) -> int | None:
+    """Добавляет комментарий исполнителя в Planfix и возвращает его ID из ответа (None, если ID нет)."""
+    comment_response = await planfix_client.add_comment_to_task(
+        task_id,
+        description=description,
+        files=files or None
+    )
+    forget_task_comment_files(task_id)
+    comment_id = _comment_id_from_response(comment_response)
+    if files and comment_id is None:
+        logger.warning(f"Planfix did not return comment ID for task {task_id}: {comment_response}")
+    return comment_id
+
+
+def forget_task_comment_files(task_id: int) -> None:
+    """Сбрасывает кэш файлов из комментариев задачи: после нового комментария список вложений устарел.
+
+    Вызывается при добавлении комментария ботом, из webhook комментария и при комментарии заявителя.
+    """
+    cache.pop(f"task_comment_files:{task_id}", None)
+
+
+def clear_task_list_caches():
+    """Сбрасывает кэши списков задач всех исполнителей (new_tasks:*, api_tasks:*).
+
+    Вызывается при принятии/закрытии задачи и из webhook при создании/изменении задачи в Planfix,
+    чтобы исполнители не видели устаревший список до истечения TTL.
+    """
+    try:
+        # TTLCache не поддерживает clear_pattern — удаляем ключи по префиксу вручную, без запроса к БД
+        keys_to_remove = [
+            key for key in cache._store.keys()
+            if isinstance(key, str) and key.startswith(("new_tasks:", "api_tasks:"))
+        ]
+        for key in keys_to_remove:
+            cache.pop(key, None)
+        logger.info(f"✅ Cleared task list caches for all executors ({len(keys_to_remove)} keys)")
+    except Exception as cache_clear_err:
+        # Не прерываем выполнение из-за ошибки очистки кэша
+        logger.warning(f"Error clearing task list caches: {cache_clear_err}")
+
+
 async def _finalize_executor_comment(message_or_callback, state: FSMContext, skip_files: bool = False):
     """Финализация комментария исполнителя - отправка в Planfix."""
-    from aiogram.types import CallbackQuery, Message
-    
     user_data = await state.get_data()
     task_id = user_data.get('current_task_id')
     action = user_data.get('action')
@@ -3571,10 +3783,11 @@ async def _finalize_executor_comment(message_or_callback, state: FSMContext, ski
         return
     
     try:
-        from notifications import NotificationService
-        notification_service = NotificationService(bot)
+        notification_service = get_notification_service(bot)
         
-        if action == "close":
+        is_close = action == "close"
+        
+        if is_close:
             # Получаем ID статуса "Выполнена" с безопасной обработкой
             completed_status_id = resolve_status_id(StatusKey.COMPLETED, required=False)
             if not completed_status_id:
@@ -3585,166 +3798,41 @@ async def _finalize_executor_comment(message_or_callback, state: FSMContext, ski
                 except Exception as e:
                     logger.error(f"Error updating task {task_id} status to completed: {e}", exc_info=True)
                     await answer_func("⚠️ Задача не была обновлена, но комментарий будет добавлен.")
-            
             full_comment = f"✅ Задача выполнена.\n\nВыполненные работы:\n{comment_text}\n\n({executor.full_name})"
-            files = comment_files if comment_files else None
-            
-            try:
-                await planfix_client.add_comment_to_task(
-                    task_id,
-                    description=full_comment,
-                    files=files
-                )
-                
-                # Очищаем кэш для всех исполнителей после завершения задачи
-                # Это гарантирует, что завершенная задача не будет показываться в списке "Новые заявки"
-                try:
-                    # Получаем всех активных исполнителей
-                    with db_manager.get_db() as db:
-                        from database import ExecutorProfile
-                        executors = db.query(ExecutorProfile).filter(
-                            ExecutorProfile.profile_status == "активен"
-                        ).all()
-                    
-                    # Очищаем кэш для каждого исполнителя
-                    for exec in executors:
-                        # Очищаем кэш списка задач (TTLCache использует pop или del)
-                        cache.pop(f"new_tasks:{exec.telegram_id}", None)
-                        cache.pop(f"new_tasks_request:{exec.telegram_id}:result", None)
-                        cache.pop(f"new_tasks_request:{exec.telegram_id}:time", None)
-                    
-                    # Очищаем кэш API запросов для всех статусов (TTLCache не поддерживает clear_pattern, очищаем вручную)
-                    # Собираем все ключи, которые начинаются с "api_tasks:"
-                    keys_to_remove = [key for key in cache._store.keys() if isinstance(key, str) and key.startswith("api_tasks:")]
-                    for key in keys_to_remove:
-                        cache.pop(key, None)
-                    
-                    logger.info(f"✅ Cleared cache for all executors after task {task_id} completion")
-                except Exception as cache_clear_err:
-                    logger.warning(f"Error clearing cache after task completion: {cache_clear_err}")
-                    # Не прерываем выполнение из-за ошибки очистки кэша
-                
-            except Exception as e:
-                logger.error(f"Error adding comment to task {task_id} (close action): {e}", exc_info=True)
-                await answer_func("❌ Ошибка при добавлении комментария. Попробуйте позже.")
-                await state.clear()
-                return
-            
-            # Получаем ID только что созданного комментария для отправки медиа
-            comment_id = None
-            if comment_files:  # Только если есть файлы, иначе не нужно
-                try:
-                    import asyncio
-                    await asyncio.sleep(0.5)  # Небольшая задержка для синхронизации
-                    comments_response = await planfix_client.get_task_comments(
-                        task_id,
-                        fields="id,dateTime",
-                        offset=0,
-                        page_size=10
-                    )
-                    if comments_response and comments_response.get('result') == 'success':
-                        comments = comments_response.get('comments', [])
-                        if comments:
-                            # Функция для получения сортировочного ключа из dateTime
-                            def get_date_key(c):
-                                dt = c.get('dateTime', '')
-                                if isinstance(dt, dict):
-                                    return str(dt.get('value', '')) if 'value' in dt else ''
-                                return str(dt) if dt else ''
-                            
-                            # Сортируем по дате (новые первыми) и берем первый
-                            comments_sorted = sorted(comments, key=get_date_key, reverse=True)
-                            latest_comment = comments_sorted[0]
-                            comment_id = latest_comment.get('id')
-                            logger.info(f"Found latest comment ID {comment_id} for task {task_id}")
-                except Exception as e:
-                    logger.warning(f"Failed to get comment ID for task {task_id}: {e}", exc_info=True)
-            
-            # Отправляем уведомление заявителю
-            try:
-                await notification_service.notify_new_comment(task_id, executor.full_name, full_comment, recipients="user", comment_id=comment_id)
-            except Exception as e:
-                logger.error(f"Error sending notification for task {task_id}: {e}", exc_info=True)
-            
-            # Деактивируем локальное назначение
-            try:
-                from database import TaskAssignment
-                with db_manager.get_db() as dbx:
-                    executor_id = executor.telegram_id
-                    rec = dbx.query(TaskAssignment).filter(
-                        TaskAssignment.task_id == task_id,
-                        TaskAssignment.executor_telegram_id == executor_id,
-                        TaskAssignment.status == "active"
-                    ).first()
-                    if rec:
-                        rec.status = "inactive"
-                        dbx.commit()
-            except Exception as e:
-                logger.error(f"Error deactivating task assignment for task {task_id}: {e}", exc_info=True)
-            
-            files_msg = f" (прикреплено фото: {len(comment_files)})" if comment_files else ""
-            await answer_func(
-                f"✅ Задача #{task_id} завершена!{files_msg}\n\n"
-                f"Выполненные работы:\n{comment_text}",
-                reply_markup=get_executor_main_menu_keyboard()
-            )
         else:  # comment
             full_comment = f"{comment_text}\n\n({executor.full_name})"
-            files = comment_files if comment_files else None
-            
-            try:
-                await planfix_client.add_comment_to_task(
-                    task_id,
-                    description=full_comment,
-                    files=files
-                )
-            except Exception as e:
-                logger.error(f"Error adding comment to task {task_id}: {e}", exc_info=True)
-                await answer_func("❌ Ошибка при добавлении комментария. Попробуйте позже.")
-                await state.clear()
-                return
-            
-            # Получаем ID только что созданного комментария для отправки медиа
-            comment_id = None
-            if comment_files:  # Только если есть файлы, иначе не нужно
-                try:
-                    import asyncio
-                    await asyncio.sleep(0.5)  # Небольшая задержка для синхронизации
-                    comments_response = await planfix_client.get_task_comments(
-                        task_id,
-                        fields="id,dateTime",
-                        offset=0,
-                        page_size=10
-                    )
-                    if comments_response and comments_response.get('result') == 'success':
-                        comments = comments_response.get('comments', [])
-                        if comments:
-                            # Функция для получения сортировочного ключа из dateTime
-                            def get_date_key(c):
-                                dt = c.get('dateTime', '')
-                                if isinstance(dt, dict):
-                                    return str(dt.get('value', '')) if 'value' in dt else ''
-                                return str(dt) if dt else ''
-                            
-                            # Сортируем по дате (новые первыми) и берем первый
-                            comments_sorted = sorted(comments, key=get_date_key, reverse=True)
-                            latest_comment = comments_sorted[0]
-                            comment_id = latest_comment.get('id')
-                            logger.info(f"Found latest comment ID {comment_id} for task {task_id}")
-                except Exception as e:
-                    logger.warning(f"Failed to get comment ID for task {task_id}: {e}", exc_info=True)
-            
-            # Отправляем уведомление заявителю
-            try:
-                await notification_service.notify_new_comment(task_id, executor.full_name, full_comment, recipients="user", comment_id=comment_id)
-            except Exception as e:
-                logger.error(f"Error sending notification for task {task_id}: {e}", exc_info=True)
-            
-            files_msg = f" (прикреплено фото: {len(comment_files)})" if comment_files else ""
-            await answer_func(
-                f"✅ Комментарий добавлен к задаче #{task_id}.{files_msg}",
-                reply_markup=get_executor_main_menu_keyboard()
-            )
+        
+        try:
+            comment_id = await _post_comment_and_get_id(task_id, full_comment, comment_files)
+        except Exception as e:
+            logger.error(f"Error adding comment to task {task_id} ({action} action): {e}", exc_info=True)
+            await answer_func("❌ Ошибка при добавлении комментария. Попробуйте позже.")
+            await state.clear()
+            return
+        
+        # Уведомление заявителя, деактивация локального назначения и ответ исполнителю независимы —
+        # выполняем параллельно
+        files_msg = f" (прикреплено фото: {len(comment_files)})" if comment_files else ""
+        side_effects = {
+            "notify requester": notification_service.notify_new_comment(
+                task_id, executor.full_name, full_comment, recipients="user",
+                # ID нужен только для поиска вложений; без файлов не дёргаем список комментариев Planfix
+                comment_id=comment_id if comment_files else None
+            ),
+        }
+        if is_close:
+            # Завершенная задача не должна показываться в списках "Новые заявки" исполнителей
+            clear_task_list_caches()
+            side_effects["deactivate assignment"] = db_manager.deactivate_task_assignment(task_id, executor.telegram_id)
+            reply_text = f"✅ Задача #{task_id} завершена!{files_msg}\n\nВыполненные работы:\n{comment_text}"
+        else:
+            reply_text = f"✅ Комментарий добавлен к задаче #{task_id}.{files_msg}"
+        side_effects["reply to executor"] = answer_func(reply_text, reply_markup=get_executor_main_menu_keyboard())
+        
+        results = await asyncio.gather(*side_effects.values(), return_exceptions=True)
+        for step, result in zip(side_effects, results, strict=True):
+            if isinstance(result, BaseException):
+                logger.error(f"Task {action} #{task_id}: failed to {step}: {result}", exc_info=result)
         
         await state.clear()
         logger.info(f"Executor {executor.telegram_id} performed action '{action}' on task {task_id} with {len(comment_files)} files")
@@ -3784,38 +3872,22 @@ async def process_executor_comment(message: Message, state: FSMContext):
         return
     
     try:
-        # Импортируем NotificationService для отправки уведомлений
-        from notifications import NotificationService
-        notification_service = NotificationService(message.bot)
-        
-        if action == "close":
-            if not comment_text:
+        if not comment_text:
+            if action == "close":
                 await message.answer("❌ Необходимо указать выполненные работы. Введите текст.")
-                return
-            
-            # Сохраняем текст комментария и переходим к прикреплению файла
-            await state.update_data(comment_text=comment_text, comment_files=[])
-            await message.answer(
-                "📷 Прикрепите фото или видео (если нужно) или нажмите 'Пропустить':",
-                reply_markup=get_skip_or_done_keyboard()
-            )
-            await state.set_state(ExecutorTaskManagement.attaching_file)
-            return  # Не очищаем состояние, переходим к прикреплению файла
-            
-        else:  # comment
-            # Если нет текста - просим ввести текст
-            if not comment_text:
+            else:
                 await message.answer("❌ Введите текст комментария.")
-                return
-            
-            # Сохраняем текст комментария и переходим к прикреплению файла
-            await state.update_data(comment_text=comment_text, comment_files=[])
-            await message.answer(
-                "📷 Прикрепите фото или видео (если нужно) или нажмите 'Пропустить':",
-                reply_markup=get_skip_or_done_keyboard()
-            )
-            await state.set_state(ExecutorTaskManagement.attaching_file)
-            return  # Не очищаем состояние, переходим к прикреплению файла
+            return
+        
+        # Сохраняем текст комментария и переходим к прикреплению файла (не очищаем состояние)
+        await _set_state_with_data(
+            state, ExecutorTaskManagement.attaching_file, user_data,
+            comment_text=comment_text, comment_files=[],
+        )
+        await message.answer(
+            "📷 Прикрепите фото или видео (если нужно) или нажмите 'Пропустить':",
+            reply_markup=get_skip_or_done_keyboard()
+        )
         
     except Exception as e:
         logger.error(f"Error processing executor action: {e}", exc_info=True)
@@ -3837,10 +3909,9 @@ async def show_executor_profile(message: Message, state: FSMContext):
         await message.answer("❌ Профиль исполнителя не найден.")
         return
     
-    concept_names = []
-    for cid in executor.serving_franchise_groups or []:
-        info = FRANCHISE_GROUPS.get(cid)
-        concept_names.append(info["name"] if info else f"ID {cid}")
+    concept_names = [
+        _FRANCHISE_NAME_BY_ID.get(cid, f"ID {cid}") for cid in executor.serving_franchise_groups or []
+    ]
     if not concept_names:
         concept_names = ["Не выбраны"]
     
@@ -3867,9 +3938,9 @@ async def show_executor_profile(message: Message, state: FSMContext):
     )
     
     # Если исполнитель активен, показываем кнопки редактирования
-    status_normalized = (executor.profile_status or "").strip().lower()
+    status_normalized = _normalized_status(executor)
     
-    if status_normalized == "активен":
+    if status_normalized in _ACTIVE_STATUSES:
         profile_text += "\n\nВыберите, что хотите изменить:"
         await message.answer(
             profile_text,
@@ -3889,24 +3960,26 @@ async def _ensure_executor_profile(user_id: int, target_message: Message, requir
         return None
     
     if require_active:
-        # Нормализуем статус для сравнения (убираем пробелы, приводим к нижнему регистру)
-        status_normalized = (executor.profile_status or "").strip().lower()
-        if status_normalized != "активен":
-            status_msg = {
-                "ожидает подтверждения": "⏳ Ваш профиль ожидает подтверждения администратором.",
-                "отклонён": "❌ Ваша регистрация была отклонена. Обратитесь к администратору.",
-                "отклонен": "❌ Ваша регистрация была отклонена. Обратитесь к администратору.",
-            }.get(status_normalized, f"❌ Ваш профиль не активен. Текущий статус: '{executor.profile_status}'")
+        status_normalized = _normalized_status(executor)
+        if status_normalized not in _ACTIVE_STATUSES:
+            status_msg = _INACTIVE_STATUS_MESSAGES.get(
+                status_normalized, f"❌ Ваш профиль не активен. Текущий статус: '{executor.profile_status}'"
+            )
             await target_message.answer(f"❌ Редактирование профиля недоступно.\n\n{status_msg}")
             return None
     
     return executor
 
 
-def _build_concepts_keyboard(selected_ids: list[int]) -> InlineKeyboardMarkup:
-    selected_ids = selected_ids or []
+def _build_concepts_keyboard(selected_ids) -> InlineKeyboardMarkup:
+    return _concepts_keyboard(frozenset(selected_ids or ()))
+
+
+# Концепций немного, поэтому и вариантов выбора немного: готовую клавиатуру для каждого переиспользуем
+@lru_cache(maxsize=256)
+def _concepts_keyboard(selected_ids: FrozenSet[int]) -> InlineKeyboardMarkup:
     buttons = []
-    for cid, data in sorted(FRANCHISE_GROUPS.items(), key=lambda item: item[1]["name"]):
+    for cid, data in _SORTED_FRANCHISE_GROUPS:
         prefix = "✅ " if cid in selected_ids else "⬜️ "
         buttons.append([
             InlineKeyboardButton(
@@ -3921,10 +3994,47 @@ def _build_concepts_keyboard(selected_ids: list[int]) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+def _is_repeated_toggle(callback_query: CallbackQuery) -> bool:
+    now = time.monotonic()
+    key = (callback_query.from_user.id, callback_query.data)
+    last = _toggle_last_click.get(key)
+    if last is not None and now - last < _TOGGLE_DEBOUNCE_SECONDS:
+        return True
+    _toggle_last_click[key] = now
+    if len(_toggle_last_click) > 1000:
+        for stale_key in [k for k, ts in _toggle_last_click.items() if now - ts > 5]:
+            _toggle_last_click.pop(stale_key, None)
+    return False
+
+
+async def _toggle_in_state(state: FSMContext, key: str, value: int) -> Set[int]:
+    """Отмечает/снимает value в списке key данных FSM: одно чтение и одна запись хранилища.
+
+    Выбор переключается симметрической разностью; в состоянии хранится отсортированный список
+    (данные FSM должны оставаться сериализуемыми).
+    """
+    data = await state.get_data()
+    selected = set(data.get(key) or ()) ^ {value}
+    data[key] = sorted(selected)
+    await state.set_data(data)
+    return selected
+
+
+async def _edit_selection_markup(message: Message, markup: InlineKeyboardMarkup):
+    """Обновляет только клавиатуру сообщения с выбором: текст при переключении не меняется."""
+    try:
+        await message.edit_reply_markup(reply_markup=markup)
+    except TelegramBadRequest as e:
+        # Повторное нажатие до обновления сообщения — клавиатура уже в нужном состоянии
+        if "message is not modified" not in str(e):
+            raise
+
+
 def _build_restaurants_keyboard(restaurants: Dict[int, str], selected_ids: list[int]) -> InlineKeyboardMarkup:
-    selected_ids = selected_ids or []
+    """restaurants — карта из _load_restaurant_map, уже упорядоченная по названию."""
+    selected_ids = set(selected_ids or ())
     buttons = []
-    for cid, name in sorted(restaurants.items(), key=lambda item: item[1]):
+    for cid, name in restaurants.items():
         prefix = "✅ " if cid in selected_ids else "⬜️ "
         buttons.append([
             InlineKeyboardButton(
@@ -3939,17 +4049,23 @@ def _build_restaurants_keyboard(restaurants: Dict[int, str], selected_ids: list[
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def _get_allowed_template_ids(executor) -> Set[int]:
+# Шаблоны задач по направлению исполнителя; без направления или с неизвестным — все шаблоны
+_SE_TEMPLATE_IDS = frozenset(PLANFIX_SE_TEMPLATES)
+_IT_TEMPLATE_IDS = frozenset(PLANFIX_IT_TEMPLATES)
+_ALL_TEMPLATE_IDS = _SE_TEMPLATE_IDS | _IT_TEMPLATE_IDS
+_TEMPLATE_IDS_BY_DIRECTION = {
+    "se": _SE_TEMPLATE_IDS,
+    "сэ": _SE_TEMPLATE_IDS,
+    "служба эксплуатации": _SE_TEMPLATE_IDS,
+    "it": _IT_TEMPLATE_IDS,
+    "ит": _IT_TEMPLATE_IDS,
+    "it служба": _IT_TEMPLATE_IDS,
+}
+
+
+def _get_allowed_template_ids(executor) -> FrozenSet[int]:
     direction = (executor.service_direction or "").lower()
-    templates: Set[int] = set()
-    if not direction or direction in ("se", "сэ", "служба эксплуатации"):
-        templates.update(PLANFIX_SE_TEMPLATES.keys())
-    if not direction or direction in ("it", "ит", "it служба"):
-        templates.update(PLANFIX_IT_TEMPLATES.keys())
-    if not templates:
-        templates.update(PLANFIX_SE_TEMPLATES.keys())
-        templates.update(PLANFIX_IT_TEMPLATES.keys())
-    return templates
+    return _TEMPLATE_IDS_BY_DIRECTION.get(direction, _ALL_TEMPLATE_IDS)
 
 
 def _task_matches_executor(task: dict, executor) -> bool:
@@ -3959,7 +4075,7 @@ def _task_matches_executor(task: dict, executor) -> bool:
         if template_id is None or template_id not in allowed_templates:
             return False
 
-    allowed_restaurants = set(_extract_restaurant_ids(executor.serving_restaurants))
+    allowed_restaurants = _allowed_restaurant_ids(executor)
     if allowed_restaurants:
         counterparty_id = _normalize_pf_id((task.get('counterparty') or {}).get('id'))
         if counterparty_id is None or counterparty_id not in allowed_restaurants:
@@ -3983,8 +4099,7 @@ async def exec_edit_name_start(callback_query: CallbackQuery, state: FSMContext)
 async def exec_edit_name_process(message: Message, state: FSMContext):
     # Проверяем, что исполнитель активен
     executor = await db_manager.get_executor_profile(message.from_user.id)
-    status_normalized = (executor.profile_status or "").strip().lower() if executor else ""
-    if not executor or status_normalized != "активен":
+    if not _is_active_executor(executor):
         await message.answer("❌ Редактирование недоступно. Ваш профиль не активен.")
         await state.clear()
         return
@@ -4036,8 +4151,8 @@ async def exec_edit_phone_contact(message: Message, state: FSMContext):
 @router.message(ExecutorProfileEdit.editing_phone, F.text)
 async def exec_edit_phone_text(message: Message, state: FSMContext):
     phone_text = (message.text or "").strip()
-    normalized = re.sub(r"[^0-9+]", "", phone_text)
-    if not normalized or len(re.sub(r"\D", "", normalized)) < 10:
+    normalized = _PHONE_KEEP_RE.sub("", phone_text)
+    if not normalized or len(_PHONE_DIGITS_RE.sub("", normalized)) < 10:
         await message.answer("❌ Некорректный номер телефона. Введите его заново в формате +79991234567.")
         return
     await _update_executor_phone(message, state, normalized)
@@ -4046,8 +4161,7 @@ async def exec_edit_phone_text(message: Message, state: FSMContext):
 async def _update_executor_phone(message: Message, state: FSMContext, phone: str):
     # Проверяем, что исполнитель активен
     executor = await db_manager.get_executor_profile(message.from_user.id)
-    status_normalized = (executor.profile_status or "").strip().lower() if executor else ""
-    if not executor or status_normalized != "активен":
+    if not _is_active_executor(executor):
         await message.answer("❌ Редактирование недоступно. Ваш профиль не активен.")
         await state.clear()
         return
@@ -4081,8 +4195,7 @@ async def exec_edit_position_start(callback_query: CallbackQuery, state: FSMCont
 async def exec_edit_position_process(message: Message, state: FSMContext):
     # Проверяем, что исполнитель активен
     executor = await db_manager.get_executor_profile(message.from_user.id)
-    status_normalized = (executor.profile_status or "").strip().lower() if executor else ""
-    if not executor or status_normalized != "активен":
+    if not _is_active_executor(executor):
         await message.answer("❌ Редактирование недоступно. Ваш профиль не активен.")
         await state.clear()
         return
@@ -4108,6 +4221,47 @@ async def exec_edit_position_process(message: Message, state: FSMContext):
         await state.clear()
 
 
+async def _persist_profile_update(bot, telegram_id: int, chat_id: int):
+    """Сохраняет накопленные изменения профиля исполнителя одним UPDATE; при ошибке сообщает об этом."""
+    lock = _profile_write_locks.get(telegram_id)
+    if lock is None:
+        lock = _profile_write_locks[telegram_id] = asyncio.Lock()
+    async with lock:
+        # Забираем изменения только под блокировкой: всё, что пришло, пока ждали предыдущую запись, уйдёт вместе
+        pending = _pending_profile_updates.pop(telegram_id, None)
+        if not pending:
+            return
+        fields, error_texts = pending
+        try:
+            await db_manager.update_executor_profile(telegram_id, **fields)
+        except Exception as e:
+            logger.error(f"Error saving executor {telegram_id} profile fields {list(fields)}: {e}", exc_info=True)
+            try:
+                await bot.send_message(chat_id, "\n".join(error_texts))
+            except Exception:
+                pass
+
+
+def _schedule_profile_update(callback_query: CallbackQuery, error_text: str, **fields):
+    """Запускает сохранение профиля в фоне, чтобы ответ на нажатие кнопки не ждал записи в БД.
+
+    Если предыдущие изменения этого исполнителя ещё не записаны, новые поля добавляются к ним.
+    """
+    telegram_id = callback_query.from_user.id
+    pending = _pending_profile_updates.get(telegram_id)
+    if pending is not None:
+        pending[0].update(fields)
+        if error_text not in pending[1]:
+            pending[1].append(error_text)
+        return
+    _pending_profile_updates[telegram_id] = (dict(fields), [error_text])
+    _spawn_background(_persist_profile_update(
+        callback_query.bot,
+        telegram_id,
+        callback_query.message.chat.id,
+    ))
+
+
 @router.callback_query(F.data == "exec_edit_concepts")
 async def exec_edit_concepts_start(callback_query: CallbackQuery, state: FSMContext):
     executor = await _ensure_executor_profile(callback_query.from_user.id, callback_query.message, require_active=True)
@@ -4127,22 +4281,15 @@ async def exec_edit_concepts_start(callback_query: CallbackQuery, state: FSMCont
 
 @router.callback_query(ExecutorProfileEdit.editing_concepts, F.data.startswith("exec_toggle_concept:"))
 async def exec_toggle_concept(callback_query: CallbackQuery, state: FSMContext):
-    data = await state.get_data()
-    selected = list(data.get("concept_selection") or [])
-    cid = int(callback_query.data.split(":")[1])
-    if cid not in FRANCHISE_GROUPS:
+    if _is_repeated_toggle(callback_query):
+        await callback_query.answer()
+        return
+    cid = _normalize_pf_id(callback_query.data)
+    if cid not in _FRANCHISE_GROUP_IDS:
         await callback_query.answer("Недопустимая концепция", show_alert=True)
         return
-    if cid in selected:
-        selected.remove(cid)
-    else:
-        selected.append(cid)
-    await state.update_data(concept_selection=selected)
-    await callback_query.message.edit_text(
-        "🏢 Выберите концепции, в которых вы работаете.\n"
-        "Нажимайте на кнопки, чтобы отметить/снять выбор. Минимум одна концепция.",
-        reply_markup=_build_concepts_keyboard(selected)
-    )
+    selected = await _toggle_in_state(state, "concept_selection", cid)
+    await _edit_selection_markup(callback_query.message, _build_concepts_keyboard(selected))
     await callback_query.answer()
 
 
@@ -4154,20 +4301,16 @@ async def exec_concepts_done(callback_query: CallbackQuery, state: FSMContext):
         await callback_query.answer("Выберите минимум одну концепцию.", show_alert=True)
         return
     try:
-        await db_manager.update_executor_profile(
-            callback_query.from_user.id,
-            serving_franchise_groups=concept_ids
+        _schedule_profile_update(
+            callback_query, "❌ Не удалось обновить список концепций.",
+            serving_franchise_groups=concept_ids,
         )
         await state.clear()
-        concept_names = [FRANCHISE_GROUPS[cid]['name'] for cid in concept_ids if cid in FRANCHISE_GROUPS]
+        concept_names = [name for name in map(_FRANCHISE_NAME_BY_ID.get, concept_ids) if name]
         await callback_query.message.edit_text(
             "✅ Концепции обновлены:\n" + "\n".join(f"- {name}" for name in concept_names)
         )
-        await callback_query.message.answer(
-            "Выберите действие:",
-            reply_markup=get_executor_main_menu_keyboard()
-        )
-        logger.info(f"Executor {callback_query.from_user.id} updated franchise groups to {concept_ids}")
+        logger.info("Executor %s updated franchise groups to %s", callback_query.from_user.id, concept_ids)
         await callback_query.answer()
     except Exception as e:
         logger.error(f"Error updating executor concepts: {e}", exc_info=True)
@@ -4191,10 +4334,11 @@ async def exec_edit_restaurants_start(callback_query: CallbackQuery, state: FSMC
         await callback_query.message.edit_text("❌ Не удалось загрузить список ресторанов.")
         await callback_query.answer()
         return
-    selected_ids = _extract_restaurant_ids(executor.serving_restaurants)
+    # В выборе оставляем только рестораны из карты: остальные нельзя увидеть и снять на клавиатуре
+    selected_ids = [rid for rid in _extract_restaurant_ids(executor.serving_restaurants) if rid in restaurants_map]
     await state.update_data(
-        exec_available_restaurants=restaurants_map,
-        exec_restaurant_selection=selected_ids
+        exec_restaurant_selection=selected_ids,
+        exec_restaurant_map=[[rid, name] for rid, name in restaurants_map.items()],
     )
     await callback_query.message.edit_text(
         "🏪 Выберите рестораны, которые вы обслуживаете.\n"
@@ -4207,27 +4351,19 @@ async def exec_edit_restaurants_start(callback_query: CallbackQuery, state: FSMC
 
 @router.callback_query(ExecutorProfileEdit.editing_restaurants, F.data.startswith("exec_toggle_restaurant:"))
 async def exec_toggle_restaurant(callback_query: CallbackQuery, state: FSMContext):
-    data = await state.get_data()
-    selected = list(data.get("exec_restaurant_selection") or [])
-    restaurants_map = data.get("exec_available_restaurants") or {}
-    try:
-        rid = int(callback_query.data.split(":")[1])
-    except Exception:
+    if _is_repeated_toggle(callback_query):
+        await callback_query.answer()
+        return
+    rid = _normalize_pf_id(callback_query.data)
+    if rid is None:
         await callback_query.answer("Некорректный выбор", show_alert=True)
         return
+    restaurants_map = await _restaurant_map_from_state(state)
     if rid not in restaurants_map:
         await callback_query.answer("Ресторан не найден", show_alert=True)
         return
-    if rid in selected:
-        selected.remove(rid)
-    else:
-        selected.append(rid)
-    await state.update_data(exec_restaurant_selection=selected)
-    await callback_query.message.edit_text(
-        "🏪 Выберите рестораны, которые вы обслуживаете.\n"
-        "Нажимайте на кнопки, чтобы отметить/снять выбор. Минимум один ресторан.",
-        reply_markup=_build_restaurants_keyboard(restaurants_map, selected)
-    )
+    selected = await _toggle_in_state(state, "exec_restaurant_selection", rid)
+    await _edit_selection_markup(callback_query.message, _build_restaurants_keyboard(restaurants_map, selected))
     await callback_query.answer()
 
 
@@ -4235,32 +4371,32 @@ async def exec_toggle_restaurant(callback_query: CallbackQuery, state: FSMContex
 async def exec_restaurants_done(callback_query: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     selected = data.get("exec_restaurant_selection") or []
-    restaurants_map = data.get("exec_available_restaurants") or {}
     if not selected:
         await callback_query.answer("Выберите минимум один ресторан.", show_alert=True)
         return
-    payload = []
-    display_names = []
-    for rid in selected:
-        name = restaurants_map.get(rid)
-        if not name:
-            name = restaurants_map.get(str(rid), f"Ресторан #{rid}")
-        payload.append({"id": rid, "name": name})
-        display_names.append(name)
+    restaurants_map = await _restaurant_map_from_state(state)
+    # Не сохраняем рестораны, которых нет в карте: их названия пришлось бы выдумывать
+    missing = [rid for rid in selected if rid not in restaurants_map]
+    if missing:
+        logger.warning(
+            "Executor %s restaurants not saved: %s missing from restaurant map",
+            callback_query.from_user.id, missing,
+        )
+        await callback_query.answer(
+            "❌ Не удалось загрузить список ресторанов. Попробуйте ещё раз.", show_alert=True
+        )
+        return
+    payload = [{"id": rid, "name": restaurants_map[rid]} for rid in selected]
     try:
-        await db_manager.update_executor_profile(
-            callback_query.from_user.id,
-            serving_restaurants=payload
+        _schedule_profile_update(
+            callback_query, "❌ Не удалось обновить список ресторанов.",
+            serving_restaurants=payload,
         )
         await state.clear()
         await callback_query.message.edit_text(
-            "✅ Рестораны обновлены:\n" + "\n".join(f"- {name}" for name in display_names)
+            "✅ Рестораны обновлены:\n" + "\n".join(f"- {item['name']}" for item in payload)
         )
-        await callback_query.message.answer(
-            "Выберите действие:",
-            reply_markup=get_executor_main_menu_keyboard()
-        )
-        logger.info(f"Executor {callback_query.from_user.id} updated restaurants to {selected}")
+        logger.info("Executor %s updated restaurants to %s", callback_query.from_user.id, selected)
         await callback_query.answer()
     except Exception as e:
         logger.error(f"Error updating executor restaurants: {e}", exc_info=True)
@@ -4285,24 +4421,20 @@ async def exec_edit_direction_start(callback_query: CallbackQuery, state: FSMCon
 
 @router.callback_query(ExecutorProfileEdit.editing_direction, F.data.startswith("exec_dir:"))
 async def exec_edit_direction_process(callback_query: CallbackQuery, state: FSMContext):
-    direction = callback_query.data.split(":")[1]
+    direction = callback_query.data.partition(":")[2]
     if direction not in ("it", "se"):
         await callback_query.answer("Недопустимое направление", show_alert=True)
         return
     try:
-        await db_manager.update_executor_profile(
-            callback_query.from_user.id,
-            service_direction=direction
+        _schedule_profile_update(
+            callback_query, "❌ Не удалось обновить направление.",
+            service_direction=direction,
         )
         await state.clear()
         await callback_query.message.edit_text(
             f"✅ Направление обновлено: {DIRECTION_LABELS.get(direction, direction)}"
         )
-        await callback_query.message.answer(
-            "Выберите действие:",
-            reply_markup=get_executor_main_menu_keyboard()
-        )
-        logger.info(f"Executor {callback_query.from_user.id} updated direction to {direction}")
+        logger.info("Executor %s updated direction to %s", callback_query.from_user.id, direction)
         await callback_query.answer()
     except Exception as e:
         logger.error(f"Error updating executor direction: {e}", exc_info=True)
@@ -4313,10 +4445,14 @@ async def exec_edit_direction_process(callback_query: CallbackQuery, state: FSMC
 
 @router.callback_query(F.data == "exec_cancel_edit")
 async def exec_cancel_edit(callback_query: CallbackQuery, state: FSMContext):
+    cancelled_state = await state.get_state()
     await state.clear()
     await callback_query.message.edit_text("❌ Редактирование отменено.")
-    await callback_query.message.answer(
-        "Выберите действие:",
-        reply_markup=get_executor_main_menu_keyboard()
-    )
+    # Ввод телефона заменяет reply-клавиатуру главного меню кнопкой «поделиться контактом» — возвращаем меню.
+    # В остальных состояниях меню остаётся на экране, повторно его не отправляем
+    if cancelled_state == ExecutorProfileEdit.editing_phone.state:
+        await callback_query.message.answer(
+            "📋 Используйте меню для работы с заявками:",
+            reply_markup=get_executor_main_menu_keyboard()
+        )
     await callback_query.answer()
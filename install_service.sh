@@ -84,6 +84,7 @@ WorkingDirectory=$PROJECT_DIR
 Environment="PATH=$(dirname $VENV_PYTHON):/usr/local/bin:/usr/bin:/bin"
 Environment="SYSTEMD_SERVICE=1"
 Environment="LOG_DIR=$LOG_DIR"
+Environment="LOG_ROTATION=external"
 ExecStart=$VENV_PYTHON $PROJECT_DIR/main.py
 Restart=always
 RestartSec=10
@@ -103,6 +104,22 @@ SYSTEMD_SERVICE="/etc/systemd/system/telegram-planfix-bot.service"
 cp "$SERVICE_FILE" "$SYSTEMD_SERVICE"
 echo "✅ Service файл скопирован в $SYSTEMD_SERVICE"
 
+# Ротация логов через logrotate (бот пишет файлы без собственной ротации, LOG_ROTATION=external)
+LOGROTATE_CONF="/etc/logrotate.d/telegram-planfix-bot"
+cat > "$LOGROTATE_CONF" << EOF
+$LOG_DIR/bot.log $LOG_DIR/bot_errors.log {
+    su $PROJECT_USER $PROJECT_GROUP
+    size 10M
+    rotate 5
+    missingok
+    notifempty
+    compress
+    delaycompress
+    create 0644 $PROJECT_USER $PROJECT_GROUP
+}
+EOF
+echo "✅ Настроена ротация логов: $LOGROTATE_CONF"
+
 # Перезагружаем systemd
 systemctl daemon-reload
 echo "✅ Systemd перезагружен"
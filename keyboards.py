@@ -1,5 +1,49 @@
+from functools import lru_cache
+
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 
+
+def _short_button_text(text: str) -> str:
+    """Подрезает подпись кнопки до 64 символов (ограничение Telegram)."""
+    return text if len(text) <= 64 else text[:61] + "..."
+
+
+def _name_with_suffix(name: str, suffix: str) -> str:
+    """Подрезает имя так, чтобы подпись «имя + суффикс» уложилась в 64 символа.
+
+    Суффикс (статус, ID) сохраняется целиком; полная строка с длинным
+    именем не собирается.
+    """
+    max_name_len = 64 - len(suffix)
+    if len(name) <= max_name_len:
+        return name + suffix
+    if max_name_len <= 3:
+        return _short_button_text(name[:64] + suffix)
+    return name[:max_name_len - 3] + "..." + suffix
+
+
+# Callback-данные действий с задачей. Префикс совпадает с прежним форматом "<действие>:<task_id>",
+# поэтому кнопки в уже отправленных сообщениях продолжают работать
+class AcceptTaskCallback(CallbackData, prefix="accept"):
+    task_id: int
+
+
+class ResumeTaskCallback(CallbackData, prefix="resume"):
+    task_id: int
+
+
+class CloseTaskCallback(CallbackData, prefix="close"):
+    task_id: int
+
+
+class CommentTaskCallback(CallbackData, prefix="comment"):
+    task_id: int
+
+
+# Клавиатуры без параметров всегда одинаковы: строим их один раз (модели aiogram неизменяемые,
+# поэтому один экземпляр безопасно отдавать во все сообщения)
+@lru_cache(maxsize=None)
 def get_role_selection_keyboard():
     """Клавиатура для выбора роли при регистрации."""
     return InlineKeyboardMarkup(
@@ -15,6 +59,7 @@ def get_role_selection_keyboard():
         ]
     )
 
+@lru_cache(maxsize=None)
 def get_main_menu_keyboard():
     """Главное меню для сотрудников ресторанов."""
     buttons = [
@@ -25,6 +70,7 @@ def get_main_menu_keyboard():
     ]
     return ReplyKeyboardMarkup(keyboard=buttons, resize_keyboard=True)
 
+@lru_cache(maxsize=None)
 def get_executor_main_menu_keyboard():
     """Главное меню для исполнителей."""
     buttons = [
@@ -33,15 +79,17 @@ def get_executor_main_menu_keyboard():
     ]
     return ReplyKeyboardMarkup(keyboard=buttons, resize_keyboard=True)
 
+@lru_cache(maxsize=None)
 def get_phone_number_keyboard():
     button = KeyboardButton(text="Поделиться номером телефона", request_contact=True)
     return ReplyKeyboardMarkup(keyboard=[[button]], resize_keyboard=True)
 
 def create_dynamic_keyboard(items: list, add_cancel_button: bool = False) -> InlineKeyboardMarkup:
     """Создаёт простую inline-клавиатуру из (id, name), подрезая подписи до 64 символов."""
-    def _short(text: str) -> str:
-        return text if len(text) <= 64 else (text[:61] + "...")
-    buttons = [[InlineKeyboardButton(text=_short(item_name), callback_data=item_id)] for item_id, item_name in items]
+    buttons = [
+        [InlineKeyboardButton(text=_short_button_text(name), callback_data=item_id)]
+        for item_id, name in items
+    ]
     if add_cancel_button:
         buttons.append([InlineKeyboardButton(text="Отмена", callback_data="cancel_registration")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -57,6 +105,7 @@ def get_executor_confirmation_keyboard(executor_id):
         ]
     )
 
+@lru_cache(maxsize=None)
 def get_skip_or_done_keyboard():
     return InlineKeyboardMarkup(
         inline_keyboard=[[InlineKeyboardButton(text="⏭ Пропустить", callback_data="skip_file")]]
@@ -66,12 +115,13 @@ def get_task_actions_keyboard(task_id: int, is_new: bool = False, is_waiting: bo
     buttons = []
     # Убрали кнопку "Принять в работу" - все исполнители назначаются автоматически
     # Для новых задач показываем только комментарии и завершение
-    buttons.append([InlineKeyboardButton(text="💬 Написать комментарий", callback_data=f"comment:{task_id}")])
+    buttons.append([InlineKeyboardButton(text="💬 Написать комментарий", callback_data=CommentTaskCallback(task_id=task_id).pack())])
     # Убрали кнопку "Возобновить" - не нужна
-    buttons.append([InlineKeyboardButton(text="✅ Завершить", callback_data=f"close:{task_id}")])
+    buttons.append([InlineKeyboardButton(text="✅ Завершить", callback_data=CloseTaskCallback(task_id=task_id).pack())])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=None)
 def get_profile_edit_keyboard():
     """Клавиатура для редактирования профиля."""
     buttons = [
@@ -84,6 +134,7 @@ def get_profile_edit_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=None)
 def get_executor_profile_edit_keyboard():
     """Клавиатура для редактирования профиля исполнителя."""
     buttons = [
@@ -98,6 +149,7 @@ def get_executor_profile_edit_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=8)
 def get_executor_direction_keyboard(prefix: str = "exec_dir", include_cancel: bool = False):
     """Клавиатура для выбора направления исполнителя."""
     buttons = [
@@ -109,6 +161,7 @@ def get_executor_direction_keyboard(prefix: str = "exec_dir", include_cancel: bo
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=None)
 def get_cancel_keyboard():
     """Клавиатура с кнопкой отмены."""
     return InlineKeyboardMarkup(
@@ -131,45 +184,31 @@ def get_confirmation_keyboard(action: str, task_id: int = None):
     )
 
 
+# Префиксы callback_data кнопок списка заявок по типу действия (по умолчанию — select_task)
+_TASK_LIST_CALLBACK_PREFIXES = {
+    "status": "status_task",
+    "comment": "comment_task",
+    "cancel": "cancel_task",
+}
+
+
 def create_tasks_keyboard(tasks: list, action_type: str = "select") -> InlineKeyboardMarkup:
     """Создает клавиатуру со списком заявок пользователя.
     ВАЖНО: подписи кнопок однострочные и не длиннее 64 символов (ограничение Telegram).
     """
-    def _short(text: str) -> str:
-        return text if len(text) <= 64 else (text[:61] + "...")
-
+    callback_prefix = _TASK_LIST_CALLBACK_PREFIXES.get(action_type, "select_task")
     buttons = []
-    
     for task in tasks:
         task_id = task.get('id')
-        task_name = task.get('name', 'Без названия')
-        status_name = task.get('status', {}).get('name', 'Неизвестно')
-        
-        # Укорачиваем отображаемое имя задачи
-        display_name = task_name[:40] + "..." if len(task_name) > 40 else task_name
-        
-        # Формируем однострочный текст к��опки с ограничением длины
-        base_text = f"#{task_id} – {status_name}: {display_name}"
-        button_text = _short(base_text)
-        
-        # Определяем callback_data в зависимости от типа действия
-        if action_type == "status":
-            callback_data = f"status_task:{task_id}"
-        elif action_type == "comment":
-            callback_data = f"comment_task:{task_id}"
-        elif action_type == "cancel":
-            callback_data = f"cancel_task:{task_id}"
-        else:
-            callback_data = f"select_task:{task_id}"
-        
-        buttons.append([InlineKeyboardButton(text=button_text, callback_data=callback_data)])
+        task_name = task.get('name') or 'Без названия'
+        if len(task_name) > 40:
+            task_name = task_name[:40] + "..."
+        status_name = (task.get('status') or {}).get('name') or 'Неизвестно'
+        button_text = _short_button_text(f"#{task_id} – {status_name}: {task_name}")
+        buttons.append([InlineKeyboardButton(text=button_text, callback_data=f"{callback_prefix}:{task_id}")])
     
-    # Добавляем кнопку "Ввести номер вручную"
     buttons.append([InlineKeyboardButton(text="⌨️ Ввести номер вручную", callback_data="manual_input")])
-    
-    # Добавляем кнопку отмены
     buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="cancel_action")])
-    
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
@@ -197,6 +236,7 @@ def get_task_action_keyboard(task_id: int, action_type: str) -> InlineKeyboardMa
 # АДМИН-КЛАВИАТУРЫ
 # ============================================================================
 
+@lru_cache(maxsize=None)
 def get_admin_main_menu_keyboard():
     """Главное меню администратора."""
     buttons = [
@@ -207,6 +247,7 @@ def get_admin_main_menu_keyboard():
     return ReplyKeyboardMarkup(keyboard=buttons, resize_keyboard=True)
 
 
+@lru_cache(maxsize=None)
 def get_admin_users_menu_keyboard():
     """Меню управления пользователями."""
     return InlineKeyboardMarkup(
@@ -218,6 +259,7 @@ def get_admin_users_menu_keyboard():
     )
 
 
+@lru_cache(maxsize=None)
 def get_admin_executors_menu_keyboard():
     """Меню управления исполнителями."""
     return InlineKeyboardMarkup(
@@ -229,6 +271,8 @@ def get_admin_executors_menu_keyboard():
     )
 
 
+# Клавиатуры профиля зависят только от типа и ID профиля — при переходах по одному профилю переиспользуем их
+@lru_cache(maxsize=1024)
 def get_admin_profile_actions_keyboard(profile_type: str, profile_id: int):
     """Клавиатура действий с профилем (пользователь/исполнитель)."""
     buttons = [
@@ -239,36 +283,50 @@ def get_admin_profile_actions_keyboard(profile_type: str, profile_id: int):
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+# Редактируемые поля профилей в админке: (подпись кнопки, поле в callback_data)
+_ADMIN_USER_FIELDS = (
+    ("✏️ ФИО", "full_name"),
+    ("✏️ Телефон", "phone"),
+    ("✏️ Email", "email"),
+    ("✏️ Концепция", "franchise"),
+    ("✏️ Ресторан", "restaurant"),
+)
+_ADMIN_EXECUTOR_FIELDS = (
+    ("✏️ ФИО", "full_name"),
+    ("✏️ Телефон", "phone"),
+    ("✏️ Email", "email"),
+    ("✏️ Должность", "position"),
+    ("✏️ Концепции", "concepts"),
+    ("✏️ Рестораны", "restaurants"),
+    ("✏️ Направление", "direction"),
+    ("✏️ Planfix Contact ID", "planfix_id"),
+    ("✏️ Статус", "status"),
+)
+
+
+@lru_cache(maxsize=1024)
 def get_admin_edit_user_keyboard(user_id: int):
     """Клавиатура редактирования пользователя."""
     buttons = [
-        [InlineKeyboardButton(text="✏️ ФИО", callback_data=f"admin_edit_user_field:{user_id}:full_name")],
-        [InlineKeyboardButton(text="✏️ Телефон", callback_data=f"admin_edit_user_field:{user_id}:phone")],
-        [InlineKeyboardButton(text="✏️ Email", callback_data=f"admin_edit_user_field:{user_id}:email")],
-        [InlineKeyboardButton(text="✏️ Концепция", callback_data=f"admin_edit_user_field:{user_id}:franchise")],
-        [InlineKeyboardButton(text="✏️ Ресторан", callback_data=f"admin_edit_user_field:{user_id}:restaurant")],
-        [InlineKeyboardButton(text="◀️ Назад", callback_data=f"admin_view_user:{user_id}")]
+        [InlineKeyboardButton(text=text, callback_data=f"admin_edit_user_field:{user_id}:{field}")]
+        for text, field in _ADMIN_USER_FIELDS
     ]
+    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data=f"admin_view_user:{user_id}")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=1024)
 def get_admin_edit_executor_keyboard(executor_id: int):
     """Клавиатура редактирования исполнителя."""
     buttons = [
-        [InlineKeyboardButton(text="✏️ ФИО", callback_data=f"admin_edit_exec_field:{executor_id}:full_name")],
-        [InlineKeyboardButton(text="✏️ Телефон", callback_data=f"admin_edit_exec_field:{executor_id}:phone")],
-        [InlineKeyboardButton(text="✏️ Email", callback_data=f"admin_edit_exec_field:{executor_id}:email")],
-        [InlineKeyboardButton(text="✏️ Должность", callback_data=f"admin_edit_exec_field:{executor_id}:position")],
-        [InlineKeyboardButton(text="✏️ Концепции", callback_data=f"admin_edit_exec_field:{executor_id}:concepts")],
-        [InlineKeyboardButton(text="✏️ Рестораны", callback_data=f"admin_edit_exec_field:{executor_id}:restaurants")],
-        [InlineKeyboardButton(text="✏️ Направление", callback_data=f"admin_edit_exec_field:{executor_id}:direction")],
-        [InlineKeyboardButton(text="✏️ Planfix Contact ID", callback_data=f"admin_edit_exec_field:{executor_id}:planfix_id")],
-        [InlineKeyboardButton(text="✏️ Статус", callback_data=f"admin_edit_exec_field:{executor_id}:status")],
-        [InlineKeyboardButton(text="◀️ Назад", callback_data=f"admin_view_executor:{executor_id}")]
+        [InlineKeyboardButton(text=text, callback_data=f"admin_edit_exec_field:{executor_id}:{field}")]
+        for text, field in _ADMIN_EXECUTOR_FIELDS
     ]
+    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data=f"admin_view_executor:{executor_id}")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=1024)
 def get_admin_delete_confirmation_keyboard(profile_type: str, profile_id: int):
     """Клавиатура подтверждения удаления."""
     return InlineKeyboardMarkup(
@@ -281,26 +339,21 @@ def get_admin_delete_confirmation_keyboard(profile_type: str, profile_id: int):
     )
 
 
-def create_users_list_keyboard(users: list, page: int = 0, per_page: int = 10):
-    """Создает клавиатуру со списком пользователей с пагинацией."""
-    def _short(text: str) -> str:
-        return text if len(text) <= 64 else (text[:61] + "...")
-    
+def create_users_list_keyboard(users: list, page: int = 0, has_next: bool = False):
+    """Создает клавиатуру со страницей пользователей (users — уже выбранная из БД страница)."""
     buttons = []
-    start_idx = page * per_page
-    end_idx = start_idx + per_page
     
-    for user in users[start_idx:end_idx]:
+    for user in users:
         user_id = user.telegram_id
         name = user.full_name or f"ID: {user_id}"
-        button_text = _short(f"{name} (ID: {user_id})")
+        button_text = _name_with_suffix(name, f" (ID: {user_id})")
         buttons.append([InlineKeyboardButton(text=button_text, callback_data=f"admin_view_user:{user_id}")])
     
     # Кнопки пагинации
     nav_buttons = []
     if page > 0:
         nav_buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"admin_list_users_page:{page-1}"))
-    if end_idx < len(users):
+    if has_next:
         nav_buttons.append(InlineKeyboardButton(text="Вперед ▶️", callback_data=f"admin_list_users_page:{page+1}"))
     if nav_buttons:
         buttons.append(nav_buttons)
@@ -310,27 +363,22 @@ def create_users_list_keyboard(users: list, page: int = 0, per_page: int = 10):
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def create_executors_list_keyboard(executors: list, page: int = 0, per_page: int = 10):
-    """Создает клавиатуру со списком исполнителей с пагинацией."""
-    def _short(text: str) -> str:
-        return text if len(text) <= 64 else (text[:61] + "...")
-    
+def create_executors_list_keyboard(executors: list, page: int = 0, has_next: bool = False):
+    """Создает клавиатуру со страницей исполнителей (executors — уже выбранная из БД страница)."""
     buttons = []
-    start_idx = page * per_page
-    end_idx = start_idx + per_page
     
-    for executor in executors[start_idx:end_idx]:
+    for executor in executors:
         executor_id = executor.telegram_id
         name = executor.full_name or f"ID: {executor_id}"
         status = executor.profile_status or "неизвестно"
-        button_text = _short(f"{name} ({status}) - ID: {executor_id}")
+        button_text = _name_with_suffix(name, f" ({status}) - ID: {executor_id}")
         buttons.append([InlineKeyboardButton(text=button_text, callback_data=f"admin_view_executor:{executor_id}")])
     
     # Кнопки пагинации
     nav_buttons = []
     if page > 0:
         nav_buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"admin_list_executors_page:{page-1}"))
-    if end_idx < len(executors):
+    if has_next:
         nav_buttons.append(InlineKeyboardButton(text="Вперед ▶️", callback_data=f"admin_list_executors_page:{page+1}"))
     if nav_buttons:
         buttons.append(nav_buttons)
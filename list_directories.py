@@ -11,6 +11,15 @@ import sys
 from planfix_client import planfix_client
 
 
+def _directory_row(directory: dict) -> str:
+    """Строка таблицы для одного справочника."""
+    dir_id = directory.get("id", "N/A")
+    dir_name = directory.get("name", "Без названия")
+    dir_group = directory.get("group", {})
+    group_name = dir_group.get("name", "") if isinstance(dir_group, dict) else str(dir_group)
+    return f"{dir_id:<10} {dir_name:<50} {group_name:<20}"
+
+
 async def list_directories():
     """Получает и выводит список всех справочников Planfix."""
     try:
@@ -33,13 +42,9 @@ async def list_directories():
         print(f"{'ID':<10} {'Название':<50} {'Группа':<20}")
         print("=" * 80)
         
-        for directory in directories:
-            dir_id = directory.get("id", "N/A")
-            dir_name = directory.get("name", "Без названия")
-            dir_group = directory.get("group", {})
-            group_name = dir_group.get("name", "") if isinstance(dir_group, dict) else str(dir_group)
-            
-            print(f"{dir_id:<10} {dir_name:<50} {group_name:<20}")
+        # Строки таблицы собираем целиком и выводим одной записью
+        rows = [_directory_row(directory) for directory in directories]
+        sys.stdout.write("\n".join(rows) + "\n")
         
         print("=" * 80)
         print("\n💡 Чтобы использовать справочник, скопируйте его ID в .env файл:")
@@ -13,12 +13,38 @@
 
 import asyncio
 import sys
+from typing import Awaitable, Optional
 from planfix_client import planfix_client
 from config import PLANFIX_TASK_PROCESS_ID
 
 
-async def list_task_statuses():
-    """Получает и выводит список статусов задач для процесса."""
+def _status_row(status: dict) -> str:
+    """Строка таблицы для одного статуса задачи."""
+    status_id = status.get("id", "N/A")
+    status_name = status.get("name", "Без названия")
+    system_name = status.get("systemName", "")
+    is_final = "Да" if status.get("isFinal", False) else "Нет"
+    # ID может быть строкой вида "status:3" — выводим как есть
+    return f"{str(status_id):<15} {status_name:<40} {system_name:<25} {is_final:<10}"
+
+
+def _request_task_statuses() -> Awaitable[dict]:
+    return planfix_client.get_process_task_statuses(
+        PLANFIX_TASK_PROCESS_ID,
+        fields="id,name,isFinal,systemName"
+    )
+
+
+def _request_contact_groups() -> Awaitable[dict]:
+    return planfix_client.get_contact_groups(fields="id,name")
+
+
+async def list_task_statuses(request: Optional[Awaitable[dict]] = None):
+    """Получает и выводит список статусов задач для процесса.
+
+    request — уже запущенный запрос статусов (см. main); без него запрос
+    выполняется здесь.
+    """
     try:
         if not PLANFIX_TASK_PROCESS_ID:
             print("⚠️  PLANFIX_TASK_PROCESS_ID не задан в .env файле.")
@@ -28,10 +54,7 @@ async def list_task_statuses():
         print("🔍 Получение списка статусов задач из Planfix...")
         print(f"   Процесс ID: {PLANFIX_TASK_PROCESS_ID}\n")
         
-        response = await planfix_client.get_process_task_statuses(
-            PLANFIX_TASK_PROCESS_ID,
-            fields="id,name,isFinal,systemName"
-        )
+        response = await (request or _request_task_statuses())
         
         if response.get("result") != "success":
             print(f"❌ Ошибка при получении статусов: {response}")
@@ -48,19 +71,9 @@ async def list_task_statuses():
         print(f"{'ID':<15} {'Название':<40} {'Системное имя':<25} {'Финальный':<10}")
         print("=" * 100)
         
-        for status in statuses:
-            status_id = status.get("id", "N/A")
-            status_name = status.get("name", "Без названия")
-            system_name = status.get("systemName", "")
-            is_final = "Да" if status.get("isFinal", False) else "Нет"
-            
-            # Форматируем ID (может быть строкой вида "status:3")
-            if isinstance(status_id, str) and ":" in status_id:
-                status_id_display = status_id
-            else:
-                status_id_display = str(status_id)
-            
-            print(f"{status_id_display:<15} {status_name:<40} {system_name:<25} {is_final:<10}")
+        # Строки таблицы собираем целиком и выводим одной записью
+        rows = [_status_row(status) for status in statuses]
+        sys.stdout.write("\n".join(rows) + "\n")
         
         print("=" * 100)
         print("\n💡 Чтобы использовать статус, скопируйте его ID в .env файл:")
@@ -77,13 +90,13 @@ async def list_task_statuses():
         traceback.print_exc()
 
 
-async def list_contact_groups():
-    """Получает и выводит список групп контактов."""
+async def list_contact_groups(request: Optional[Awaitable[dict]] = None):
+    """Получает и выводит список групп контактов (request — уже запущенный запрос, см. main)."""
     try:
         print("\n" + "=" * 100)
         print("🔍 Получение списка групп контактов из Planfix...\n")
         
-        response = await planfix_client.get_contact_groups(fields="id,name")
+        response = await (request or _request_contact_groups())
         
         if response.get("result") != "success":
             print(f"❌ Ошибка при получении групп контактов: {response}")
@@ -100,11 +113,11 @@ async def list_contact_groups():
         print(f"{'ID':<10} {'Название':<60}")
         print("=" * 100)
         
-        for group in groups:
-            group_id = group.get("id", "N/A")
-            group_name = group.get("name", "Без названия")
-            
-            print(f"{group_id:<10} {group_name:<60}")
+        rows = [
+            f"{group.get('id', 'N/A'):<10} {group.get('name', 'Без названия'):<60}"
+            for group in groups
+        ]
+        sys.stdout.write("\n".join(rows) + "\n")
         
         print("=" * 100)
         print("\n💡 Чтобы использовать группу контактов, скопируйте её ID в .env файл:")
@@ -120,11 +133,18 @@ async def list_contact_groups():
 async def main():
     """Основная функция."""
     try:
+        # Запросы независимы: запускаем оба сразу, а выводим результаты по очереди,
+        # чтобы таблицы не перемешивались
+        statuses_request = (
+            asyncio.ensure_future(_request_task_statuses()) if PLANFIX_TASK_PROCESS_ID else None
+        )
+        groups_request = asyncio.ensure_future(_request_contact_groups())
+        
         # Получаем статусы задач
-        await list_task_statuses()
+        await list_task_statuses(statuses_request)
         
         # Получаем группы контактов
-        await list_contact_groups()
+        await list_contact_groups(groups_request)
         
         print("\n" + "=" * 100)
         print("✅ Завершено!")
@@ -1,75 +1,127 @@
 from __future__ import annotations
 
+import atexit
+import copy
 import logging
 import logging.handlers
 import os
+import queue
 from logging.config import dictConfig
 from pathlib import Path
 
 from config import LOG_LEVEL
 
+_LOG_MAX_BYTES = 10485760  # 10 MB
+_LOG_BACKUP_COUNT = 5
 
-def setup_logging() -> None:
-    """Configure application-wide logging with sane defaults."""
-    log_level = LOG_LEVEL.upper()
-    
-    # Определяем путь к директории логов
-    # Если переменная окружения LOG_DIR не задана, используем текущую директорию
-    log_dir = Path(os.getenv("LOG_DIR", "."))
-    log_dir.mkdir(parents=True, exist_ok=True)
-    
-    log_file = log_dir / "bot.log"
-    error_log_file = log_dir / "bot_errors.log"
-
-    handlers_config = {
+# Базовый шаблон конфигурации; в setup_logging копируется и дополняется
+# уровнем, путями к файлам и списком обработчиков.
+_BASE_CONFIG = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "standard": {
+            "format": "%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        },
+    },
+    "handlers": {
         "console": {
             "class": "logging.StreamHandler",
-            "level": log_level,
             "formatter": "standard",
             "stream": "ext://sys.stdout",
         },
         "file": {
             "class": "logging.handlers.RotatingFileHandler",
-            "level": log_level,
             "formatter": "standard",
-            "filename": str(log_file),
-            "maxBytes": 10485760,  # 10 MB
-            "backupCount": 5,
+            "maxBytes": _LOG_MAX_BYTES,
+            "backupCount": _LOG_BACKUP_COUNT,
             "encoding": "utf-8",
         },
         "error_file": {
             "class": "logging.handlers.RotatingFileHandler",
             "level": "ERROR",
             "formatter": "standard",
-            "filename": str(error_log_file),
-            "maxBytes": 10485760,  # 10 MB
-            "backupCount": 5,
+            "maxBytes": _LOG_MAX_BYTES,
+            "backupCount": _LOG_BACKUP_COUNT,
             "encoding": "utf-8",
         },
-    }
-    
-    # Если запущено в systemd или как сервис, не выводим в консоль
-    if os.getenv("SYSTEMD_SERVICE") == "1":
-        handlers = ["file", "error_file"]
-    else:
-        handlers = ["console", "file", "error_file"]
-
-    dictConfig(
-        {
-            "version": 1,
-            "disable_existing_loggers": False,
-            "formatters": {
-                "standard": {
-                    "format": "%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-                },
-            },
-            "handlers": handlers_config,
-            "root": {
-                "level": log_level,
-                "handlers": handlers,
-            },
-        }
+    },
+    "root": {},
+}
+
+_ALL_HANDLERS = ("console", "file", "error_file")
+# Если запущено в systemd или как сервис, не выводим в консоль
+_SERVICE_HANDLERS = ("file", "error_file")
+
+_FILE_HANDLERS = ("file", "error_file")
+
+_queue_listener: logging.handlers.QueueListener | None = None
+
+
+def _stop_queue_listener() -> None:
+    """Останавливает фоновый поток записи логов, дописывая очередь до конца."""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+def _move_file_handlers_to_queue(root: logging.Logger) -> None:
+    """Переносит файловые обработчики root-логгера в фоновый QueueListener.
+
+    Вызов logger.* из обработчиков бота сводится к queue.put, а запись
+    на диск и ротация выполняются в отдельном потоке и не блокируют
+    event loop. Консольный вывод остаётся синхронным.
+    """
+    global _queue_listener
+    file_handlers = [h for h in root.handlers if isinstance(h, logging.FileHandler)]
+    if not file_handlers:
+        return
+    for handler in file_handlers:
+        root.removeHandler(handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    _queue_listener = logging.handlers.QueueListener(
+        log_queue, *file_handlers, respect_handler_level=True
     )
+    _queue_listener.start()
+
+
+atexit.register(_stop_queue_listener)
 
-    logging.getLogger(__name__).debug("Logging configured with level %s, handlers: %s", log_level, handlers)
 
+def setup_logging() -> None:
+    """Configure application-wide logging with sane defaults."""
+    log_level = LOG_LEVEL.upper()
+    
+    # Определяем путь к директории логов
+    # Если переменная окружения LOG_DIR не задана, используем текущую директорию
+    log_dir = Path(os.getenv("LOG_DIR", "."))
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    handlers = list(_SERVICE_HANDLERS if os.getenv("SYSTEMD_SERVICE") == "1" else _ALL_HANDLERS)
+
+    config = copy.deepcopy(_BASE_CONFIG)
+    handlers_config = config["handlers"]
+    handlers_config["console"]["level"] = log_level
+    handlers_config["file"]["level"] = log_level
+    handlers_config["file"]["filename"] = str(log_dir / "bot.log")
+    handlers_config["error_file"]["filename"] = str(log_dir / "bot_errors.log")
+    config["root"] = {"level": log_level, "handlers": handlers}
+
+    # LOG_ROTATION=external: файлы ротирует logrotate (см. install_service.sh).
+    # WatchedFileHandler переоткрывает файл после ротации и не проверяет размер на каждой записи.
+    if os.getenv("LOG_ROTATION") == "external":
+        for name in _FILE_HANDLERS:
+            handler_config = handlers_config[name]
+            handler_config["class"] = "logging.handlers.WatchedFileHandler"
+            handler_config.pop("maxBytes")
+            handler_config.pop("backupCount")
+
+    # Повторная настройка: сначала дописываем и закрываем прежнюю очередь
+    _stop_queue_listener()
+    dictConfig(config)
+    _move_file_handlers_to_queue(logging.getLogger())
+
+    logging.getLogger(__name__).debug("Logging configured with level %s, handlers: %s", log_level, handlers)
@@ -16,13 +16,17 @@ import logging
 import os
 import signal
 import socket
+import ssl
 import sys
 from datetime import datetime
 from typing import Optional
 
+import aiogram
+import certifi
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.exceptions import TelegramRetryAfter
-from aiohttp import web
+from aiohttp import ClientSession, TCPConnector, web
 
 from config import BOT_TOKEN
 from config.settings import settings
@@ -40,6 +44,11 @@ from webhook_server import create_webhook_app
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# Пул соединений с api.telegram.org: все ответы бота идут через одну сессию, а увеличенный
+# keep-alive (по умолчанию в aiohttp 15 с) позволяет не открывать TLS-соединение заново между сообщениями
+_TELEGRAM_CONNECTION_LIMIT = 100
+_TELEGRAM_KEEPALIVE_TIMEOUT = 75  # seconds
+
 
 async def on_startup(bot: Bot):
     """Инициализация при старте бота."""
@@ -47,7 +56,9 @@ async def on_startup(bot: Bot):
     logger.info("🚀 Bot startup complete")
     logger.info("=" * 80)
     try:
-        await ensure_status_registry_loaded()
+        # Соединение с Planfix открываем параллельно с загрузкой реестра статусов,
+        # чтобы первый запрос пользователя не ждал TLS-рукопожатия
+        await asyncio.gather(ensure_status_registry_loaded(), planfix_client.warmup())
         logger.info("✅ Status registry loaded successfully")
     except Exception as e:
         logger.error(f"❌ Failed to load status registry: {e}", exc_info=True)
@@ -62,6 +73,46 @@ async def on_shutdown(bot: Bot):
     logger.info("✅ All resources closed")
 
 
+class KeepAliveAiohttpSession(AiohttpSession):
+    """AiohttpSession с собственным TCPConnector (AiohttpSession не принимает keepalive_timeout).
+
+    Переопределяет только публичные create_session/close, не полагаясь на внутренние атрибуты aiogram.
+    """
+
+    def __init__(self, limit: int, keepalive_timeout: float):
+        super().__init__(limit=limit)
+        self._keepalive_limit = limit
+        self._keepalive_timeout = keepalive_timeout
+        self._keepalive_session: Optional[ClientSession] = None
+
+    async def create_session(self) -> ClientSession:
+        if self._keepalive_session is None or self._keepalive_session.closed:
+            connector = TCPConnector(
+                ssl=ssl.create_default_context(cafile=certifi.where()),
+                limit=self._keepalive_limit,
+                keepalive_timeout=self._keepalive_timeout,
+                ttl_dns_cache=3600,
+            )
+            self._keepalive_session = ClientSession(
+                connector=connector,
+                headers={"User-Agent": f"aiogram/{aiogram.__version__}"},
+            )
+        return self._keepalive_session
+
+    async def close(self) -> None:
+        if self._keepalive_session is not None and not self._keepalive_session.closed:
+            await self._keepalive_session.close()
+        await super().close()
+
+
+def create_bot() -> Bot:
+    """Создает бота с общей HTTP-сессией для всех запросов к Telegram."""
+    session = KeepAliveAiohttpSession(
+        limit=_TELEGRAM_CONNECTION_LIMIT, keepalive_timeout=_TELEGRAM_KEEPALIVE_TIMEOUT
+    )
+    return Bot(token=BOT_TOKEN, session=session)
+
+
 def create_dispatcher() -> Dispatcher:
     """Создает и настраивает диспетчер бота."""
     dp = Dispatcher()
@@ -321,7 +372,7 @@ async def main():
     logger.info("✅ Database initialized")
     
     # Инициализация бота
-    bot = Bot(token=BOT_TOKEN)
+    bot = create_bot()
     dp = create_dispatcher()
     
     try:
@@ -29,7 +29,7 @@ from services.status_registry import (
     status_labels,
 )
 
-from keyboards import get_executor_confirmation_keyboard
+from keyboards import AcceptTaskCallback, get_executor_confirmation_keyboard
 
 logger = logging.getLogger(__name__)
 
@@ -270,7 +270,7 @@ class NotificationService:
                         inline_keyboard=[
                             [InlineKeyboardButton(
                                 text="✅ Принять в работу",
-                                callback_data=f"accept:{task_id}"
+                                callback_data=AcceptTaskCallback(task_id=task_id).pack()
                             )]
                         ]
                     )
@@ -985,3 +985,15 @@ class NotificationService:
                     if 'data' in file_info:
                         del file_info['data']
                 media_files.clear()
+
+
+# Экземпляры сервиса по ID бота: обработчики переиспользуют один объект вместо создания на каждый вызов
+_notification_services: dict[int, NotificationService] = {}
+
+
+def get_notification_service(bot: Bot) -> NotificationService:
+    """Возвращает общий NotificationService для бота (создаётся при первом обращении)."""
+    service = _notification_services.get(bot.id)
+    if service is None or service.bot is not bot:
+        service = _notification_services[bot.id] = NotificationService(bot)
+    return service
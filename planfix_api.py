@@ -10,6 +10,9 @@ import logging
 import asyncio
 import time
 import random
+import os
+import re
+import tempfile
 from datetime import datetime, timedelta
 from config import (
     PLANFIX_ACCOUNT,
@@ -22,6 +25,13 @@ from config import (
 
 logger = logging.getLogger(__name__)
 
+# Ответы Planfix (списки задач, комментарии) бывают крупными: разбираем их orjson, если он установлен
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 
 class PlanfixRateLimitError(Exception):
     """Исключение для ошибок rate limit."""
@@ -44,12 +54,30 @@ class PlanfixAPIClient:
     _min_request_interval = 1.0  # Минимум 1 секунда между запросами (согласно документации Planfix API)
     _rate_limit_lock = asyncio.Lock()
     _rate_limit_until = 0  # Timestamp до которого нужно ждать из-за rate limit
+    # AIMD-регулировка интервала: при ошибке лимита интервал между запросами увеличивается в разы,
+    # после каждого успешного ответа — понемногу возвращается к _min_request_interval
+    _adaptive_interval = 1.0
+    _max_request_interval = 8.0
+    _interval_backoff_factor = 2.0
+    _interval_recovery_step = 0.25
+    # Временные ошибки сервера (перегрузка/прокси) повторяем с экспоненциальной задержкой и джиттером —
+    # ждёт только сам запрос, без глобальной блокировки и без увеличения интервала между запросами.
+    # Только для идемпотентных запросов (GET и POST-выборки */list): запись при 504 могла уже
+    # выполниться, и повтор создал бы дубль задачи/комментария/контакта
+    _retryable_server_statuses = frozenset({502, 503, 504})
+    _server_error_backoff_cap = 30.0
     
     # Отслеживание суточного лимита запросов (согласно документации Planfix API)
     _daily_request_limit = 20000  # Суточный лимит запросов (20 000 для базового пакета)
     _daily_request_count = 0  # Счетчик запросов за текущие сутки
     _daily_reset_time = 0  # Timestamp сброса счетчика (начало следующих суток)
     _last_remaining_requests = None  # Последнее известное количество оставшихся запросов из заголовка X-RateLimit-Remaining
+
+    # Пул keep-alive соединений сессии: одно TLS-соединение переиспользуется всеми запросами клиента.
+    # Параллелизм и так ограничен семафором, поэтому пул небольшой
+    _connection_pool_limit = max(4, PLANFIX_MAX_CONCURRENCY * 2)
+    _keepalive_timeout = 60  # seconds
+    _dns_cache_ttl = 300  # seconds
     
     # Простой in-memory кэш для get_task_list
     _task_list_cache = {}
@@ -74,9 +102,17 @@ class PlanfixAPIClient:
         # Кэш контактов (для вывода контрагентов в списках)
         self._contact_cache = {}
         self._contact_cache_ttl = 600  # seconds
+        # Кэш поиска контактов по телефону: нормализованный телефон -> (contact_id, ts)
+        self._contact_phone_cache = {}
+        self._contact_phone_cache_ttl = 3600  # seconds
         # Кэш задач (для быстрого получения данных задач)
         self._task_cache = {}
-        self._task_cache_ttl = 300  # seconds
+        self._task_cache_ttl = 30  # seconds: изменения в Planfix без вебхука видны не позже чем через 30 с
+        self._task_cache_max_size = 512
+        # Запросы задач «в полёте»: одновременные вызовы с теми же аргументами ждут один ответ
+        self._task_inflight = {}
+        # Поколение задачи: растёт при invalidate_task; ответ запроса, начатого до инвалидации, в кэш не попадает
+        self._task_generation = {}
     
     async def _get_session(self):
         """Получить или создать aiohttp сессию с таймаутами."""
@@ -89,9 +125,28 @@ class PlanfixAPIClient:
                 connect=15,    # Таймаут подключения: 15 секунд
                 sock_read=30   # Таймаут чтения: 30 секунд
             )
-            self._session = aiohttp.ClientSession(timeout=timeout)
+            connector = aiohttp.TCPConnector(
+                limit=self._connection_pool_limit,
+                limit_per_host=self._connection_pool_limit,
+                keepalive_timeout=self._keepalive_timeout,
+                ttl_dns_cache=self._dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(timeout=timeout, connector=connector)
         return self._session
     
+    async def warmup(self) -> None:
+        """Заранее открыть сессию и keep-alive соединение (TCP + TLS) с Planfix.
+
+        Первый реальный запрос после старта берёт готовый сокет из пула
+        и не платит за рукопожатие. Ответ сервера не важен, ошибки не критичны.
+        """
+        try:
+            session = await self._get_session()
+            async with session.head(self.base_url, timeout=aiohttp.ClientTimeout(total=10)):
+                pass
+        except Exception as e:
+            logger.debug(f"Planfix connection warmup failed: {e}")
+
     async def close(self):
         """Закрыть сессию клиента."""
         if self._session and not self._session.closed:
@@ -133,6 +188,72 @@ class PlanfixAPIClient:
             # Игнорируем ошибки при чтении заголовков
             pass
 
+    @staticmethod
+    def _rate_limit_wait_time(response, response_text) -> float | None:
+        """Возвращает время ожидания (с), если ответ — ошибка лимита запросов, иначе None.
+
+        Planfix сообщает о лимите ответом 403 с code=22 и timeToReset; 429 с Retry-After тоже учитываем.
+        """
+        if response.status == 429:
+            try:
+                return float(response.headers.get('Retry-After')) + 1
+            except (TypeError, ValueError):
+                return 60.0
+        if response.status != 403:
+            return None
+        try:
+            error_json = json.loads(response_text)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(error_json, dict) or error_json.get('code') != 22:
+            return None
+        time_to_reset = error_json.get('timeToReset')
+        if time_to_reset:
+            # timeToReset может быть в миллисекундах или секундах
+            # Если больше 1000, значит в миллисекундах
+            if time_to_reset > 1000:
+                return (time_to_reset / 1000) + 15  # +15 секунд для безопасности
+            return time_to_reset + 15  # +15 секунд для безопасности
+        return 120  # 120 секунд по умолчанию (увеличено с 90)
+
+    @staticmethod
+    def _is_idempotent(method: str, endpoint: str) -> bool:
+        """Можно ли безопасно повторить запрос: GET или POST-выборка (эндпоинты */list)."""
+        return method == "GET" or endpoint.rstrip("/").endswith("/list")
+
+    @staticmethod
+    def _server_error_wait_time(response, retry_count: int, max_retries: int) -> float | None:
+        """Задержка перед повтором идемпотентного запроса после 502/503/504, иначе None.
+
+        Ждёт только сам запрос: глобальную блокировку лимита и интервал между запросами 5xx не трогает.
+        """
+        if response.status not in PlanfixAPIClient._retryable_server_statuses or retry_count >= max_retries:
+            return None
+        return min(PlanfixAPIClient._server_error_backoff_cap, 2 ** retry_count) + random.uniform(0, 1)
+
+    async def _register_rate_limit_hit(self, wait_time: float):
+        """Устанавливает глобальную блокировку и увеличивает интервал между запросами (multiplicative decrease)."""
+        async with self._rate_limit_lock:
+            # Не сокращаем уже действующую (более длинную) блокировку, выставленную другим запросом
+            PlanfixAPIClient._rate_limit_until = max(PlanfixAPIClient._rate_limit_until, time.time() + wait_time)
+            PlanfixAPIClient._adaptive_interval = min(
+                PlanfixAPIClient._adaptive_interval * PlanfixAPIClient._interval_backoff_factor,
+                PlanfixAPIClient._max_request_interval,
+            )
+        logger.warning(
+            f"⚠️ Rate limit exceeded, установлена глобальная блокировка на {wait_time:.1f}s, "
+            f"интервал между запросами: {PlanfixAPIClient._adaptive_interval:.2f}s"
+        )
+
+    @staticmethod
+    def _register_request_success():
+        """После успешного ответа понемногу возвращает интервал к минимальному (additive increase)."""
+        if PlanfixAPIClient._adaptive_interval > PlanfixAPIClient._min_request_interval:
+            PlanfixAPIClient._adaptive_interval = max(
+                PlanfixAPIClient._min_request_interval,
+                PlanfixAPIClient._adaptive_interval - PlanfixAPIClient._interval_recovery_step,
+            )
+
     # Вспомогательная функция: удаляет символы вне BMP (например, emoji),
     # которые некоторые JSON-десериализаторы не принимают
     def _sanitize_text(self, value: str | None) -> str | None:
@@ -145,9 +266,16 @@ class PlanfixAPIClient:
         except Exception:
             return value
 
-    async def _request(self, method, endpoint, data=None, params=None, headers=None, retry_count=0, max_retries=3):
-        """Базовый метод для выполнения HTTP запросов к API с управлением rate limit."""
+    async def _request(
+        self, method, endpoint, data=None, params=None, headers=None, retry_count=0, max_retries=3, idempotent=None
+    ):
+        """Базовый метод для выполнения HTTP запросов к API с управлением rate limit.
+
+        idempotent — разрешить повтор при 502/503/504; по умолчанию только для GET и POST */list.
+        """
         url = f"{self.base_url}{endpoint}"
+        if idempotent is None:
+            idempotent = self._is_idempotent(method, endpoint)
         _headers = self.headers.copy()
         if headers:
             _headers.update(headers)
@@ -180,8 +308,8 @@ class PlanfixAPIClient:
                     current_time = time.time()
                     time_since_last = current_time - PlanfixAPIClient._last_request_time
                     jitter_seconds = random.uniform(0.05, 0.25)
-                    if time_since_last < self._min_request_interval:
-                        base_wait = self._min_request_interval - time_since_last
+                    if time_since_last < PlanfixAPIClient._adaptive_interval:
+                        base_wait = PlanfixAPIClient._adaptive_interval - time_since_last
                         wait_time = base_wait + jitter_seconds
                         logger.debug(f"Rate limiting: waiting {wait_time:.2f}s (base {base_wait:.2f}s + jitter {jitter_seconds:.2f}s) before request to {endpoint}")
                         await asyncio.sleep(wait_time)
@@ -194,6 +322,7 @@ class PlanfixAPIClient:
 
             session = await self._get_session()
             response = None
+            rate_limit_wait = server_error_wait = None
             try:
                 # Обновляем счетчик суточных запросов и проверяем лимит
                 async with self._rate_limit_lock:
@@ -243,43 +372,13 @@ class PlanfixAPIClient:
                         await self._check_rate_limit_headers(response)
                         
                         response_text = await response.text()
-                        if response.status == 403:
-                            try:
-                                error_json = json.loads(response_text)
-                                if error_json.get('code') == 22:  # Rate limit error
-                                    time_to_reset = error_json.get('timeToReset')
-                                    if time_to_reset:
-                                        # timeToReset может быть в миллисекундах или секундах
-                                        # Если больше 1000, значит в миллисекундах
-                                        if time_to_reset > 1000:
-                                            wait_time = (time_to_reset / 1000) + 15  # +15 секунд для безопасности
-                                        else:
-                                            wait_time = time_to_reset + 15  # +15 секунд для безопасности
-                                    else:
-                                        wait_time = 120  # 120 секунд по умолчанию (увеличено с 90)
-                                    
-                                    # Устанавливаем глобальную блокировку
-                                    async with self._rate_limit_lock:
-                                        PlanfixAPIClient._rate_limit_until = time.time() + wait_time
-                                    
-                                    logger.warning(f"⚠️ Rate limit exceeded (code 22), установлена глобальная блокировка на {wait_time:.1f}s")
-                                    
-                                    # Если не превышен лимит попыток, ждем и повторяем запрос
-                                    if retry_count < max_retries:
-                                        logger.info(f"⏳ Waiting {wait_time:.1f}s and retrying request to {endpoint} (attempt {retry_count + 1}/{max_retries})")
-                                        await asyncio.sleep(wait_time)
-                                        # Рекурсивный вызов проверит rate limit автоматически
-                                        return await self._request(method, endpoint, data, params, headers, retry_count + 1, max_retries)
-                                    else:
-                                        # Превышен лимит попыток - выбрасываем исключение
-                                        raise PlanfixRateLimitError(
-                                            wait_seconds=int(wait_time),
-                                            message=f"Rate limit exceeded after {max_retries} retries, please wait {int(wait_time)} seconds"
-                                        )
-                            except json.JSONDecodeError:
-                                pass
-                        response.raise_for_status()
-                        return json.loads(response_text) if response_text else {}
+                        rate_limit_wait = self._rate_limit_wait_time(response, response_text)
+                        if rate_limit_wait is None and idempotent:
+                            server_error_wait = self._server_error_wait_time(response, retry_count, max_retries)
+                        if rate_limit_wait is None and server_error_wait is None:
+                            response.raise_for_status()
+                            self._register_request_success()
+                            return _json_loads(response_text) if response_text else {}
                 elif method == "POST":
                     # Логируем данные запроса для отладки
                     if data:
@@ -301,46 +400,18 @@ class PlanfixAPIClient:
                         logger.debug(f"Response status: {response.status}")
                         logger.debug(f"Response body: {response_text}")
                         
-                        if response.status == 403:
-                            try:
-                                error_json = json.loads(response_text)
-                                if error_json.get('code') == 22:  # Rate limit error
-                                    time_to_reset = error_json.get('timeToReset')
-                                    if time_to_reset:
-                                        # timeToReset может быть в миллисекундах или секундах
-                                        # Если больше 1000, значит в миллисекундах
-                                        if time_to_reset > 1000:
-                                            wait_time = (time_to_reset / 1000) + 15  # +15 секунд для безопасности
-                                        else:
-                                            wait_time = time_to_reset + 15  # +15 секунд для безопасности
-                                    else:
-                                        wait_time = 120  # 120 секунд по умолчанию (увеличено с 90)
-                                    
-                                    # Устанавливаем глобальную блокировку
-                                    async with self._rate_limit_lock:
-                                        PlanfixAPIClient._rate_limit_until = time.time() + wait_time
-                                    
-                                    logger.warning(f"⚠️ Rate limit exceeded (code 22), установлена глобальная блокировка на {wait_time:.1f}s")
-                                    
-                                    # Если не превышен лимит попыток, ждем и повторяем запрос
-                                    if retry_count < max_retries:
-                                        logger.info(f"⏳ Waiting {wait_time:.1f}s and retrying request to {endpoint} (attempt {retry_count + 1}/{max_retries})")
-                                        await asyncio.sleep(wait_time)
-                                        # Рекурсивный вызов проверит rate limit автоматически
-                                        return await self._request(method, endpoint, data, params, headers, retry_count + 1, max_retries)
-                                    else:
-                                        # Превышен лимит попыток - выбрасываем исключение
-                                        raise PlanfixRateLimitError(
-                                            wait_seconds=int(wait_time),
-                                            message=f"Rate limit exceeded after {max_retries} retries, please wait {int(wait_time)} seconds"
-                                        )
-                            except json.JSONDecodeError:
-                                pass
-                        
-                        response.raise_for_status()
-                        return json.loads(response_text) if response_text else {}
+                        rate_limit_wait = self._rate_limit_wait_time(response, response_text)
+                        if rate_limit_wait is None and idempotent:
+                            server_error_wait = self._server_error_wait_time(response, retry_count, max_retries)
+                        if rate_limit_wait is None and server_error_wait is None:
+                            response.raise_for_status()
+                            self._register_request_success()
+                            return _json_loads(response_text) if response_text else {}
                 else:
                     raise ValueError(f"Unsupported HTTP method: {method}")
+                # Сюда попадаем только при ошибке лимита запросов или временной ошибке сервера
+                if rate_limit_wait is not None:
+                    await self._register_rate_limit_hit(rate_limit_wait)
             except PlanfixRateLimitError:
                 # Пробрасываем исключение rate limit дальше
                 raise
@@ -381,6 +452,27 @@ class PlanfixAPIClient:
                 logger.error(f"An unexpected error occurred during Planfix API request: {e}")
                 raise
 
+        # Повтор после ошибки лимита/5xx — уже вне семафора: иначе, если лимит сработает у всех слотов сразу,
+        # повторные запросы ждали бы свободный слот бесконечно. Повтор сам дождётся снятия глобальной блокировки
+        if server_error_wait is not None:
+            logger.warning(
+                f"⏳ Planfix API server error for {method} {endpoint}, retrying in {server_error_wait:.1f}s "
+                f"(attempt {retry_count + 1}/{max_retries})"
+            )
+            await asyncio.sleep(server_error_wait)
+            return await self._request(
+                method, endpoint, data, params, headers, retry_count + 1, max_retries, idempotent=idempotent
+            )
+        if retry_count < max_retries:
+            logger.info(f"⏳ Waiting {rate_limit_wait:.1f}s and retrying request to {endpoint} (attempt {retry_count + 1}/{max_retries})")
+            return await self._request(
+                method, endpoint, data, params, headers, retry_count + 1, max_retries, idempotent=idempotent
+            )
+        raise PlanfixRateLimitError(
+            wait_seconds=int(rate_limit_wait),
+            message=f"Rate limit exceeded after {max_retries} retries, please wait {int(rate_limit_wait)} seconds"
+        )
+
     # ============================================================================
     # PROCESS & STATUSES
     # ============================================================================
@@ -550,6 +642,53 @@ class PlanfixAPIClient:
             logger.error(f"Failed to get contact {contact_id}: {e}")
             return {}
     
+    @staticmethod
+    def _phone_cache_key(phone):
+        """Ключ кэша телефона: последние 10 цифр (8XXX... и +7XXX... дают один ключ)."""
+        digits = re.sub(r"\D", "", str(phone or ""))
+        return digits[-10:] if len(digits) >= 10 else (digits or None)
+
+    def remember_contact_phone(self, phone, contact_id):
+        """Запоминает соответствие телефон -> контакт (например, сразу после создания контакта)."""
+        key = self._phone_cache_key(phone)
+        if key and contact_id:
+            self._contact_phone_cache[key] = (contact_id, time.time())
+
+    async def find_contact_by_phone(self, phone, group_id=None):
+        """Ищет контакт по телефону (фильтр 4003), при group_id — только в этой группе.
+
+        Найденные контакты кэшируются на час; промахи не кэшируются, чтобы новый контакт
+        находился сразу после создания. Возвращает ID контакта или None.
+        """
+        key = self._phone_cache_key(phone)
+        if not key:
+            return None
+        cache_rec = self._contact_phone_cache.get(key)
+        if cache_rec and time.time() - cache_rec[1] < self._contact_phone_cache_ttl:
+            return cache_rec[0]
+
+        filters = [{"type": 4003, "operator": "equal", "value": key}]
+        if group_id:
+            filters.append({"type": 4008, "operator": "equal", "value": int(group_id)})
+        data = {"filters": filters, "fields": "id,name,phones", "offset": 0, "pageSize": 1}
+        try:
+            response = await self._request("POST", "/contact/list", data=data)
+        except Exception as e:
+            logger.warning(f"Failed to search contact by phone: {e}")
+            return None
+        contacts = (response or {}).get("contacts") or []
+        if not contacts:
+            return None
+        contact_id = contacts[0].get("id")
+        if isinstance(contact_id, str):
+            contact_id = contact_id.rpartition(":")[2]
+        try:
+            contact_id = int(contact_id)
+        except (TypeError, ValueError):
+            return None
+        self.remember_contact_phone(phone, contact_id)
+        return contact_id
+
     async def get_contact_templates(self, fields: str = "id,name"):
         """
         Получает список шаблонов контактов.
@@ -803,6 +942,8 @@ class PlanfixAPIClient:
         endpoint = f"/task/{task_id}"
         
         # Получаем текущие данные задачи, чтобы не потерять существующие поля
+        # (кэш сбрасываем: объединять нужно с актуальным состоянием, а не с копией до 5 минут давности)
+        self.invalidate_task(task_id)
         try:
             current_task = await self.get_task_by_id(
                 task_id, 
@@ -1104,6 +1245,7 @@ class PlanfixAPIClient:
         # #endregion
         
         response = await self._request("POST", endpoint, data=data)
+        self.invalidate_task(task_id)
         
         # #region agent log
         try:
@@ -1151,18 +1293,62 @@ class PlanfixAPIClient:
         except Exception:
             pass
 
+        inflight = self._task_inflight.get(cache_key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
         endpoint = f"/task/{task_id}"
         params = {"fields": fields}
+        future = asyncio.get_running_loop().create_future()
+        self._task_inflight[cache_key] = future
+        generation = self._task_generation.get(task_id, 0)
+        data = {}
         try:
             data = await self._request("GET", endpoint, params=params)
-            try:
-                self._task_cache[cache_key] = {"data": data, "ts": time.time()}
-            except Exception:
-                pass
-            return data
+            # Задачу изменили, пока шёл запрос: ответ может быть устаревшим, не кэшируем его
+            if self._task_generation.get(task_id, 0) == generation:
+                try:
+                    self._store_task_cache(cache_key, data)
+                except Exception:
+                    pass
         except Exception as e:
             logger.error(f"Failed to get task {task_id}: {e}")
-            return {}
+            data = {}
+        finally:
+            # Запись могла быть уже снята invalidate_task и заменена новым запросом
+            if self._task_inflight.get(cache_key) is future:
+                self._task_inflight.pop(cache_key, None)
+            if not future.done():
+                future.set_result(data)
+        return data
+
+    def _store_task_cache(self, cache_key, data):
+        """Сохраняет задачу в кэш, не давая ему расти больше _task_cache_max_size записей."""
+        now = time.time()
+        if len(self._task_cache) >= self._task_cache_max_size:
+            expired = [k for k, rec in self._task_cache.items() if now - rec.get("ts", 0) >= self._task_cache_ttl]
+            for k in expired:
+                self._task_cache.pop(k, None)
+            if len(self._task_cache) >= self._task_cache_max_size:
+                oldest = min(self._task_cache, key=lambda k: self._task_cache[k].get("ts", 0))
+                self._task_cache.pop(oldest, None)
+        self._task_cache[cache_key] = {"data": data, "ts": now}
+
+    def invalidate_task(self, task_id) -> None:
+        """Удаляет из кэша все закэшированные варианты задачи (после её изменения).
+
+        Запросы задачи, уже начатые к этому моменту, не попадут в кэш, а новые вызовы
+        get_task_by_id не будут к ним присоединяться.
+        """
+        try:
+            task_id = int(task_id)
+        except (TypeError, ValueError):
+            return
+        self._task_generation[task_id] = self._task_generation.get(task_id, 0) + 1
+        for key in [k for k in self._task_cache if k[0] == task_id]:
+            self._task_cache.pop(key, None)
+        for key in [k for k in self._task_inflight if k[0] == task_id]:
+            self._task_inflight.pop(key, None)
 
     # ============================================================================
     # COMMENTS
@@ -1296,6 +1482,49 @@ class PlanfixAPIClient:
             logger.error(f"Error downloading file {file_id}: {e}", exc_info=True)
             return None
     
+    async def iter_file_chunks(self, file_id: int, chunk_size: int = 64 * 1024, max_size: int | None = None):
+        """
+        Потоково скачивает файл из Planfix, отдавая его чанками (без буферизации файла целиком).
+
+        Args:
+            file_id: ID файла в Planfix
+            chunk_size: Размер чанка в байтах
+            max_size: Максимальный размер файла; при превышении выбрасывается ValueError
+
+        Yields:
+            bytes: Очередной чанк содержимого файла
+        """
+        session = await self._get_session()
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        file_timeout = aiohttp.ClientTimeout(total=120, connect=15, sock_read=90)
+        # Те же источники, что и в download_file: REST endpoint (с редиректом), затем прямой URL
+        urls = (
+            f"{self.base_url}/file/{file_id}/download",
+            f"{self.base_url.replace('/rest', '')}/?action=getfile&uniqueid={file_id}",
+        )
+        for url in urls:
+            try:
+                response = await session.get(url, headers=headers, allow_redirects=True, timeout=file_timeout)
+            except Exception as e:
+                logger.debug(f"Failed to open stream for file {file_id} via {url}: {e}")
+                continue
+            async with response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.debug(f"File {file_id} stream via {url} returned {response.status}: {error_text[:200]}")
+                    continue
+                if max_size and response.content_length and response.content_length > max_size:
+                    raise ValueError(f"File {file_id} is too large ({response.content_length} bytes)")
+                received = 0
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    received += len(chunk)
+                    if max_size and received > max_size:
+                        raise ValueError(f"File {file_id} is too large (> {max_size} bytes)")
+                    yield chunk
+                logger.info(f"Streamed file {file_id}, size: {received} bytes")
+                return
+        raise RuntimeError(f"Failed to download file {file_id}")
+
     async def get_file_info(self, file_id: int) -> dict | None:
         """
         Получает информацию о файле из Planfix.
@@ -1316,8 +1545,28 @@ class PlanfixAPIClient:
             logger.error(f"Error getting file info for {file_id}: {e}")
             return None
 
+    def upload_buffer(self):
+        """Временный файл на диске для содержимого перед upload_file (вместо буфера в памяти)."""
+        return tempfile.TemporaryFile()
+
+    @staticmethod
+    def _upload_payload(file_data):
+        """Данные для формы загрузки: для файла на диске — отдельный дескриптор (os.dup),
+        который aiohttp может закрыть после отправки, не закрывая файл вызывающего кода."""
+        if not hasattr(file_data, 'seek'):
+            return file_data
+        file_data.seek(0)
+        try:
+            return open(os.dup(file_data.fileno()), 'rb')
+        except (OSError, ValueError):
+            return file_data
+
     async def upload_file(self, file_data, filename, retry_count=0, max_retries=3):
-        """Загружает файл в Planfix с обработкой rate limit."""
+        """Загружает файл в Planfix с обработкой rate limit.
+
+        file_data — bytes или файловый объект (например, из upload_buffer); файловый объект
+        передаётся aiohttp потоково, частями, без копирования всего содержимого в память.
+        """
         endpoint = "/file/"
         url = f"{self.base_url}{endpoint}"
         
@@ -1344,8 +1593,8 @@ class PlanfixAPIClient:
                     current_time = time.time()
                     time_since_last = current_time - PlanfixAPIClient._last_request_time
                     jitter_seconds = random.uniform(0.05, 0.25)
-                    if time_since_last < self._min_request_interval:
-                        base_wait = self._min_request_interval - time_since_last
+                    if time_since_last < PlanfixAPIClient._adaptive_interval:
+                        base_wait = PlanfixAPIClient._adaptive_interval - time_since_last
                         wait_time = base_wait + jitter_seconds
                         await asyncio.sleep(wait_time)
                     else:
@@ -1395,8 +1644,10 @@ class PlanfixAPIClient:
                     remaining = PlanfixAPIClient._daily_request_limit - PlanfixAPIClient._daily_request_count
                     logger.warning(f"⚠️ Приближение к суточному лимиту: использовано {PlanfixAPIClient._daily_request_count}/{PlanfixAPIClient._daily_request_limit}, осталось: {remaining} запросов")
 
+            # Каждая попытка (в том числе повтор после ошибки лимита) отправляет файл с начала
+            upload_data = self._upload_payload(file_data)
             form = aiohttp.FormData()
-            form.add_field('file', file_data, filename=filename, content_type='application/octet-stream')
+            form.add_field('file', upload_data, filename=filename, content_type='application/octet-stream')
 
             session = await self._get_session()
             try:
@@ -1410,45 +1661,14 @@ class PlanfixAPIClient:
                     
                     response_text = await response.text()
                     
-                    # Обрабатываем rate limit ошибки
-                    if response.status == 403:
-                        try:
-                            error_json = json.loads(response_text)
-                            if error_json.get('code') == 22:  # Rate limit error
-                                time_to_reset = error_json.get('timeToReset')
-                                if time_to_reset:
-                                    # timeToReset может быть в миллисекундах или секундах
-                                    # Если больше 1000, значит в миллисекундах
-                                    if time_to_reset > 1000:
-                                        wait_time = (time_to_reset / 1000) + 15  # +15 секунд для безопасности
-                                    else:
-                                        wait_time = time_to_reset + 15  # +15 секунд для безопасности
-                                else:
-                                    wait_time = 120  # 120 секунд по умолчанию (увеличено с 90)
-                                
-                                # Устанавливаем глобальную блокировку
-                                async with self._rate_limit_lock:
-                                    PlanfixAPIClient._rate_limit_until = time.time() + wait_time
-                                
-                                logger.warning(f"⚠️ Rate limit exceeded during file upload (code 22), установлена глобальная блокировка на {wait_time:.1f}s")
-                                
-                                # Если не превышен лимит попыток, ждем и повторяем запрос
-                                if retry_count < max_retries:
-                                    logger.info(f"⏳ Waiting {wait_time:.1f}s and retrying file upload (attempt {retry_count + 1}/{max_retries})")
-                                    await asyncio.sleep(wait_time)
-                                    # Рекурсивный вызов проверит rate limit автоматически
-                                    return await self.upload_file(file_data, filename, retry_count + 1, max_retries)
-                                else:
-                                    # Превышен лимит попыток - выбрасываем исключение
-                                    raise PlanfixRateLimitError(
-                                        wait_seconds=int(wait_time),
-                                        message=f"Rate limit exceeded after {max_retries} retries during file upload, please wait {int(wait_time)} seconds"
-                                    )
-                        except json.JSONDecodeError:
-                            pass
-                    
-                    response.raise_for_status()
-                    return json.loads(response_text) if response_text else {}
+                    # Обрабатываем rate limit ошибки; 5xx не повторяем — файл мог уже загрузиться
+                    rate_limit_wait = self._rate_limit_wait_time(response, response_text)
+                    if rate_limit_wait is None:
+                        response.raise_for_status()
+                        self._register_request_success()
+                        return _json_loads(response_text) if response_text else {}
+                # Сюда попадаем только при ошибке лимита запросов
+                await self._register_rate_limit_hit(rate_limit_wait)
             except PlanfixRateLimitError:
                 # Пробрасываем исключение rate limit дальше
                 raise
@@ -1466,6 +1686,18 @@ class PlanfixAPIClient:
             except Exception as e:
                 logger.error(f"An unexpected error occurred during Planfix file upload: {e}")
                 raise
+            finally:
+                if upload_data is not file_data:
+                    upload_data.close()
+
+        # Повтор после ошибки лимита — вне семафора (см. _request)
+        if retry_count < max_retries:
+            logger.info(f"⏳ Waiting {rate_limit_wait:.1f}s and retrying file upload (attempt {retry_count + 1}/{max_retries})")
+            return await self.upload_file(file_data, filename, retry_count + 1, max_retries)
+        raise PlanfixRateLimitError(
+            wait_seconds=int(rate_limit_wait),
+            message=f"Rate limit exceeded after {max_retries} retries during file upload, please wait {int(rate_limit_wait)} seconds"
+        )
 
     # ============================================================================
     # PROJECTS
@@ -329,22 +329,25 @@ class PlanfixPollingService:
             try:
                 from database import TaskAssignment
                 with self.db_manager.get_db() as db:
-                    active_assignments = db.query(TaskAssignment).filter(
-                        TaskAssignment.status == "active"
-                    ).all()
-                for a in active_assignments:
+                    # Нужен только task_id — не загружаем ORM-объекты целиком
+                    active_task_ids = [
+                        tid for (tid,) in db.query(TaskAssignment.task_id).filter(
+                            TaskAssignment.status == "active"
+                        ).distinct().all()
+                    ]
+                for task_id in active_task_ids:
                     # Фильтруем только задачи, созданные через бота
-                    if bot_created_task_ids and a.task_id not in bot_created_task_ids:
-                        logger.debug(f"Skipping task {a.task_id} in check_task_updates - not created by bot")
+                    if bot_created_task_ids and task_id not in bot_created_task_ids:
+                        logger.debug(f"Skipping task {task_id} in check_task_updates - not created by bot")
                         continue
                     
-                    if a.task_id not in self.tracked_tasks:
-                        self.tracked_tasks[a.task_id] = {
+                    if task_id not in self.tracked_tasks:
+                        self.tracked_tasks[task_id] = {
                             "status_id": None,
                             "last_update": datetime.now()
                         }
-                    if a.task_id not in self.tracked_comments:
-                        self.tracked_comments[a.task_id] = {
+                    if task_id not in self.tracked_comments:
+                        self.tracked_comments[task_id] = {
                             "last_comment_id": None,
                             "last_comment_time": None
                         }
@@ -615,52 +618,53 @@ class PlanfixPollingService:
             try:
                 from database import TaskAssignment
                 with self.db_manager.get_db() as db:
-                    active_assignments = db.query(TaskAssignment).filter(
-                        TaskAssignment.status == "active"
-                    ).all()
+                    active_task_ids = [
+                        tid for (tid,) in db.query(TaskAssignment.task_id).filter(
+                            TaskAssignment.status == "active"
+                        ).distinct().all()
+                    ]
             except Exception as e:
-                active_assignments = []
+                active_task_ids = []
                 logger.error(f"Failed to load active assignments: {e}")
 
-            for a in active_assignments:
+            for task_id in active_task_ids:
                 # Фильтруем только задачи, созданные через бота
-                if bot_created_task_ids and a.task_id not in bot_created_task_ids:
-                    logger.debug(f"Skipping task {a.task_id} - not created by bot")
+                if bot_created_task_ids and task_id not in bot_created_task_ids:
+                    logger.debug(f"Skipping task {task_id} - not created by bot")
                     continue
                 # Добавляем в tracked_tasks
-                self.tracked_tasks.setdefault(a.task_id, {
+                self.tracked_tasks.setdefault(task_id, {
                     'status_id': None,
                     'last_update': datetime.now()
                 })
                 # Инициализируем last_comment_id по последнему комментарию, чтобы не слать историю
                 try:
                     cr = await self.planfix_client.get_task_comments(
-                        a.task_id,
+                        task_id,
                         fields="id,dateTime",
                         page_size=5
                     )
                     if cr and cr.get('result') == 'success':
                         comments = cr.get('comments', []) or []
                         if comments:
-                            # Сортируем по дате (новые первыми)
+                            # Нужен только самый новый комментарий — один проход max() вместо сортировки
                             def _k(c):
                                 dt = c.get('dateTime', '')
                                 if isinstance(dt, dict):
                                     return str(dt.get('value', '')) if 'value' in dt else ''
                                 return str(dt) if dt else ''
-                            comments.sort(key=_k, reverse=True)
-                            latest = comments[0]
-                            self.tracked_comments[a.task_id] = {
+                            latest = max(comments, key=_k)
+                            self.tracked_comments[task_id] = {
                                 'last_comment_id': latest.get('id'),
                                 'last_comment_time': latest.get('dateTime')
                             }
                         else:
-                            self.tracked_comments.setdefault(a.task_id, {
+                            self.tracked_comments.setdefault(task_id, {
                                 'last_comment_id': None,
                                 'last_comment_time': None
                             })
                 except Exception as ce:
-                    logger.error(f"Init comments tracking failed for task {a.task_id}: {ce}")
+                    logger.error(f"Init comments tracking failed for task {task_id}: {ce}")
 
             logger.info(f"Tracked tasks initialized: {len(self.tracked_tasks)} tasks")
             # Инициализируем задачи регистрации как и ра��ьше
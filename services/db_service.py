@@ -1,9 +1,21 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 from typing import Any, Callable
 
-from db_manager import DBManager
+from db_manager import (
+    DBManager,
+    cache_executor_profile,
+    executor_profile_generation,
+    get_cached_executor_profile,
+)
+
+logger = logging.getLogger(__name__)
+
+# Пакетная запись назначений: до _ASSIGNMENT_BATCH_SIZE строк или _ASSIGNMENT_BATCH_DELAY секунд на один commit
+_ASSIGNMENT_BATCH_SIZE = 100
+_ASSIGNMENT_BATCH_DELAY = 0.05
 
 
 class AsyncDBManager:
@@ -13,6 +25,8 @@ class AsyncDBManager:
 
     def __init__(self, manager: DBManager | None = None):
         self._manager = manager or DBManager()
+        self._assignment_queue: asyncio.Queue | None = None
+        self._assignment_writer: asyncio.Task | None = None
 
     def __getattr__(self, name: str) -> Any:
         attr = getattr(self._manager, name)
@@ -24,6 +38,72 @@ class AsyncDBManager:
 
         return async_wrapper
 
+    async def get_executor_profile(self, telegram_id: int) -> Any:
+        """Профиль исполнителя с кэшем в памяти (сбрасывается при изменении профиля через DBManager)."""
+        found, executor = get_cached_executor_profile(telegram_id)
+        if found:
+            return executor
+        generation = executor_profile_generation(telegram_id)
+        executor = await asyncio.to_thread(
+            self._call_with_session, self._manager.get_executor_profile, (telegram_id,), {}
+        )
+        cache_executor_profile(telegram_id, executor, generation)
+        return executor
+
+    async def create_task_assignment_if_absent(
+        self, task_id: int, executor_telegram_id: int, planfix_user_id: str | None = None
+    ) -> bool:
+        """Ставит назначение в очередь фонового писателя и ждёт результат (True — назначение создано)."""
+        if self._assignment_writer is None or self._assignment_writer.done():
+            self._assignment_queue = asyncio.Queue()
+            self._assignment_writer = asyncio.create_task(self._write_assignments())
+        future = asyncio.get_running_loop().create_future()
+        await self._assignment_queue.put(((task_id, executor_telegram_id, planfix_user_id), future))
+        return await future
+
+    async def _write_assignments(self) -> None:
+        """Фоновый писатель: собирает назначения из очереди и сохраняет их пачками одним commit."""
+        queue = self._assignment_queue
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + _ASSIGNMENT_BATCH_DELAY
+            while len(batch) < _ASSIGNMENT_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            rows = [row for row, _ in batch]
+            try:
+                results = await asyncio.to_thread(
+                    self._call_with_session, self._manager.create_task_assignments_if_absent, (rows,), {}
+                )
+                outcomes = list(zip((future for _, future in batch), results, strict=True))
+            except Exception as e:
+                # Одна ошибочная строка не должна ронять все принятия задач из пачки — пишем по одной
+                logger.warning(f"Batch write of {len(rows)} task assignments failed, retrying row by row: {e}")
+                outcomes = [(future, await self._write_assignment_row(row)) for row, future in batch]
+            for future, created in outcomes:
+                if future.done():
+                    continue
+                if isinstance(created, Exception):
+                    future.set_exception(created)
+                else:
+                    future.set_result(created)
+
+    async def _write_assignment_row(self, row: tuple) -> bool | Exception:
+        """Записывает одно назначение; ошибку возвращает (а не выбрасывает), чтобы передать её ожидающему."""
+        try:
+            return await asyncio.to_thread(
+                self._call_with_session, self._manager.create_task_assignment_if_absent, row, {}
+            )
+        except Exception as e:
+            logger.error(f"Failed to write task assignment {row}: {e}", exc_info=True)
+            return e
+
     async def run(self, func: Callable, *args, **kwargs) -> Any:
         """Выполнить произвольную функцию с сессией БД в пуле потоков."""
         return await asyncio.to_thread(self._call_with_session, func, args, kwargs)
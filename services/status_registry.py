@@ -96,6 +96,8 @@ class PlanfixStatusRegistry:
     def __init__(self) -> None:
         self._ids: Dict[StatusKey, Optional[int]] = {}
         self._lock = asyncio.Lock()
+        # Кэш словарей «ID статуса -> подпись», сбрасывается при каждой перезагрузке ID
+        self._labels_cache: Dict[tuple[tuple[StatusKey, str], ...], Dict[int, str]] = {}
 
     async def ensure_loaded(self, force_refresh: bool = False) -> None:
         """
@@ -110,6 +112,7 @@ class PlanfixStatusRegistry:
             if env_mapping and not force_refresh:
                 logger.info("Using Planfix status IDs from environment variables")
                 self._ids = env_mapping
+                self._labels_cache.clear()
                 return
 
             # 2. Попробуем загрузить из локальной базы
@@ -134,6 +137,7 @@ class PlanfixStatusRegistry:
                     )
 
             self._ids = mapping
+            self._labels_cache.clear()
             optional_missing = {
                 key for key in StatusKey if key not in self._required_statuses and not mapping.get(key)
             }
@@ -302,6 +306,18 @@ class PlanfixStatusRegistry:
             raise KeyError(f"Planfix status '{key.value}' is not available")
         return value
 
+    def get_labels(self, pairs: tuple[tuple[StatusKey, str], ...]) -> Dict[int, str]:
+        """Возвращает (общий, не изменяемый вызывающим кодом) словарь «ID статуса -> подпись» для набора пар."""
+        labels = self._labels_cache.get(pairs)
+        if labels is None:
+            labels = {}
+            for key, label in pairs:
+                value = self.get_id(key, required=False)
+                if value is not None:
+                    labels[value] = label
+            self._labels_cache[pairs] = labels
+        return labels
+
     def get_mapping(self) -> Dict[StatusKey, Optional[int]]:
         if not self._ids:
             raise RuntimeError(
@@ -330,10 +346,9 @@ def resolve_status_id(key: StatusKey, *, required: bool = True) -> Optional[int]
 
 
 def require_status_id(key: StatusKey) -> int:
-    value = get_status_id(key, required=True)
-    if value is None:
-        raise RuntimeError(f"Planfix status '{key.value}' is not configured")
-    return value
+    # get_id(required=True) сам бросает исключение, если статус не найден; результат — один поиск в dict.
+    # Кэшировать ID на уровне модуля нельзя: реестр загружается при старте и может быть перезагружен.
+    return status_registry.get_id(key, required=True)
 
 
 def collect_status_ids(keys: Iterable[StatusKey], *, required: bool = False) -> list[int]:
@@ -346,12 +361,7 @@ def collect_status_ids(keys: Iterable[StatusKey], *, required: bool = False) ->
 
 
 def status_labels(pairs: Iterable[tuple[StatusKey, str]]) -> dict[int, str]:
-    labels: dict[int, str] = {}
-    for key, label in pairs:
-        value = get_status_id(key, required=False)
-        if value is not None:
-            labels[value] = label
-    return labels
+    return status_registry.get_labels(tuple(pairs))
 
 
 def is_status(value: Optional[int], key: StatusKey) -> bool:
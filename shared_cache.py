@@ -31,6 +31,10 @@ class TTLCache:
         exp = (time.time() + ttl_seconds) if ttl_seconds else None
         self._store[key] = (value, exp)
 
+    def pop(self, key: str, default: Any = None) -> Any:
+        item = self._store.pop(key, None)
+        return item[0] if item else default
+
 
 # Глобальный экземпляр кэша, импортируемый из других модулей
 cache = TTLCache()
@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+
+import pytest
+
+from db_manager import get_cached_executor_profile, invalidate_executor_profile_cache
+from services.db_service import AsyncDBManager
+
+
+class FakeAssignmentsManager:
+    """Заглушка DBManager: пакетная запись ведёт себя как задано, построчная падает на bad_task_ids."""
+
+    def __init__(self, batch_result=None, batch_error=None, bad_task_ids=()):
+        self.batch_result = batch_result
+        self.batch_error = batch_error
+        self.bad_task_ids = set(bad_task_ids)
+        self.batch_calls = []
+        self.row_calls = []
+
+    @contextlib.contextmanager
+    def get_db(self):
+        yield None
+
+    def create_task_assignments_if_absent(self, db, rows):
+        self.batch_calls.append(list(rows))
+        if self.batch_error is not None:
+            raise self.batch_error
+        if self.batch_result is not None:
+            return self.batch_result
+        return [True] * len(rows)
+
+    def create_task_assignment_if_absent(self, db, task_id, executor_telegram_id, planfix_user_id=None):
+        self.row_calls.append(task_id)
+        if task_id in self.bad_task_ids:
+            raise ValueError(f"bad row {task_id}")
+        return True
+
+
+def _accept_concurrently(manager, task_ids):
+    async def run():
+        db = AsyncDBManager(manager)
+        calls = [db.create_task_assignment_if_absent(task_id, 100 + task_id, None) for task_id in task_ids]
+        return await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), timeout=5)
+
+    return asyncio.run(run())
+
+
+def test_assignments_written_in_one_batch():
+    manager = FakeAssignmentsManager(batch_result=[True, False, True])
+
+    results = _accept_concurrently(manager, [1, 2, 3])
+
+    assert results == [True, False, True]
+    assert len(manager.batch_calls) == 1
+    assert manager.row_calls == []
+
+
+def test_failed_batch_falls_back_to_per_row_writes():
+    manager = FakeAssignmentsManager(batch_error=RuntimeError("constraint"), bad_task_ids={2})
+
+    results = _accept_concurrently(manager, [1, 2, 3])
+
+    assert results[0] is True and results[2] is True
+    assert isinstance(results[1], ValueError)
+    assert manager.row_calls == [1, 2, 3]
+
+
+def test_result_length_mismatch_resolves_every_future():
+    manager = FakeAssignmentsManager(batch_result=[True])
+
+    results = _accept_concurrently(manager, [1, 2, 3])
+
+    assert results == [True, True, True]
+    assert manager.row_calls == [1, 2, 3]
+
+
+@pytest.mark.parametrize("task_ids", [[1], [1, 2]])
+def test_writer_survives_failed_batch(task_ids):
+    manager = FakeAssignmentsManager(batch_error=RuntimeError("db locked"))
+
+    async def run():
+        db = AsyncDBManager(manager)
+        first = await asyncio.gather(*(db.create_task_assignment_if_absent(t, t) for t in task_ids))
+        manager.batch_error = None
+        second = await asyncio.wait_for(db.create_task_assignment_if_absent(99, 99), timeout=5)
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == [True] * len(task_ids)
+    assert second is True
+
+
+class FakeProfileManager:
+    """Заглушка DBManager: во время чтения профиля «параллельно» сохраняется новая версия."""
+
+    def __init__(self, write_during_read):
+        self.write_during_read = write_during_read
+        self.version = "old"
+
+    @contextlib.contextmanager
+    def get_db(self):
+        yield None
+
+    def get_executor_profile(self, db, telegram_id):
+        row = self.version
+        if self.write_during_read:
+            self.version = "new"
+            invalidate_executor_profile_cache(telegram_id)
+        return row
+
+
+@pytest.mark.parametrize("write_during_read, cached", [(True, False), (False, True)])
+def test_profile_read_racing_write_is_not_cached(write_during_read, cached):
+    telegram_id = 424242
+    invalidate_executor_profile_cache(telegram_id)
+    manager = FakeProfileManager(write_during_read)
+
+    profile = asyncio.run(AsyncDBManager(manager).get_executor_profile(telegram_id))
+
+    assert profile == "old"
+    assert get_cached_executor_profile(telegram_id) == (cached, "old" if cached else None)
+    invalidate_executor_profile_cache(telegram_id)
@@ -50,6 +50,15 @@ from config import (
 logger = logging.getLogger(__name__)
 router = Router()
 
+def _forget_task_comment_files(task_id: int) -> None:
+    """Сбрасывает закэшированные файлы комментариев задачи в карточке исполнителя (кэш executor_handlers)."""
+    try:
+        from executor_handlers import forget_task_comment_files
+        forget_task_comment_files(task_id)
+    except Exception as e:
+        logger.warning(f"Failed to clear comment files cache for task {task_id}: {e}")
+
+
 # Простой кэш для отслеживания последних проверенных комментариев
 # Формат: {task_id: {user_id: last_comment_id}}
 _last_checked_comments = {}
@@ -105,8 +114,8 @@ async def _check_comments_for_task(task_id: int, user_id: int, bot):
         
         # Отправляем уведомления о новых комментариях
         if new_comments:
-            from notifications import NotificationService
-            notification_service = NotificationService(bot)
+            from notifications import get_notification_service
+            notification_service = get_notification_service(bot)
             
             for c in reversed(new_comments):  # отправляем в хронологическом порядке
                 comment_id = c.get('id')
@@ -859,11 +868,10 @@ async def enter_description_with_media(message: Message, state: FSMContext):
     
     # Если описание есть в подписи, обрабатываем медиа и создаем заявку
     try:
-        tg_file = await message.bot.get_file(file_id)
-        file_bytes = await message.bot.download_file(tg_file.file_path)
-        
-        # Загружаем в Planfix
-        upload_response = await planfix_client.upload_file(file_bytes, filename=default_filename)
+        with planfix_client.upload_buffer() as file_buffer:
+            await message.bot.download(file_id, destination=file_buffer)
+            # Загружаем в Planfix
+            upload_response = await planfix_client.upload_file(file_buffer, filename=default_filename)
         
         if upload_response and upload_response.get('result') == 'success':
             planfix_file_id = upload_response.get('id')
@@ -933,11 +941,10 @@ async def enter_description(message: Message, state: FSMContext):
             default_filename = "file"
         
         try:
-            tg_file = await message.bot.get_file(media_file_id)
-            file_bytes = await message.bot.download_file(tg_file.file_path)
-            
-            # Загружаем в Planfix
-            upload_response = await planfix_client.upload_file(file_bytes, filename=default_filename)
+            with planfix_client.upload_buffer() as file_buffer:
+                await message.bot.download(media_file_id, destination=file_buffer)
+                # Загружаем в Planfix
+                upload_response = await planfix_client.upload_file(file_buffer, filename=default_filename)
             
             if upload_response and upload_response.get('result') == 'success':
                 planfix_file_id = upload_response.get('id')
@@ -1023,11 +1030,10 @@ async def receive_media(message: Message, state: FSMContext):
             await message.answer("❌ Не удалось определить тип медиа файла.")
             return
         
-        tg_file = await message.bot.get_file(file_id)
-        file_bytes = await message.bot.download_file(tg_file.file_path)
-        
-        # Загружаем в Planfix
-        upload_response = await planfix_client.upload_file(file_bytes, filename=default_filename)
+        with planfix_client.upload_buffer() as file_buffer:
+            await message.bot.download(file_id, destination=file_buffer)
+            # Загружаем в Planfix
+            upload_response = await planfix_client.upload_file(file_buffer, filename=default_filename)
         
         if upload_response and upload_response.get('result') == 'success':
             planfix_file_id = upload_response.get('id')
@@ -1977,8 +1983,8 @@ async def handle_status_task_selection(callback_query: CallbackQuery, state: FSM
             try:
                 user = await db_manager.get_user_profile(callback_query.from_user.id)
                 author_name = user.full_name if user else "Заявитель"
-                from notifications import NotificationService
-                notification_service = NotificationService(callback_query.bot)
+                from notifications import get_notification_service
+                notification_service = get_notification_service(callback_query.bot)
                 await notification_service.notify_new_comment(task_id, author_name, "Уточните, пожалуйста, на каком этапе моя задача", recipients="executors")
             except Exception as notify_err:
                 logger.error(f"Failed to notify executors about status inquiry for task {task_id}: {notify_err}")
@@ -2052,8 +2058,8 @@ async def do_status_inquiry(message: Message, state: FSMContext):
         try:
             user = await db_manager.get_user_profile(message.from_user.id)
             author_name = user.full_name if user else "Заявитель"
-            from notifications import NotificationService
-            notification_service = NotificationService(message.bot)
+            from notifications import get_notification_service
+            notification_service = get_notification_service(message.bot)
             await notification_service.notify_new_comment(task_id, author_name, "Уточните, пожалуйста, на каком этапе моя задача", recipients="executors")
         except Exception as notify_err:
             logger.error(f"Failed to notify executors about status inquiry for task {task_id}: {notify_err}")
@@ -2223,10 +2229,9 @@ async def comment_with_media(message: Message, state: FSMContext):
             await state.clear()
             return
         
-        tg_file = await message.bot.get_file(file_id)
-        file_bytes = await message.bot.download_file(tg_file.file_path)
-        
-        upload_response = await planfix_client.upload_file(file_bytes, filename=default_filename)
+        with planfix_client.upload_buffer() as file_buffer:
+            await message.bot.download(file_id, destination=file_buffer)
+            upload_response = await planfix_client.upload_file(file_buffer, filename=default_filename)
         planfix_file_id = upload_response.get('id') if upload_response and upload_response.get('result') == 'success' else None
         
         await submit_comment(message, data.get("task_id"), data.get("comment_text"), planfix_file_id)
@@ -2253,12 +2258,13 @@ async def submit_comment(message: Message, task_id: int, text: str, file_id: int
             description=text,
             files=files
         )
+        _forget_task_comment_files(task_id)
         
         if response and response.get('result') == 'success':
             # Отправляем уведомление исполнителям
             logger.info(f"Comment added successfully to task {task_id} by user {author_name}, sending notifications...")
-            from notifications import NotificationService
-            notification_service = NotificationService(message.bot)
+            from notifications import get_notification_service
+            notification_service = get_notification_service(message.bot)
             await notification_service.notify_new_comment(task_id, author_name, text, recipients="executors")
             logger.info(f"Notification service called for task {task_id}")
             
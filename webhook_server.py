@@ -35,6 +35,25 @@ from task_notification_service import TaskNotificationService
 setup_logging()
 logger = logging.getLogger(__name__)
 
+
+def _clear_executor_task_lists() -> None:
+    """Сбрасывает закэшированные списки задач исполнителей (бот и webhook работают в одном процессе)."""
+    try:
+        from executor_handlers import clear_task_list_caches
+        clear_task_list_caches()
+    except Exception as e:
+        logger.warning(f"Failed to clear executor task list caches: {e}")
+
+
+def _forget_task_comment_files(task_id: int) -> None:
+    """Сбрасывает закэшированные файлы комментариев задачи, показываемые в карточке исполнителя."""
+    try:
+        from executor_handlers import forget_task_comment_files
+        forget_task_comment_files(task_id)
+    except Exception as e:
+        logger.warning(f"Failed to clear comment files cache for task {task_id}: {e}")
+
+
 class PlanfixWebhookHandler:
     """Обработчик webhook от Planfix."""
     
@@ -249,6 +268,9 @@ class PlanfixWebhookHandler:
                 logger.warning(f"Invalid task_id format: {task_identifier}")
                 return
             
+            # Новая задача должна сразу появиться в списках исполнителей
+            _clear_executor_task_lists()
+            
             # Обрабатываем project_id и counterparty
             project_id = None
             if project_id_raw:
@@ -403,6 +425,10 @@ class PlanfixWebhookHandler:
                 logger.warning(f"Invalid task_id format: {task_identifier}")
                 return
             
+            # Задача изменилась в Planfix — закэшированные данные больше не актуальны
+            planfix_client.invalidate_task(task_id)
+            _clear_executor_task_lists()
+            
             # Фильтруем только релевантные задачи
             if not self._should_process_task(task):
                 logger.debug(f"Task {task_id} update skipped by filter")
@@ -788,6 +814,9 @@ class PlanfixWebhookHandler:
                 logger.warning(f"Invalid task_id format: {task_id_raw}")
                 return
             
+            # Новый комментарий мог добавить вложения — карточка задачи должна показать их сразу
+            _forget_task_comment_files(task_id)
+            
             # Фильтруем комментарии от бота
             if self._is_bot_comment(comment):
                 logger.debug(f"Comment from bot in task {task_id} skipped")